@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# Generates app_manifest.json at build time, by parsing sources without importing them.
+# Manifest contains:
+# - sections: classes decorated with @app_section, with decorator arguments, so that side menu can be
+#   built without importing section modules,
+# - root_functions: functions decorated with @root_function, with their module and line range, so that
+#   root helper server can be generated without importing modules that define them,
+# - template_modules: for every module, modules defining GTK widget types used (directly or through
+#   imported modules) by templates, which need to be imported before these templates are instantiated.
+# Modules are installed flat, so they are identified by file name without .py extension.
+
+import argparse, ast, json, os, sys
+import xml.etree.ElementTree as ElementTree
+
+RESOURCE_PREFIX = "/com/damiandudycz/CatalystLab/"
+
+class ModuleInfo:
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.imports: set[str] = set() # Modules imported with relative imports.
+        self.gtypes: set[str] = set() # Values of __gtype_name__ defined in module.
+        self.templates: set[str] = set() # Source paths of .ui files used by Gtk.Template.
+        self.sections: list[dict] = []
+        self.root_functions: list[dict] = []
+
+def decorator_name(decorator: ast.expr) -> str | None:
+    target = decorator.func if isinstance(decorator, ast.Call) else decorator
+    if isinstance(target, ast.Name):
+        return target.id
+    if isinstance(target, ast.Attribute):
+        return target.attr
+    return None
+
+def parse_module(source_dir: str, relative_path: str) -> ModuleInfo:
+    path = os.path.join(source_dir, relative_path)
+    module = ModuleInfo(name=os.path.splitext(os.path.basename(relative_path))[0], path=relative_path)
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level > 0:
+            if node.module:
+                module.imports.add(node.module.split(".")[-1])
+            else:
+                module.imports.update(alias.name for alias in node.names)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            for statement in node.body:
+                if (
+                    isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Constant)
+                    and any(isinstance(target, ast.Name) and target.id == "__gtype_name__" for target in statement.targets)
+                ):
+                    module.gtypes.add(statement.value.value)
+            for decorator in node.decorator_list:
+                name = decorator_name(decorator)
+                if name == "Template" and isinstance(decorator, ast.Call):
+                    for keyword in decorator.keywords:
+                        if keyword.arg == "resource_path":
+                            resource_path = ast.literal_eval(keyword.value)
+                            module.templates.add(resource_path.removeprefix(RESOURCE_PREFIX))
+                elif name == "app_section" and isinstance(decorator, ast.Call):
+                    arguments = {keyword.arg: ast.literal_eval(keyword.value) for keyword in decorator.keywords}
+                    module.sections.append({
+                        "module": module.name,
+                        "class_name": node.name,
+                        "title": arguments["title"],
+                        "label": arguments.get("label") or arguments["title"],
+                        "icon": arguments.get("icon", "default-icon"),
+                        "show_in_side_bar": arguments.get("show_in_side_bar", True),
+                        "show_side_bar": arguments.get("show_side_bar", True),
+                        "order": arguments.get("order", 999_999_999),
+                    })
+        elif isinstance(node, ast.FunctionDef):
+            if any(decorator_name(decorator) == "root_function" for decorator in node.decorator_list):
+                module.root_functions.append({
+                    "name": node.name,
+                    "module": module.name,
+                    # Same range as inspect.getsource, including decorators.
+                    "first_line": min([node.lineno] + [decorator.lineno for decorator in node.decorator_list]),
+                    "last_line": node.end_lineno,
+                })
+    return module
+
+def template_classes(source_dir: str, template_path: str) -> set[str]:
+    try:
+        root = ElementTree.parse(os.path.join(source_dir, template_path)).getroot()
+    except (OSError, ElementTree.ParseError) as e:
+        print(f"Warning: could not parse {template_path}: {e}", file=sys.stderr)
+        return set()
+    classes = set()
+    for element in root.iter():
+        if element.tag == "object" and "class" in element.attrib:
+            classes.add(element.attrib["class"])
+        elif element.tag == "template" and "parent" in element.attrib:
+            classes.add(element.attrib["parent"])
+    return classes
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate app_manifest.json")
+    parser.add_argument("--source-dir", required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("sources", nargs="+")
+    arguments = parser.parse_args()
+
+    modules: dict[str, ModuleInfo] = {}
+    for source in arguments.sources:
+        relative_path = os.path.relpath(os.path.abspath(source), os.path.abspath(arguments.source_dir))
+        if relative_path.endswith(".py"):
+            module = parse_module(source_dir=arguments.source_dir, relative_path=relative_path)
+            modules[module.name] = module
+    gtype_modules = {gtype: module.name for module in modules.values() for gtype in module.gtypes}
+
+    # Dependencies of every module: imported modules and modules defining types used by its templates.
+    dependencies: dict[str, set[str]] = {}
+    for module in modules.values():
+        dependencies[module.name] = {name for name in module.imports if name in modules}
+        for template in module.templates:
+            dependencies[module.name].update(
+                gtype_modules[name] for name in template_classes(arguments.source_dir, template) if name in gtype_modules
+            )
+
+    template_modules = {}
+    for module in modules.values():
+        reachable, pending = set(), [module.name]
+        while pending:
+            name = pending.pop()
+            if name not in reachable:
+                reachable.add(name)
+                pending.extend(dependencies.get(name, ()))
+        required = sorted(name for name in reachable if modules[name].gtypes and name != module.name)
+        if required:
+            template_modules[module.name] = required
+
+    manifest = {
+        "version": 1,
+        "sections": sorted(
+            (section for module in modules.values() for section in module.sections),
+            key=lambda section: section["order"]
+        ),
+        "root_functions": sorted(
+            (function for module in modules.values() for function in module.root_functions),
+            key=lambda function: (function["module"], function["first_line"])
+        ),
+        "template_modules": dict(sorted(template_modules.items())),
+    }
+    with open(arguments.output, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+
+if __name__ == "__main__":
+    main()
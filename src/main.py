@@ -4,11 +4,18 @@ import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 
-from gi.repository import Gtk, Gio, Adw, Gdk
+from gi.repository import Gtk, Gio, Adw, Gdk, GLib
+from .startup_profiler import StartupProfiler
 from .main_window import CatalystlabWindow
 from .modules_scanner import scan_all_submodules
+from .app_manifest import AppManifest
+from .app_section import register_manifest_sections
+from . import repositories # Registers global repositories.
+from .repository import RepositoryWriter
+from .repository_store import RepositoryStore
 from .root_helper_client import RootHelperClient
 from .toolset_manager import ToolsetManager
+from .toolset_spawn_pool import ToolsetSpawnPool
 from .snapshot_manager import SnapshotManager
 from .releng_manager import RelengManager
 from .overlay_manager import OverlayManager
@@ -23,12 +30,19 @@ class CatalystlabApplication(Adw.Application):
         self.create_action('quit', lambda *_: self.quit(), ['<primary>q'])
         self.create_action('about', self.on_about_action)
         self.create_action('preferences', self.on_preferences_action)
-        scan_all_submodules("catalystlab")
-        ToolsetManager.shared().refresh()
-        SnapshotManager.shared().refresh()
-        RelengManager.shared().refresh()
-        OverlayManager.shared().refresh()
-        ProjectManager.shared().refresh()
+        self.add_main_option(StartupProfiler.OPTION, 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE, "Print timing of startup phases", None)
+        self.add_main_option(RepositoryStore.OPTION, 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE, "Store repositories in SQLite database instead of JSON files", None)
+        StartupProfiler.mark("main imports")
+        manifest = AppManifest.shared()
+        if manifest is not None:
+            # Sections are imported when opened, main window only needs types used by its templates.
+            with StartupProfiler.measure("register manifest sections"):
+                register_manifest_sections(manifest.sections)
+                manifest.import_template_dependencies(module="main_window")
+        else:
+            # Running without generated manifest (eq. from sources), import everything to run decorators.
+            with StartupProfiler.measure("import submodules"):
+                scan_all_submodules("catalystlab")
 
     def do_activate(self):
         """Called when the application is activated.
@@ -38,13 +52,38 @@ class CatalystlabApplication(Adw.Application):
         """
         win = self.props.active_window
         if not win:
-            win = CatalystlabWindow(application=self)
+            with StartupProfiler.measure("create window"):
+                win = CatalystlabWindow(application=self)
+            # Managers are refreshed after window appears, so startup doesn't wait for reading images and directories.
+            GLib.idle_add(self.refresh_managers)
         win.present()
+        StartupProfiler.mark("window presented")
+
+    def refresh_managers(self) -> bool:
+        """Refreshes all managers concurrently. Repositories are updated in main thread when each scan finishes."""
+        futures = [
+            manager.shared().refresh(background=True)
+            for manager in [ToolsetManager, SnapshotManager, RelengManager, OverlayManager, ProjectManager]
+        ]
+        if StartupProfiler.enabled:
+            remaining = [len(futures)]
+            def on_done(_):
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    GLib.idle_add(StartupProfiler.report)
+            for future in futures:
+                future.add_done_callback(on_done)
+        return False
 
     def do_shutdown(self):
         """Called when the application is shutting down."""
+        if RootHelperClient.shared().is_server_process_running:
+            ToolsetSpawnPool.shared().clear()
         RootHelperClient.shared().stop_root_helper()
-        Gio.Application.do_shutdown(self)
+        try:
+            RepositoryWriter.shared().flush() # Write changes still waiting for debounce delay.
+        finally:
+            Gio.Application.do_shutdown(self)
 
     def on_about_action(self, widget, _):
         """Callback for the app.about action."""
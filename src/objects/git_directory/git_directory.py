@@ -7,6 +7,7 @@ from datetime import datetime
 from .repository import Serializable
 from .event_bus import EventBus, SharedEvent
 from .status_indicator import StatusIndicatorState, StatusIndicatorValues
+from .background_executor import BackgroundExecutor
 from abc import ABC, abstractmethod
 
 class GitDirectoryEvent(Enum):
@@ -22,6 +23,10 @@ class GitDirectoryStatus(Enum):
 
 class GitDirectory(Serializable, ABC):
 
+    FETCH_TIMEOUT = 60 # Seconds, git fetch is killed after that, so hanging remote doesn't keep worker busy.
+    # Status checks include git fetch, so they use own executor, not blocking other background work when network hangs.
+    _status_executor = BackgroundExecutor(max_workers=2)
+
     # Overwrite in subclassed
     @classmethod
     @abstractmethod
@@ -187,9 +192,15 @@ class GitDirectory(Serializable, ABC):
                         ["git", "fetch"],
                         cwd=directory,
                         stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
+                        stderr=subprocess.DEVNULL,
+                        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"} # Fail instead of waiting for credentials.
                     )
-                    process_fetch.wait()
+                    try:
+                        process_fetch.wait(timeout=GitDirectory.FETCH_TIMEOUT)
+                    except subprocess.TimeoutExpired:
+                        process_fetch.kill()
+                        process_fetch.wait()
+                        raise RuntimeError("git fetch timed out")
                     if process_fetch.returncode != 0:
                         raise RuntimeError("git fetch failed")
                     process_diff = subprocess.Popen(
@@ -220,10 +231,10 @@ class GitDirectory(Serializable, ABC):
                 self.last_commit_date = None
                 self.branch_name = None
             self.event_bus.emit(SharedEvent.STATE_UPDATED, self)
-        thread = threading.Thread(target=worker, daemon=True)
-        thread.start()
         if wait:
-            thread.join()
+            worker()
+        else:
+            GitDirectory._status_executor.submit(worker)
 
     def update_logs(self, wait: bool = False):
         def worker():
@@ -1,7 +1,11 @@
 import os, shutil
+from concurrent.futures import Future
+from gi.repository import GLib
 from abc import ABC, abstractmethod
 from .git_directory import GitDirectory, GitDirectoryEvent
 from .repository import Repository
+from .background_executor import BackgroundExecutor
+from .startup_profiler import StartupProfiler
 
 class GitManager(ABC):
     _instances = {}
@@ -24,44 +28,59 @@ class GitManager(ABC):
             cls._instances[cls] = cls()
         return cls._instances[cls]
 
-    def refresh(self):
-        repository = self.__class__.repository()
-        git_directories = repository.value
+    def refresh(self, background: bool = False) -> Future | None:
+        """Synchronizes repository with directories in storage location and updates their git status."""
+        """In background mode directory is scanned in separate thread and repository is updated in main thread."""
+        if not background:
+            self._apply_refresh(self._scan())
+            return None
+        def worker():
+            with StartupProfiler.measure(f"refresh {self.__class__.__name__}"):
+                found_directories = self._scan()
+            GLib.idle_add(self._apply_refresh, found_directories)
+        return BackgroundExecutor.shared().submit(worker)
+
+    def _scan(self) -> set[str]:
         # Detect missing git directories and add them to repository.
         storage_location = self.__class__.repository()._cls.base_location()
         # --- Step 1: Scan directory for existing directories ---
         if not os.path.isdir(storage_location):
             os.makedirs(storage_location, exist_ok=True)
-        found_directories = {
+        return {
             f for f in os.listdir(storage_location)
             if os.path.isdir(os.path.join(storage_location, f))
         }
-        # --- Step 2: Check for new directories not in repository ---
-        existing_dirnames = {
-            directory.sanitized_name() for directory in git_directories
-        }
-        missing_dirs = found_directories - existing_dirnames
-        for dirname in missing_dirs:
-            full_path = os.path.join(storage_location, dirname)
-            self.add_directory(self.__class__.repository()._cls(name=dirname))
-        # --- Step 3: Remove records for deleted directories ---
-        deleted_directories = [
-            directory for directory in git_directories
-            if directory.sanitized_name() not in found_directories
-        ]
-        for directory in deleted_directories:
-            self.remove_directory(directory)
-        # Update statuses of all directories
-        for directory in repository.value:
-            directory.update_status()
+
+    def _apply_refresh(self, found_directories: set[str]) -> bool:
+        repository = self.__class__.repository()
+        # Single save and change event for the whole refresh.
+        with repository.transaction():
+            git_directories = repository.value
+            # --- Step 2: Check for new directories not in repository ---
+            existing_dirnames = {
+                directory.sanitized_name() for directory in git_directories
+            }
+            missing_dirs = found_directories - existing_dirnames
+            for dirname in missing_dirs:
+                self.add_directory(self.__class__.repository()._cls(name=dirname))
+            # --- Step 3: Remove records for deleted directories ---
+            deleted_directories = [
+                directory for directory in git_directories
+                if directory.sanitized_name() not in found_directories
+            ]
+            for directory in deleted_directories:
+                self.remove_directory(directory)
+            # Update statuses of all directories, number of concurrent checks is limited by GitDirectory executor.
+            for directory in repository.value:
+                directory.update_status()
+        return False # Remove idle callback after running once
 
     def add_directory(self, directory: GitDirectory):
-        # Remove existing directory with the same name
+        # Remove existing directory with the same name. Assigned once, so repository is saved once.
         self.__class__.repository().value = [
             s for s in self.__class__.repository().value
             if s.id != directory.id
-        ]
-        self.__class__.repository().value.append(directory)
+        ] + [directory]
 
     def remove_directory(self, directory: GitDirectory):
         if os.path.isdir(directory.directory_path()):
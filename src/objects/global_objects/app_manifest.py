@@ -0,0 +1,74 @@
+from __future__ import annotations
+import os, json, importlib, threading
+from types import ModuleType
+from typing import final
+
+@final
+class AppManifest:
+    """Manifest generated at build time by build-aux/generate_app_manifest.py and installed next to modules."""
+    """Lists app sections, root functions and modules defining GTK types used by templates, so these don't"""
+    """have to be discovered by importing every module at startup. Not available when running from sources."""
+
+    FILE_NAME = "app_manifest.json"
+    VERSION = 1
+
+    _instance: AppManifest | None = None
+    _loaded = False
+    _lock = threading.Lock()
+
+    def __init__(self, data: dict, directory: str, package: str):
+        self.sections: list[dict] = data.get("sections", [])
+        self.root_functions: list[dict] = data.get("root_functions", [])
+        self.template_modules: dict[str, list[str]] = data.get("template_modules", {})
+        self.directory = directory
+        self.package = package
+
+    @classmethod
+    def shared(cls) -> AppManifest | None:
+        with cls._lock:
+            if not cls._loaded:
+                cls._loaded = True
+                directory = os.path.dirname(os.path.abspath(__file__))
+                try:
+                    with open(os.path.join(directory, AppManifest.FILE_NAME), "r", encoding="utf-8") as file:
+                        data = json.load(file)
+                    if data.get("version") != AppManifest.VERSION:
+                        raise ValueError(f"Unsupported manifest version {data.get('version')}")
+                    cls._instance = cls(data=data, directory=directory, package=__package__)
+                except FileNotFoundError:
+                    cls._instance = None
+                except (OSError, ValueError) as e:
+                    print(f"Failed to load {AppManifest.FILE_NAME}: {e}")
+                    cls._instance = None
+            return cls._instance
+
+    # --------------------------------------------------------------------------
+    # Modules:
+
+    def import_module(self, module: str) -> ModuleType:
+        """Imports module together with modules registering GTK types used by its templates."""
+        self.import_template_dependencies(module=module)
+        return importlib.import_module(f"{self.package}.{module}")
+
+    def import_template_dependencies(self, module: str):
+        for dependency in self.template_modules.get(module, []):
+            importlib.import_module(f"{self.package}.{dependency}")
+
+    # --------------------------------------------------------------------------
+    # Root functions:
+
+    def root_function_sources(self) -> list[str]:
+        """Sources of all root functions, read from installed module files without importing them."""
+        sources = []
+        lines_cache: dict[str, list[str]] = {}
+        for function in self.root_functions:
+            module = function["module"]
+            try:
+                if module not in lines_cache:
+                    with open(os.path.join(self.directory, f"{module}.py"), "r", encoding="utf-8") as file:
+                        lines_cache[module] = file.readlines()
+                lines = lines_cache[module][function["first_line"] - 1:function["last_line"]]
+                sources.append("".join(lines).strip())
+            except OSError:
+                print(f"Warning: could not get source for function {function['name']}")
+        return sources
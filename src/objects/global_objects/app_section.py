@@ -18,6 +18,42 @@ class AppSection:
     all_sections: ClassVar[list[Type]] = []
     _lock: ClassVar[threading.Lock] = threading.Lock()
 
+class LazyAppSection:
+    """Section registered from AppManifest. Section module is imported when section is opened for the first time."""
+    """Used in place of section class (AppSection.all_sections, AppSection.<ClassName>), so it's callable like a class."""
+
+    def __init__(self, module: str, class_name: str, section_details: AppSection):
+        self.module = module
+        self.__name__ = class_name
+        self.section_details = section_details
+
+    def load(self) -> Type:
+        if self.section_details.cls is self:
+            from .app_manifest import AppManifest
+            AppManifest.shared().import_module(module=self.module) # Decorator binds real class to section_details.
+        return self.section_details.cls
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+def register_manifest_sections(sections: list[dict]):
+    """Registers lazy sections from AppManifest entries, without importing their modules."""
+    with AppSection._lock:
+        for entry in sections:
+            lazy_section = LazyAppSection(module=entry["module"], class_name=entry["class_name"], section_details=None)
+            lazy_section.section_details = AppSection(
+                cls=lazy_section,
+                order=entry["order"],
+                label=entry["label"],
+                title=entry["title"],
+                icon=entry["icon"],
+                show_in_side_bar=entry["show_in_side_bar"],
+                show_side_bar=entry["show_side_bar"],
+            )
+            setattr(AppSection, lazy_section.__name__, lazy_section)
+            AppSection.all_sections.append(lazy_section)
+        AppSection.all_sections.sort(key=lambda c: c.section_details.order)
+
 def app_section(title: str, label: str | None = None, icon: str = "default-icon", show_in_side_bar: bool = True, show_side_bar: bool = True, order: int = 999_999_999):
     """app_section decorator."""
     def decorator(cls: Type):
@@ -34,6 +70,14 @@ def app_section(title: str, label: str | None = None, icon: str = "default-icon"
         ):
             raise TypeError(f"{cls.__name__} must implement __init__(self, content_navigation_view: Adw.NavigationView, **kwargs)")
 
+        # Section already registered from manifest, attach loaded class to it:
+        with AppSection._lock:
+            lazy_section = getattr(AppSection, cls.__name__, None)
+            if isinstance(lazy_section, LazyAppSection):
+                lazy_section.section_details.cls = cls
+                cls.section_details = lazy_section.section_details
+                return cls
+
         # Store metadata:
         section = AppSection(
             cls=cls,
@@ -0,0 +1,55 @@
+from __future__ import annotations
+import os, queue, threading
+from concurrent.futures import Future
+from typing import final, Callable, Any
+
+@final
+class BackgroundExecutor:
+    """Bounded pool of daemon threads for background work, like manager refreshes and cache pruning."""
+    """Limits how many of these jobs run at the same time, no matter how many directories or files exist."""
+    """Jobs that can wait on network (eq. git fetch) should use separate instance, so they don't starve others."""
+    """Threads are daemons, so jobs that hang don't prevent application from closing."""
+
+    _instance: BackgroundExecutor | None = None
+    _instance_lock = threading.Lock()
+
+    MAX_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+
+    @classmethod
+    def shared(cls) -> BackgroundExecutor:
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.max_workers = max_workers
+        self._queue: queue.SimpleQueue[tuple[Future, Callable, tuple, dict]] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._workers: list[threading.Thread] = []
+        self._idle_workers = 0
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Schedules fn(*args, **kwargs). Result or exception is available from returned future."""
+        future = Future()
+        with self._lock:
+            self._queue.put((future, fn, args, kwargs))
+            if self._idle_workers == 0 and len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._run_worker, name=f"background-{len(self._workers)}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            else:
+                self._idle_workers -= 1 # Queued job will wake up one idle worker.
+        return future
+
+    def _run_worker(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    print(f"Background job {getattr(fn, '__qualname__', fn)} failed: {e}")
+                    future.set_exception(e)
+            with self._lock:
+                self._idle_workers += 1
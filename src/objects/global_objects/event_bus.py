@@ -1,4 +1,5 @@
-import weakref
+import weakref, threading, time
+from dataclasses import dataclass
 from enum import Enum, auto
 from typing import final, TypeVar, Generic, Callable, Dict, Any, Hashable
 from gi.repository import GLib
@@ -8,49 +9,132 @@ EventBusType = TypeVar("EventBusType", bound=Enum)
 class SharedEvent(Enum):
     STATE_UPDATED = auto()
 
+@final
+class EventDelivery(Enum):
+    EACH = auto() # Every emit is delivered.
+    LATEST = auto() # Emits waiting for delivery are replaced by newer ones, subscribers get only the latest value.
+    BATCH = auto() # Values of emits waiting for delivery are collected, subscribers get them as a list.
+
+@final
+@dataclass(frozen=True)
+class EventPolicy:
+    """Describes how emits of given event are delivered to subscribers."""
+    """Events with BATCH delivery must be emitted with exactly one positional argument."""
+    delivery: EventDelivery = EventDelivery.EACH
+    max_rate: float | None = None # Maximum deliveries per second, for each bus. Only for LATEST and BATCH.
+
 @final
 class EventBus(Generic[EventBusType]):
-    def __init__(self, scheduler: Callable[..., Any] = GLib.idle_add):
+
+    policies: Dict[Enum, EventPolicy] = {}
+    default_policy = EventPolicy()
+
+    @staticmethod
+    def set_policy(*events: Enum, policy: EventPolicy):
+        """Sets delivery policy of events for all buses. Call next to events definition."""
+        for event in events:
+            EventBus.policies[event] = policy
+
+    def __init__(self, scheduler: Callable[..., Any] = GLib.idle_add, delayed_scheduler: Callable[..., Any] = GLib.timeout_add):
         self.scheduler = scheduler
-        self._subscribers: Dict[EventBusType, list[weakref.ReferenceType | weakref.WeakMethod]] = {}
+        self.delayed_scheduler = delayed_scheduler # Called with delay in milliseconds, like GLib.timeout_add.
+        self._lock = threading.Lock()
+        self._subscribers: Dict[EventBusType, tuple[weakref.ReferenceType | weakref.WeakMethod, ...]] = {} # Replaced, not modified, so emit can use it without copying.
         self._handles: Dict[EventBusType, Dict[Hashable, weakref.ReferenceType | weakref.WeakMethod]] = {}
+        # Coalesced events:
+        self._pending: Dict[EventBusType, Any] = {} # (args, kwargs) for LATEST, list of values for BATCH.
+        self._last_delivery: Dict[EventBusType, float] = {}
 
     def subscribe(self, event: EventBusType, callback: Callable, handle: Hashable | None = None):
         if hasattr(callback, '__self__') and callback.__self__ is not None:
             ref = weakref.WeakMethod(callback)
         else:
             ref = weakref.ref(callback)
-        if handle is not None:
-            if event not in self._handles:
-                self._handles[event] = {}
-            self._handles[event][handle] = ref
-        if event not in self._subscribers:
-            self._subscribers[event] = []
-        self._subscribers[event].append(ref)
+        with self._lock:
+            if handle is not None:
+                if event not in self._handles:
+                    self._handles[event] = {}
+                self._handles[event][handle] = ref
+            self._subscribers[event] = self._subscribers.get(event, ()) + (ref,)
 
     def unsubscribe(self, event: EventBusType, handle: Hashable):
         """Unsubscribe a callback using its handle."""
-        if event not in self._handles:
-            return
-        ref = self._handles[event].pop(handle, None)
-        if ref and event in self._subscribers:
-            try:
-                self._subscribers[event].remove(ref)
-            except ValueError:
-                pass  # already removed or not found
+        with self._lock:
+            if event not in self._handles:
+                return
+            ref = self._handles[event].pop(handle, None)
+            if ref and event in self._subscribers:
+                subscribers = list(self._subscribers[event])
+                try:
+                    subscribers.remove(ref)
+                except ValueError:
+                    pass  # already removed or not found
+                self._subscribers[event] = tuple(subscribers)
 
     def emit(self, event: EventBusType, *args, **kwargs):
-        callbacks = self._subscribers.get(event, [])
-        alive_callbacks = []
-        for ref in callbacks:
+        """Schedules delivery to subscribers in main loop. Can be called from any thread."""
+        if not self._subscribers.get(event):
+            return
+        policy = EventBus.policies.get(event, EventBus.default_policy)
+        if policy.delivery == EventDelivery.EACH:
+            self.scheduler(self._deliver_each, event, args, kwargs)
+            return
+        with self._lock:
+            scheduled = event in self._pending
+            if policy.delivery == EventDelivery.LATEST:
+                self._pending[event] = (args, kwargs)
+            else:
+                self._pending.setdefault(event, []).append(args[0])
+            if scheduled:
+                return # Already waiting for delivery, which will include this emit.
+            delay = 0.0
+            if policy.max_rate:
+                delay = self._last_delivery.get(event, 0.0) + 1.0 / policy.max_rate - time.monotonic()
+        if delay > 0:
+            self.delayed_scheduler(max(1, int(delay * 1000)), self._deliver_pending, event)
+        else:
+            self.scheduler(self._deliver_pending, event)
+
+    # --------------------------------------------------------------------------
+    # Delivery, called in main loop:
+
+    def _deliver_each(self, event: EventBusType, args: tuple, kwargs: dict) -> bool:
+        self._call_subscribers(event, *args, **kwargs)
+        return False # Remove idle callback after running once
+
+    def _deliver_pending(self, event: EventBusType) -> bool:
+        with self._lock:
+            pending = self._pending.pop(event, None)
+            self._last_delivery[event] = time.monotonic()
+        if pending is not None:
+            if isinstance(pending, list):
+                self._call_subscribers(event, pending)
+            else:
+                args, kwargs = pending
+                self._call_subscribers(event, *args, **kwargs)
+        return False # Remove idle callback after running once
+
+    def _call_subscribers(self, event: EventBusType, *args, **kwargs):
+        has_dead_callbacks = False
+        for ref in self._subscribers.get(event, ()):
             callback = ref()
-            if callback is not None:
-                alive_callbacks.append(ref)
-                self.scheduler(callback, *args, **kwargs)
-        self._subscribers[event] = alive_callbacks
-        # Also clean up any dead handles
-        if event in self._handles:
-            dead_handles = [h for h, r in self._handles[event].items() if r() is None]
-            for h in dead_handles:
-                del self._handles[event][h]
+            if callback is None:
+                has_dead_callbacks = True
+                continue
+            try:
+                callback(*args, **kwargs)
+            except Exception as e:
+                print(f"Error in {event} handler {getattr(callback, '__qualname__', callback)}: {e}")
+        if has_dead_callbacks:
+            self._remove_dead_callbacks(event)
+
+    def _remove_dead_callbacks(self, event: EventBusType):
+        with self._lock:
+            self._subscribers[event] = tuple(ref for ref in self._subscribers.get(event, ()) if ref() is not None)
+            if event in self._handles:
+                dead_handles = [h for h, r in self._handles[event].items() if r() is None]
+                for h in dead_handles:
+                    del self._handles[event][h]
 
+# Emitted with the object whose state changed, so delivering only the latest emit is enough.
+EventBus.set_policy(SharedEvent.STATE_UPDATED, policy=EventPolicy(delivery=EventDelivery.LATEST, max_rate=30))
@@ -1,5 +1,6 @@
 from .root_function import root_function
-import subprocess, os, re
+import subprocess, os, re, threading
+from typing import BinaryIO
 from datetime import datetime, timezone, timedelta
 
 # ------------------------------------------------------------------------------
@@ -59,28 +60,130 @@ def umount_squashfs(mount_point: str):
     delete_temp_workdir(path=mount_point)
 
 @root_function
-def extract(tarball: str, directory: str):
-    import tarfile
-    import signal
-    import threading
+def extract(tarball: str, directory: str, compression: str | None = None):
+    """Extracts a compressed tarball as root to preserve special files, ownership and xattrs."""
+    """Reads the tarball once as a stream, so tarball can also be a FIFO filled while extracting."""
+    """Decompression runs in external multi-threaded xz/zstd and extraction in native tar if available,"""
+    """so Python only passes compressed bytes. Otherwise members are extracted by tarfile without attributes,"""
+    """which are set in one batch at the end. Progress is reported by compressed bytes read, if tarball size is known."""
+    import tarfile, signal, threading, shutil, subprocess
     _cancel_event = threading.Event()
     def handle_sigterm(signum, frame):
         _cancel_event.set()
     signal.signal(signal.SIGTERM, handle_sigterm)
 
-    """Extracts an .xz tarball as root to preserve special files and ownership."""
-    with tarfile.open(tarball, mode='r:xz') as tar:
-        total_size = sum(member.size for member in tar.getmembers())
-        extracted_size = 0
-        for member in tar.getmembers():
-            if _cancel_event.is_set():
-                return
-            tar.extract(member, path=directory)
-            extracted_size += member.size
-            progress = extracted_size / total_size if total_size else 0
+    compression = compression or next((suffix for suffix in ("xz", "zst", "bz2", "gz") if tarball.endswith("." + suffix)), "xz")
+    decompressors = {
+        "xz": ["xz", "-T0", "-dc"],
+        "zst": ["zstd", "-T0", "-dc"],
+        "bz2": ["lbzip2", "-dc"],
+        "gz": ["pigz", "-dc"],
+    }
+    extractor_command = ["tar", "--extract", "--file=-", f"--directory={directory}", "--numeric-owner", "--preserve-permissions", "--xattrs", "--xattrs-include=*.*"]
+    total_size = os.path.getsize(tarball) if os.path.isfile(tarball) else 0
+    read_size = 0
+    last_progress = -1.0
+
+    def report_progress(size: int):
+        nonlocal read_size, last_progress
+        read_size += size
+        progress = read_size / total_size if total_size else None
+        if progress is not None and progress - last_progress >= 0.001:
+            last_progress = progress
             # This print must stay, it is used to receive progress by step implementation.
             print(f"PROGRESS: {progress}", flush=True)
 
+    def extract_members(tar: tarfile.TarFile):
+        # Attributes are set after all members are extracted, directories last and deepest first,
+        # so adding files doesn't change directory mtimes and read-only directories can be filled.
+        extracted: list[tarfile.TarInfo] = []
+        extract_args = {"filter": "fully_trusted"} if hasattr(tarfile, "data_filter") else {}
+        for member in tar:
+            if _cancel_event.is_set():
+                return
+            tar.extract(member, path=directory, set_attrs=False, **extract_args)
+            extracted.append(member)
+        extracted.sort(key=lambda member: (member.isdir(), -member.name.count("/")))
+        for member in extracted:
+            path = os.path.join(directory, member.name)
+            os.lchown(path, member.uid, member.gid)
+            if not member.issym():
+                os.chmod(path, member.mode)
+                os.utime(path, (member.mtime, member.mtime))
+
+    decompressor_command = decompressors.get(compression)
+    if not (decompressor_command and shutil.which(decompressor_command[0])):
+        decompressor_command = None
+        # tarfile supports zst only since Python 3.14.
+        if compression not in tarfile.TarFile.OPEN_METH:
+            required = decompressors[compression][0] if compression in decompressors else compression
+            raise RuntimeError(f"Extracting {compression} tarballs requires {required}, please install it")
+    processes: list[subprocess.Popen] = []
+    source = open(tarball, "rb")
+    try:
+        if decompressor_command:
+            decompressor = subprocess.Popen(decompressor_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            processes.append(decompressor)
+            def feed():
+                # Feeds compressed bytes to decompressor, counting progress.
+                try:
+                    while chunk := source.read(1024 * 1024):
+                        if _cancel_event.is_set():
+                            break
+                        decompressor.stdin.write(chunk)
+                        report_progress(len(chunk))
+                except BrokenPipeError:
+                    pass
+                finally:
+                    decompressor.stdin.close()
+            feeder = threading.Thread(target=feed, daemon=True)
+            feeder.start()
+            if shutil.which(extractor_command[0]):
+                extractor = subprocess.Popen(extractor_command, stdin=decompressor.stdout)
+                processes.append(extractor)
+                decompressor.stdout.close() # Owned by extractor now.
+                while extractor.poll() is None:
+                    if _cancel_event.wait(timeout=0.5):
+                        return
+            else:
+                with tarfile.open(fileobj=decompressor.stdout, mode="r|") as tar:
+                    extract_members(tar)
+            feeder.join()
+            for process in processes:
+                if process.wait() != 0:
+                    raise RuntimeError(f"{process.args[0]} failed with code {process.returncode}")
+        else:
+            class CountingReader:
+                def read(self, size: int = -1) -> bytes:
+                    chunk = source.read(size)
+                    report_progress(len(chunk))
+                    return chunk
+            with tarfile.open(fileobj=CountingReader(), mode=f"r|{compression}") as tar:
+                extract_members(tar)
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+        source.close()
+
+def open_fifo_for_writing(path: str, abort_event: threading.Event | None = None, timeout: float = 60) -> BinaryIO:
+    """Opens FIFO for writing once its reader (eq. root function) opens it."""
+    """Fails if abort_event is set (reader finished without opening it) or after timeout."""
+    import errno, fcntl, time
+    start_time = time.time()
+    while True:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            if e.errno != errno.ENXIO: # No reader yet.
+                raise
+        if (abort_event and abort_event.is_set()) or time.time() - start_time > timeout:
+            raise RuntimeError(f"No reader opened {path}")
+        time.sleep(0.05)
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+    return os.fdopen(fd, "wb")
+
 def create_squashfs(source_directory: str, output_file: str) -> subprocess.Popen:
     """Note: Runs as separate process, so need to wait for it to finish when called"""
     command = ['mksquashfs', source_directory, output_file, '-quiet', '-percentage']
@@ -105,6 +208,25 @@ def get_file_size_string(path: str) -> str | None:
         print(e)
         return None
 
+def file_fingerprint(path: str) -> tuple[int, int, int] | None:
+    """Inode, size and modification time of file. Changes whenever file is rewritten or replaced."""
+    try:
+        stat = os.stat(path)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None
+
+def directory_disk_usage(path: str) -> int:
+    """Disk usage of files in directory and its subdirectories, in bytes. Walks whole tree, avoid calling in main loop."""
+    total_size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total_size += os.lstat(os.path.join(root, name)).st_blocks * 512
+            except OSError:
+                pass
+    return total_size
+
 def parse_strict_rfc_datetime(s: str) -> datetime:
     import locale
     match = re.search(r'([+-]\d{4})$', s.strip())
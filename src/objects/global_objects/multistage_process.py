@@ -4,7 +4,7 @@ from gi.repository import GLib
 from typing import final
 from enum import Enum, auto
 from abc import ABC, abstractmethod
-from .event_bus import EventBus
+from .event_bus import EventBus, EventPolicy, EventDelivery
 from .root_helper_client import AuthorizationKeeper
 
 # ------------------------------------------------------------------------------
@@ -46,6 +46,13 @@ class MultiStageProcessStageEvent(Enum):
     STATE_CHANGED = auto()
     PROGRESS_CHANGED = auto()
 
+# Handlers read current state and progress, so only the latest emit needs to reach main loop.
+EventBus.set_policy(
+    MultiStageProcessEvent.STATE_CHANGED, MultiStageProcessEvent.PROGRESS_CHANGED,
+    MultiStageProcessStageEvent.STATE_CHANGED, MultiStageProcessStageEvent.PROGRESS_CHANGED,
+    policy=EventPolicy(delivery=EventDelivery.LATEST, max_rate=30)
+)
+
 # ------------------------------------------------------------------------------
 # MultiStageProcess base class:
 # ------------------------------------------------------------------------------
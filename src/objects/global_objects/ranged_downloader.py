@@ -0,0 +1,202 @@
+from __future__ import annotations
+import os, re, threading, requests
+from typing import final, BinaryIO, Iterator
+from requests.adapters import HTTPAdapter
+
+@final
+class RangedDownloadSegment:
+    """Byte range [start, end) of downloaded file fetched by a single connection. End is None if size is unknown."""
+    def __init__(self, start: int, end: int | None):
+        self.start = start
+        self.end = end
+        self.downloaded = 0
+        self.finished = False
+
+    @property
+    def size(self) -> int | None:
+        return None if self.end is None else self.end - self.start
+
+    @property
+    def progress(self) -> float | None:
+        return self.downloaded / self.size if self.size else None
+
+@final
+class RangedDownloader:
+    """Downloads file into given writable file, splitting it into byte ranges fetched over several pooled connections."""
+    """Segments are written with pwrite to preallocated file. Falls back to single stream if server doesn't support Range."""
+    """Content can be consumed in order while downloading, using chunks(). Download starts at offset, so bytes already"""
+    """present in file are kept (resume). Per segment progress is available in segments."""
+
+    CHUNK_SIZE = 1024 * 1024
+    MAX_CONNECTIONS = 4
+    MIN_SEGMENT_SIZE = 16 * 1024 * 1024 # Smaller files are not split.
+    MAX_ATTEMPTS = 5 # Network errors are retried from the last received byte of segment.
+    TIMEOUT = 10
+
+    def __init__(self, url: str, file: BinaryIO, offset: int = 0, connections: int = MAX_CONNECTIONS, session: requests.Session | None = None):
+        self.url = url
+        self.fd = file.fileno()
+        self.offset = offset
+        self.connections = max(1, connections)
+        self.session = session or RangedDownloader.create_session(connections=self.connections)
+        self.total_size: int | None = None
+        self.supports_ranges = False
+        self.segments: list[RangedDownloadSegment] = []
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._error: Exception | None = None
+
+    @staticmethod
+    def create_session(connections: int = MAX_CONNECTIONS) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @property
+    def progress(self) -> float | None:
+        """Overall progress, including bytes that were present before download started."""
+        if not self.total_size:
+            return None
+        return (self.offset + sum(segment.downloaded for segment in self.segments)) / self.total_size
+
+    @property
+    def contiguous_end(self) -> int:
+        """End of data written continuously from the start of file."""
+        position = self.offset
+        for segment in self.segments:
+            position = segment.start + segment.downloaded
+            if not segment.finished:
+                break
+        return position
+
+    # --------------------------------------------------------------------------
+    # Downloading:
+
+    def probe(self):
+        """Reads total size and Range support with a single byte request."""
+        with self.session.get(self.url, headers={"Range": f"bytes={self.offset}-{self.offset}"}, stream=True, timeout=RangedDownloader.TIMEOUT) as response:
+            content_range = response.headers.get("content-range", "")
+            if response.status_code == 206 and (match := re.match(r"bytes \d+-\d+/(\d+)", content_range)):
+                self.supports_ranges = True
+                self.total_size = int(match.group(1))
+            elif response.status_code == 416 and (match := re.match(r"bytes \*/(\d+)", content_range)):
+                # Offset is already at the end of file.
+                self.supports_ranges = True
+                self.total_size = int(match.group(1))
+            else:
+                response.raise_for_status()
+                content_length = response.headers.get("content-length")
+                self.total_size = int(content_length) if content_length else None
+
+    def download(self) -> bool:
+        """Downloads whole file, blocking until done. Returns False if stopped."""
+        for _ in self.chunks():
+            pass
+        return not self._stop_event.is_set()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def chunks(self) -> Iterator[bytes]:
+        """Starts download and yields file content from offset, in order, as soon as it's written."""
+        """Raises if any segment fails. Closing the iterator stops the download."""
+        self.probe()
+        self._plan_segments()
+        self._preallocate()
+        threads = [threading.Thread(target=self._run_segment, args=(segment,), daemon=True) for segment in self.segments]
+        for thread in threads:
+            thread.start()
+        position = self.offset
+        try:
+            while True:
+                with self._condition:
+                    while (
+                        self.contiguous_end <= position and self._error is None and not self._stop_event.is_set()
+                        and not all(segment.finished for segment in self.segments)
+                    ):
+                        self._condition.wait()
+                    if self._error:
+                        raise self._error
+                    available = self.contiguous_end - position
+                if available <= 0 or self._stop_event.is_set():
+                    return
+                data = os.pread(self.fd, min(available, RangedDownloader.CHUNK_SIZE), position)
+                position += len(data)
+                yield data
+        finally:
+            self._stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    def _plan_segments(self):
+        remaining = self.total_size - self.offset if self.total_size is not None else None
+        if remaining is not None and remaining <= 0:
+            self.segments = []
+        elif self.supports_ranges and remaining:
+            count = max(1, min(self.connections, remaining // RangedDownloader.MIN_SEGMENT_SIZE))
+            bounds = [self.offset + remaining * i // count for i in range(count + 1)]
+            self.segments = [RangedDownloadSegment(start=bounds[i], end=bounds[i + 1]) for i in range(count)]
+        else:
+            self.segments = [RangedDownloadSegment(start=self.offset, end=self.total_size)]
+
+    def _preallocate(self):
+        if not self.total_size or self.total_size <= self.offset:
+            return
+        try:
+            os.posix_fallocate(self.fd, self.offset, self.total_size - self.offset)
+        except OSError:
+            os.ftruncate(self.fd, self.total_size) # Filesystem doesn't support fallocate.
+
+    def _run_segment(self, segment: RangedDownloadSegment):
+        try:
+            self._download_segment(segment=segment)
+        except Exception as e:
+            with self._condition:
+                self._error = self._error or e
+                self._condition.notify_all()
+
+    def _download_segment(self, segment: RangedDownloadSegment):
+        for attempt in range(RangedDownloader.MAX_ATTEMPTS):
+            position = segment.start + segment.downloaded
+            try:
+                end = "" if segment.end is None else segment.end - 1
+                headers = {"Range": f"bytes={position}-{end}"} if self.supports_ranges else {}
+                with self.session.get(self.url, headers=headers, stream=True, timeout=RangedDownloader.TIMEOUT) as response:
+                    response.raise_for_status()
+                    # Without Range support server sends whole file, skip bytes we already have.
+                    skip = 0 if response.status_code == 206 else position
+                    for chunk in response.iter_content(chunk_size=RangedDownloader.CHUNK_SIZE):
+                        if self._stop_event.is_set():
+                            return
+                        if skip:
+                            dropped = min(skip, len(chunk))
+                            skip -= dropped
+                            chunk = chunk[dropped:]
+                        if segment.end is not None:
+                            chunk = chunk[:segment.end - position]
+                        if not chunk:
+                            continue
+                        view = memoryview(chunk)
+                        while view:
+                            written = os.pwrite(self.fd, view, position)
+                            position += written
+                            view = view[written:]
+                        with self._condition:
+                            segment.downloaded += len(chunk)
+                            self._condition.notify_all()
+                        if segment.end is not None and position >= segment.end:
+                            break
+                if segment.end is None or position >= segment.end:
+                    with self._condition:
+                        segment.end = position
+                        segment.finished = True
+                        self._condition.notify_all()
+                    return
+                print(f"Segment {segment.start}-{segment.end} of {self.url} ended early at {position} (attempt {attempt + 1})")
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                print(f"Segment {segment.start}-{segment.end} of {self.url} interrupted at {position} (attempt {attempt + 1}): {e}")
+        raise RuntimeError(f"Failed to download {self.url}")
@@ -1,9 +1,16 @@
 from __future__ import annotations
-from typing import Protocol, Self, TypeVar, Generic, Type
+from typing import Protocol, Self, TypeVar, Generic, Type, Iterator, Any
+from contextlib import contextmanager
 import json
 import os
+import sqlite3
+import tempfile
+import threading
+import time
 from .runtime_env import RuntimeEnv
+from .startup_profiler import StartupProfiler
 from .event_bus import EventBus
+from .repository_store import RepositoryStore
 from enum import Enum, auto
 from typing import final
 
@@ -82,59 +89,214 @@ class Repository(Generic[T]):
             raise RuntimeError(f"Repository with alias {self._alias} is already in use. Use shared instance for the same values.")
         else:
             Repository.registered_aliases.append(self._alias)
-        self._value: T | TrackedList[T] = self._load()
+        # Value is loaded from file on first access, so registering repositories doesn't read all files at startup.
+        self._value: T | TrackedList[T] | None = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        # Saving state:
+        self._state_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending_snapshot: T | list[T] | None = None # Value waiting for RepositoryWriter, collections are copied.
+        self._write_error: Exception | None = None # Failure of background write, raised from next save or flush.
+        self._transaction_depth = 0
+        self._transaction_changed = False
+        self._indexes: dict[str, dict[Any, T]] = {} # Attribute name: {value: item}, built by find.
+        self._revision = 0 # Incremented on every save, so that index built during save is not kept.
 
-    def _config_file(self) -> str:
+    @staticmethod
+    def config_directory() -> str:
         config_paths = {
             RuntimeEnv.FLATPAK: lambda: os.path.expanduser(f"~/.var/app/{os.environ.get('FLATPAK_ID')}/config"),
             RuntimeEnv.HOST: lambda: os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config")),
         }
-        config_base = os.path.join(config_paths.get(RuntimeEnv.current())(), "catalystlab")
-        return os.path.join(config_base, f"{self._alias}.json")
+        return os.path.join(config_paths.get(RuntimeEnv.current())(), "catalystlab")
+
+    def _config_file(self) -> str:
+        return os.path.join(Repository.config_directory(), f"{self._alias}.json")
 
     def save(self):
-        path = self._config_file()
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+        """Announces changed value and schedules writing it to file."""
+        """Only a shallow copy of collection is taken here, in calling thread. Serializing, encoding and writing"""
+        """are debounced and done by RepositoryWriter thread, so many changes in a row cost one write."""
+        """Inside transaction, saving is postponed until it ends."""
+        if self._collection and not isinstance(self._value, list):
+            raise TypeError("Expected a list of serializable items.")
+        with self._state_lock:
+            self._indexes.clear()
+            self._revision += 1
+            if self._transaction_depth > 0:
+                self._transaction_changed = True
+                return
+            self._pending_snapshot = list(self._value) if self._collection else self._value
+        RepositoryWriter.shared().schedule(self)
+        self.event_bus.emit(RepositoryEvent.VALUE_CHANGED, self._value)
+        self._raise_write_error()
+
+    @contextmanager
+    def transaction(self) -> Iterator[Self]:
+        """Groups changes, so that they are saved and announced once, when the outermost transaction ends."""
+        with self._state_lock:
+            self._transaction_depth += 1
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                if self._collection:
-                    if not isinstance(self._value, list):
-                        raise TypeError("Expected a list of serializable items.")
-                    json.dump({"items": [item.serialize() for item in self._value]}, f, indent=2)
-                else:
-                    json.dump(self._value.serialize(), f, indent=2)
-        except Exception as e:
-            raise e
+            yield self
         finally:
-            self.event_bus.emit(RepositoryEvent.VALUE_CHANGED, self._value)
+            with self._state_lock:
+                self._transaction_depth -= 1
+                changed = self._transaction_depth == 0 and self._transaction_changed
+                if changed:
+                    self._transaction_changed = False
+            if changed:
+                self.save()
+
+    def flush(self):
+        """Writes pending changes immediately, in calling thread."""
+        RepositoryWriter.shared().cancel(self)
+        self._write()
+        self._raise_write_error()
+
+    def _encode(self, snapshot: T | list[T]) -> str | list:
+        if self._collection:
+            data = {"items": [item.serialize() for item in snapshot]}
+        else:
+            data = snapshot.serialize()
+        if RepositoryStore.shared():
+            return RepositoryStore.encode(data=data, collection=self._collection)
+        return json.dumps(data, indent=2)
+
+    def _write(self):
+        """Serializes and writes pending snapshot. Called by RepositoryWriter thread, or by flush."""
+        with self._write_lock:
+            with self._state_lock:
+                snapshot = self._pending_snapshot
+                self._pending_snapshot = None
+            if snapshot is None:
+                return
+            try:
+                payload = self._encode(snapshot=snapshot)
+                if store := RepositoryStore.shared():
+                    store.write(alias=self._alias, collection=self._collection, encoded=payload)
+                else:
+                    Repository._write_atomically(path=self._config_file(), content=payload)
+            except Exception as e:
+                with self._state_lock:
+                    if self._pending_snapshot is None:
+                        self._pending_snapshot = snapshot # Retried by next flush, unless newer value is saved.
+                    self._write_error = e
+                raise
+            with self._state_lock:
+                self._write_error = None
+
+    def _raise_write_error(self):
+        with self._state_lock:
+            error = self._write_error
+            self._write_error = None
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def _write_atomically(path: str, content: str):
+        """Writes to temporary file in the same directory and renames it over destination, so that crash"""
+        """during writing leaves either old or new file, never a truncated one."""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        # Persist rename itself.
+        try:
+            directory_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(directory_fd)
+            finally:
+                os.close(directory_fd)
+        except OSError:
+            pass
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                with StartupProfiler.measure(f"load repository {self._alias}"):
+                    self._value = self._load()
+                self._loaded = True
 
     def _load(self) -> T | TrackedList[T]:
-        path = self._config_file()
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            if store := RepositoryStore.shared():
+                # Repositories not yet in database are migrated from JSON files.
+                data = store.load(alias=self._alias, collection=self._collection, migrate=self._read_file)
+            else:
+                data = self._read_file()
+            if data is None:
+                raise FileNotFoundError(self._config_file())
             if self._collection:
                 items_data = data.get("items", [])
                 return TrackedList([self._cls.init_from(item) for item in items_data], self.save)
             else:
                 return self._cls.init_from(data)
-        except (FileNotFoundError, json.JSONDecodeError, ValueError, AttributeError):
+        except (FileNotFoundError, json.JSONDecodeError, ValueError, AttributeError, sqlite3.Error):
             return TrackedList([], self.save) if self._collection else self._default_factory()
 
+    def _read_file(self) -> dict | None:
+        try:
+            with open(self._config_file(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
     def _delete(self):
+        RepositoryWriter.shared().cancel(self)
+        with self._write_lock, self._state_lock:
+            self._pending_snapshot = None
+            self._write_error = None
         path = self._config_file()
         if os.path.isfile(path):
             os.remove(path)
+        if store := RepositoryStore.shared():
+            store.delete(alias=self._alias)
+        self._indexes.clear()
         self._value = TrackedList([], self.save) if self._collection else self._default_factory()
+        self._loaded = True
 
     def reset(self):
         self._delete()
 
+    def find(self, attribute: str, value: Any) -> T | None:
+        """Returns first item of collection with given attribute value, eq. find("uuid", toolset_id)."""
+        """Uses index built on first lookup of attribute and dropped on every save, instead of scanning list."""
+        if value is None:
+            return None
+        items = self.value
+        with self._state_lock:
+            index = self._indexes.get(attribute)
+            revision = self._revision
+        if index is None:
+            index = {}
+            for item in list(items):
+                index.setdefault(getattr(item, attribute), item)
+            with self._state_lock:
+                if self._revision == revision:
+                    self._indexes[attribute] = index
+        return index.get(value)
+
     @property
     def value(self) -> T | TrackedList[T]:
+        self._ensure_loaded()
         return self._value
     @value.setter
     def value(self, new_value: T | list[T]):
+        self._loaded = True
         if self._collection:
             if isinstance(new_value, TrackedList):
                 self._value = new_value
@@ -149,3 +311,75 @@ class Repository(Generic[T]):
             self._value = new_value
             self.save()
 
+@final
+class RepositoryWriter:
+    """Background thread writing changed repositories to files."""
+    """Write happens DELAY seconds after the last change, but no later than MAX_DELAY after the first one,"""
+    """so that constant changes (eq. progress of many operations) are still persisted."""
+
+    _instance: RepositoryWriter | None = None
+    _instance_lock = threading.Lock()
+
+    DELAY = 0.5
+    MAX_DELAY = 3.0
+
+    @classmethod
+    def shared(cls) -> RepositoryWriter:
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._scheduled: dict[Repository, tuple[float, float]] = {} # Repository: (first change, write time).
+        self._repositories: set[Repository] = set() # All repositories that were ever scheduled.
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, repository: Repository):
+        now = time.monotonic()
+        with self._condition:
+            first_change, _ = self._scheduled.get(repository, (now, now))
+            self._scheduled[repository] = (first_change, min(now + self.DELAY, first_change + self.MAX_DELAY))
+            self._repositories.add(repository)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="repository-writer", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self, repository: Repository):
+        with self._condition:
+            self._scheduled.pop(repository, None)
+
+    def flush(self):
+        """Writes all scheduled repositories immediately. Called when application is closing."""
+        with self._condition:
+            repositories = list(self._repositories)
+            self._scheduled.clear()
+        # Also covers repositories already taken by writer thread, _write waits for it and skips if nothing changed.
+        errors = []
+        for repository in repositories:
+            try:
+                repository.flush()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    due = [repository for repository, (_, write_time) in self._scheduled.items() if write_time <= now]
+                    if due:
+                        for repository in due:
+                            del self._scheduled[repository]
+                        break
+                    next_write = min((write_time for _, write_time in self._scheduled.values()), default=None)
+                    self._condition.wait(timeout=None if next_write is None else next_write - now)
+            for repository in due:
+                try:
+                    repository._write()
+                except Exception:
+                    pass # Kept by repository and raised from its next save or flush.
@@ -0,0 +1,190 @@
+from __future__ import annotations
+import os, sys, json, sqlite3, threading
+from typing import final, Callable, Any
+
+@final
+class RepositoryStore:
+    """Optional SQLite database used by repositories instead of JSON files."""
+    """Every collection has its own table with one row per item and indexes on uuid, id, filename and name."""
+    """Saving compares items with rows written previously and only inserts, updates or deletes changed rows."""
+    """Enabled with --sqlite-store. Once database exists it's used on every start. Repositories missing from"""
+    """database are migrated from their JSON files, which are left untouched."""
+
+    OPTION = "sqlite-store"
+    FILE_NAME = "catalystlab.db"
+    INDEXED_FIELDS = ["uuid", "id", "filename", "name"] # First of these present in item identifies its row.
+
+    _instance: RepositoryStore | None = None
+    _instance_loaded = False
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> RepositoryStore | None:
+        """Returns store if it's enabled, None when repositories should use JSON files."""
+        with cls._instance_lock:
+            if not cls._instance_loaded:
+                cls._instance_loaded = True
+                from .repository import Repository
+                path = os.path.join(Repository.config_directory(), RepositoryStore.FILE_NAME)
+                if f"--{RepositoryStore.OPTION}" in sys.argv or os.path.isfile(path):
+                    try:
+                        cls._instance = cls(path=path)
+                    except sqlite3.Error as e:
+                        print(f"Failed to open {path}, using JSON files: {e}")
+            return cls._instance
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        # Connection is shared by writer thread and threads loading repositories, access is serialized by lock.
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._rows: dict[str, dict[str, tuple[int, str]]] = {} # Alias: {key: (position, data)} as stored in table.
+        self._tables: set[str] = set() # Aliases of tables created in this session.
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS repositories (alias TEXT PRIMARY KEY, collection INTEGER NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS repository_values (alias TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    # --------------------------------------------------------------------------
+    # Loading:
+
+    def load(self, alias: str, collection: bool, migrate: Callable[[], dict | None]) -> dict | None:
+        """Returns data in the same format as repository JSON file, or None if there is nothing stored."""
+        """Repository not stored yet is filled with data returned by migrate."""
+        with self._lock:
+            row = self._connection.execute("SELECT collection FROM repositories WHERE alias = ?", (alias,)).fetchone()
+            if row is not None:
+                if collection:
+                    self._create_table(alias=alias)
+                    rows = self._connection.execute(
+                        f"SELECT key, position, data FROM {self._table(alias)} ORDER BY position"
+                    ).fetchall()
+                    self._rows[alias] = {key: (position, data) for key, position, data in rows}
+                    return {"items": [json.loads(data) for _, _, data in rows]}
+                else:
+                    row = self._connection.execute("SELECT data FROM repository_values WHERE alias = ?", (alias,)).fetchone()
+                    return json.loads(row[0]) if row else None
+        data = migrate()
+        if data is not None:
+            self.write(alias=alias, collection=collection, encoded=RepositoryStore.encode(data=data, collection=collection))
+        return data
+
+    # --------------------------------------------------------------------------
+    # Saving:
+
+    @staticmethod
+    def encode(data: dict, collection: bool) -> list[tuple[str, list[str | None], str]] | str:
+        """Converts data in the same format as repository JSON file to rows passed to write."""
+        """Called by RepositoryWriter thread, together with serializing repository value."""
+        """For collections returns (key, indexed values, JSON) of every item, otherwise JSON of value."""
+        if not collection:
+            return json.dumps(data)
+        rows = []
+        keys = set()
+        for position, item in enumerate(data.get("items", [])):
+            indexed_values = [None if item.get(field) is None else str(item[field]) for field in RepositoryStore.INDEXED_FIELDS]
+            key = next(
+                (f"{field}:{value}" for field, value in zip(RepositoryStore.INDEXED_FIELDS, indexed_values) if value is not None),
+                f"#{position}"
+            )
+            if key in keys:
+                key = f"{key}#{position}" # Items with duplicated identifiers are still stored.
+            keys.add(key)
+            rows.append((key, indexed_values, json.dumps(item)))
+        return rows
+
+    def write(self, alias: str, collection: bool, encoded: list[tuple[str, list[str | None], str]] | str):
+        """Stores data returned by encode."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute("INSERT OR IGNORE INTO repositories (alias, collection) VALUES (?, ?)", (alias, int(collection)))
+                if collection:
+                    self._write_items(alias=alias, items=encoded)
+                else:
+                    self._connection.execute(
+                        "INSERT INTO repository_values (alias, data) VALUES (?, ?) ON CONFLICT(alias) DO UPDATE SET data = excluded.data",
+                        (alias, encoded)
+                    )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                # Cached rows and tables might not match database anymore, reload them on next write.
+                self._rows.pop(alias, None)
+                self._tables.discard(alias)
+                raise
+
+    def _write_items(self, alias: str, items: list[tuple[str, list[str | None], str]]):
+        table = self._table(alias)
+        self._create_table(alias=alias)
+        stored_rows = self._rows.get(alias)
+        if stored_rows is None:
+            stored_rows = {
+                key: (position, data) for key, position, data
+                in self._connection.execute(f"SELECT key, position, data FROM {table}")
+            }
+        rows: dict[str, tuple[int, str]] = {
+            key: (position, data) for position, (key, _, data) in enumerate(items)
+        }
+        removed_keys = [(key,) for key in stored_rows.keys() - rows.keys()]
+        changed_rows = [
+            (key, position, *indexed_values, data)
+            for position, (key, indexed_values, data) in enumerate(items)
+            if stored_rows.get(key) != (position, data)
+        ]
+        if removed_keys:
+            self._connection.executemany(f"DELETE FROM {table} WHERE key = ?", removed_keys)
+        if changed_rows:
+            fields = ", ".join(RepositoryStore.INDEXED_FIELDS)
+            updates = ", ".join(f"{field} = excluded.{field}" for field in ["position", *RepositoryStore.INDEXED_FIELDS, "data"])
+            placeholders = ", ".join("?" * (len(RepositoryStore.INDEXED_FIELDS) + 3))
+            self._connection.executemany(
+                f"INSERT INTO {table} (key, position, {fields}, data) VALUES ({placeholders}) "
+                f"ON CONFLICT(key) DO UPDATE SET {updates}",
+                changed_rows
+            )
+        self._rows[alias] = rows
+
+    def delete(self, alias: str):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute(f"DROP TABLE IF EXISTS {self._table(alias)}")
+            self._connection.execute("DELETE FROM repository_values WHERE alias = ?", (alias,))
+            self._connection.execute("DELETE FROM repositories WHERE alias = ?", (alias,))
+            self._connection.execute("COMMIT")
+            self._rows.pop(alias, None)
+            self._tables.discard(alias)
+
+    # --------------------------------------------------------------------------
+    # Queries:
+
+    def find(self, alias: str, field: str, value: Any) -> list[dict]:
+        """Returns stored items with given value of indexed field, without loading whole collection."""
+        if field not in RepositoryStore.INDEXED_FIELDS:
+            raise ValueError(f"Field {field} is not indexed")
+        with self._lock:
+            self._create_table(alias=alias)
+            rows = self._connection.execute(
+                f"SELECT data FROM {self._table(alias)} WHERE {field} = ? ORDER BY position", (str(value),)
+            ).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    # --------------------------------------------------------------------------
+    # Helpers:
+
+    @staticmethod
+    def _table(alias: str) -> str:
+        return '"' + ("collection_" + alias).replace('"', '""') + '"'
+
+    def _create_table(self, alias: str):
+        if alias in self._tables:
+            return
+        table = self._table(alias)
+        fields = ", ".join(f"{field} TEXT" for field in RepositoryStore.INDEXED_FIELDS)
+        self._connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, position INTEGER NOT NULL, {fields}, data TEXT NOT NULL)")
+        for field in RepositoryStore.INDEXED_FIELDS:
+            index = '"' + f"index_{alias}_{field}".replace('"', '""') + '"'
+            self._connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({field})")
+        self._tables.add(alias)
@@ -13,6 +13,15 @@ class SettingsEvents(Enum):
     OVERLAY_LOCATION_CHANGED = auto()
     PROJECT_LOCATION_CHANGED = auto()
     INITIAL_SETUP_DONE_CHANGED = auto()
+    TOOLSET_SPAWN_POOL_CHANGED = auto()
+    TOOLSET_CACHE_CHANGED = auto()
+    PORTAGE_TMPFS_CHANGED = auto()
+
+# Packages too big to be built in portage tmpfs. Packages which run out of space in tmpfs are added automatically.
+DEFAULT_PORTAGE_TMPFS_EXCEPTIONS = (
+    "www-client/chromium", "www-client/firefox", "dev-qt/qtwebengine", "app-office/libreoffice",
+    "dev-lang/rust", "llvm-core/llvm", "llvm-core/clang", "sys-devel/gcc",
+)
 
 @final
 class Settings(Serializable):
@@ -26,7 +35,18 @@ class Settings(Serializable):
         snapshots_location: str = "~/CatalystLab/Snapshots",
         releng_location: str = "~/CatalystLab/Releng",
         overlay_location: str = "~/CatalystLab/Overlays",
-        project_location: str = "~/CatalystLab/Projects"
+        project_location: str = "~/CatalystLab/Projects",
+        toolset_spawn_pool_enabled: bool = False,
+        toolset_spawn_pool_max_count: int = 2,
+        toolset_spawn_pool_max_disk_usage: int = 8 * 1024 ** 3,
+        toolset_cache_enabled: bool = False,
+        toolset_cache_location: str = "~/CatalystLab/Cache",
+        toolset_cache_max_size: int = 32 * 1024 ** 3,
+        toolset_binhost_enabled: bool = True,
+        portage_tmpfs_mode: str = "auto",
+        portage_tmpfs_max_size: int = 8 * 1024 ** 3,
+        portage_tmpfs_catalyst: bool = False,
+        portage_tmpfs_exceptions: list[str] = DEFAULT_PORTAGE_TMPFS_EXCEPTIONS
     ):
         self._initial_setup_done = initial_setup_done
         self._keep_root_unlocked = keep_root_unlocked
@@ -35,6 +55,17 @@ class Settings(Serializable):
         self._releng_location = releng_location
         self._overlay_location = overlay_location
         self._project_location = project_location
+        self._toolset_spawn_pool_enabled = toolset_spawn_pool_enabled
+        self._toolset_spawn_pool_max_count = toolset_spawn_pool_max_count
+        self._toolset_spawn_pool_max_disk_usage = toolset_spawn_pool_max_disk_usage
+        self._toolset_cache_enabled = toolset_cache_enabled
+        self._toolset_cache_location = toolset_cache_location
+        self._toolset_cache_max_size = toolset_cache_max_size
+        self._toolset_binhost_enabled = toolset_binhost_enabled
+        self._portage_tmpfs_mode = portage_tmpfs_mode
+        self._portage_tmpfs_max_size = portage_tmpfs_max_size
+        self._portage_tmpfs_catalyst = portage_tmpfs_catalyst
+        self._portage_tmpfs_exceptions = list(portage_tmpfs_exceptions)
         self.event_bus = EventBus[SettingsEvents]()
 
     @classmethod
@@ -47,7 +78,18 @@ class Settings(Serializable):
                 snapshots_location=data["snapshots_location"],
                 releng_location=data["releng_location"],
                 overlay_location=data["overlay_location"],
-                project_location=data["project_location"]
+                project_location=data["project_location"],
+                toolset_spawn_pool_enabled=data.get("toolset_spawn_pool_enabled", False),
+                toolset_spawn_pool_max_count=data.get("toolset_spawn_pool_max_count", 2),
+                toolset_spawn_pool_max_disk_usage=data.get("toolset_spawn_pool_max_disk_usage", 8 * 1024 ** 3),
+                toolset_cache_enabled=data.get("toolset_cache_enabled", False),
+                toolset_cache_location=data.get("toolset_cache_location", "~/CatalystLab/Cache"),
+                toolset_cache_max_size=data.get("toolset_cache_max_size", 32 * 1024 ** 3),
+                toolset_binhost_enabled=data.get("toolset_binhost_enabled", True),
+                portage_tmpfs_mode=data.get("portage_tmpfs_mode", "auto"),
+                portage_tmpfs_max_size=data.get("portage_tmpfs_max_size", 8 * 1024 ** 3),
+                portage_tmpfs_catalyst=data.get("portage_tmpfs_catalyst", False),
+                portage_tmpfs_exceptions=data.get("portage_tmpfs_exceptions", DEFAULT_PORTAGE_TMPFS_EXCEPTIONS)
             )
         except:
             return cls()
@@ -60,7 +102,18 @@ class Settings(Serializable):
             "snapshots_location": self.snapshots_location,
             "releng_location": self.releng_location,
             "overlay_location": self.overlay_location,
-            "project_location": self.project_location
+            "project_location": self.project_location,
+            "toolset_spawn_pool_enabled": self.toolset_spawn_pool_enabled,
+            "toolset_spawn_pool_max_count": self.toolset_spawn_pool_max_count,
+            "toolset_spawn_pool_max_disk_usage": self.toolset_spawn_pool_max_disk_usage,
+            "toolset_cache_enabled": self.toolset_cache_enabled,
+            "toolset_cache_location": self.toolset_cache_location,
+            "toolset_cache_max_size": self.toolset_cache_max_size,
+            "toolset_binhost_enabled": self.toolset_binhost_enabled,
+            "portage_tmpfs_mode": self.portage_tmpfs_mode,
+            "portage_tmpfs_max_size": self.portage_tmpfs_max_size,
+            "portage_tmpfs_catalyst": self.portage_tmpfs_catalyst,
+            "portage_tmpfs_exceptions": self.portage_tmpfs_exceptions
         }
 
     # --------------------------------------------------------------------------
@@ -175,3 +228,154 @@ class Settings(Serializable):
             )
             Repository.Settings.save()
 
+    # --------------------------------------------------------------------------
+    # Accessors for toolset spawn pool:
+
+    @property
+    def toolset_spawn_pool_enabled(self) -> bool:
+        return self._toolset_spawn_pool_enabled
+    @toolset_spawn_pool_enabled.setter
+    def toolset_spawn_pool_enabled(self, value: bool):
+        if self._toolset_spawn_pool_enabled != value:
+            self._toolset_spawn_pool_enabled = value
+            self.event_bus.emit(
+                SettingsEvents.TOOLSET_SPAWN_POOL_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    @property
+    def toolset_spawn_pool_max_count(self) -> int:
+        return self._toolset_spawn_pool_max_count
+    @toolset_spawn_pool_max_count.setter
+    def toolset_spawn_pool_max_count(self, value: int):
+        if self._toolset_spawn_pool_max_count != value:
+            self._toolset_spawn_pool_max_count = value
+            self.event_bus.emit(
+                SettingsEvents.TOOLSET_SPAWN_POOL_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    @property
+    def toolset_spawn_pool_max_disk_usage(self) -> int:
+        return self._toolset_spawn_pool_max_disk_usage
+    @toolset_spawn_pool_max_disk_usage.setter
+    def toolset_spawn_pool_max_disk_usage(self, value: int):
+        if self._toolset_spawn_pool_max_disk_usage != value:
+            self._toolset_spawn_pool_max_disk_usage = value
+            self.event_bus.emit(
+                SettingsEvents.TOOLSET_SPAWN_POOL_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    # --------------------------------------------------------------------------
+    # Accessors for toolset caches:
+
+    @property
+    def toolset_cache_enabled(self) -> bool:
+        return self._toolset_cache_enabled
+    @toolset_cache_enabled.setter
+    def toolset_cache_enabled(self, value: bool):
+        if self._toolset_cache_enabled != value:
+            self._toolset_cache_enabled = value
+            self.event_bus.emit(
+                SettingsEvents.TOOLSET_CACHE_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    @property
+    def toolset_cache_location(self) -> str:
+        return self._toolset_cache_location
+    @toolset_cache_location.setter
+    def toolset_cache_location(self, value: str):
+        if self._toolset_cache_location != value:
+            self._toolset_cache_location = value
+            self.event_bus.emit(
+                SettingsEvents.TOOLSET_CACHE_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    @property
+    def toolset_cache_max_size(self) -> int:
+        return self._toolset_cache_max_size
+    @toolset_cache_max_size.setter
+    def toolset_cache_max_size(self, value: int):
+        if self._toolset_cache_max_size != value:
+            self._toolset_cache_max_size = value
+            self.event_bus.emit(
+                SettingsEvents.TOOLSET_CACHE_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    @property
+    def toolset_binhost_enabled(self) -> bool:
+        return self._toolset_binhost_enabled
+    @toolset_binhost_enabled.setter
+    def toolset_binhost_enabled(self, value: bool):
+        if self._toolset_binhost_enabled != value:
+            self._toolset_binhost_enabled = value
+            self.event_bus.emit(
+                SettingsEvents.TOOLSET_CACHE_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    # --------------------------------------------------------------------------
+    # Accessors for portage tmpfs:
+
+    @property
+    def portage_tmpfs_mode(self) -> str:
+        return self._portage_tmpfs_mode
+    @portage_tmpfs_mode.setter
+    def portage_tmpfs_mode(self, value: str):
+        if self._portage_tmpfs_mode != value:
+            self._portage_tmpfs_mode = value
+            self.event_bus.emit(
+                SettingsEvents.PORTAGE_TMPFS_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    @property
+    def portage_tmpfs_max_size(self) -> int:
+        return self._portage_tmpfs_max_size
+    @portage_tmpfs_max_size.setter
+    def portage_tmpfs_max_size(self, value: int):
+        if self._portage_tmpfs_max_size != value:
+            self._portage_tmpfs_max_size = value
+            self.event_bus.emit(
+                SettingsEvents.PORTAGE_TMPFS_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    @property
+    def portage_tmpfs_catalyst(self) -> bool:
+        return self._portage_tmpfs_catalyst
+    @portage_tmpfs_catalyst.setter
+    def portage_tmpfs_catalyst(self, value: bool):
+        if self._portage_tmpfs_catalyst != value:
+            self._portage_tmpfs_catalyst = value
+            self.event_bus.emit(
+                SettingsEvents.PORTAGE_TMPFS_CHANGED,
+                value
+            )
+            Repository.Settings.save()
+
+    @property
+    def portage_tmpfs_exceptions(self) -> list[str]:
+        return self._portage_tmpfs_exceptions
+    @portage_tmpfs_exceptions.setter
+    def portage_tmpfs_exceptions(self, value: list[str]):
+        if self._portage_tmpfs_exceptions != value:
+            self._portage_tmpfs_exceptions = value
+            self.event_bus.emit(
+                SettingsEvents.PORTAGE_TMPFS_CHANGED,
+                value
+            )
+            Repository.Settings.save()
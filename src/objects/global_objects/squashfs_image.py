@@ -0,0 +1,476 @@
+from __future__ import annotations
+import os, mmap, struct, zlib, lzma, fnmatch, threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+from typing import final, Any, Iterator, TYPE_CHECKING
+if TYPE_CHECKING:
+    from .squashfs_index import SquashfsIndexEntry
+
+class SquashfsError(RuntimeError):
+    pass
+
+@final
+class SquashfsCompression(Enum):
+    GZIP = 1
+    LZMA = 2
+    LZO  = 3
+    XZ   = 4
+    LZ4  = 5
+    ZSTD = 6
+
+@final
+class SquashfsEntryType(Enum):
+    """Basic inode types. Extended inodes (type + 7) are mapped to basic ones."""
+    DIRECTORY    = 1
+    FILE         = 2
+    SYMLINK      = 3
+    BLOCK_DEVICE = 4
+    CHAR_DEVICE  = 5
+    FIFO         = 6
+    SOCKET       = 7
+
+@final
+@dataclass(frozen=True)
+class SquashfsEntry:
+    name: str
+    path: str # Relative to image root, without leading /.
+    type: SquashfsEntryType
+    inode_ref: int
+
+    def is_dir(self) -> bool:
+        return self.type == SquashfsEntryType.DIRECTORY
+
+    def is_file(self) -> bool:
+        return self.type == SquashfsEntryType.FILE
+
+    def is_symlink(self) -> bool:
+        return self.type == SquashfsEntryType.SYMLINK
+
+@final
+@dataclass(frozen=True)
+class SquashfsInode:
+    type: SquashfsEntryType
+    mode: int
+    mtime: int
+    size: int
+    blocks_start: int = 0
+    block_sizes: tuple[int, ...] = ()
+    fragment_index: int = 0xFFFFFFFF
+    fragment_offset: int = 0
+    directory_block: int = 0
+    directory_offset: int = 0
+    symlink_target: str | None = None
+
+@final
+class SquashfsImage:
+    """Read only access to squashfs (4.0) images without spawning unsquashfs or mounting them."""
+    """Image is memory mapped and its inode and directory tables are parsed lazily, only for requested paths,"""
+    """with recently used metadata blocks and directories cached. Supports gzip, xz and lzma compression,"""
+    """zstd and lz4 if their python modules are available. Paths are relative to image root."""
+    """If a valid SquashfsIndex sidecar exists, lookups and listings are answered from it without reading tables."""
+
+    MAGIC = 0x73717368
+    SUPERBLOCK_FORMAT = "<IIIIIHHHHHHQQQQQQQQ"
+    METADATA_BLOCK_SIZE = 8192
+    NO_FRAGMENT = 0xFFFFFFFF
+    MAX_SYMLINK_HOPS = 40
+
+    _images: dict[str, tuple[tuple[int, int, int, int], SquashfsImage]] = {} # Opened images, by path.
+    _images_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path: str) -> SquashfsImage:
+        """Shared image for path. Reopened if the file was replaced or modified."""
+        path = os.path.realpath(path)
+        from .squashfs_index import SquashfsIndex
+        stat = os.stat(path)
+        try:
+            index_mtime = os.stat(SquashfsIndex.path_for(path)).st_mtime_ns
+        except OSError:
+            index_mtime = 0
+        fingerprint = (stat.st_ino, stat.st_size, stat.st_mtime_ns, index_mtime)
+        with cls._images_lock:
+            cached = cls._images.get(path)
+            if cached and cached[0] == fingerprint:
+                return cached[1]
+            image = cls(path)
+            cls._images[path] = (fingerprint, image)
+            if cached:
+                cached[1].close()
+            return image
+
+    def __init__(self, path: str, use_index: bool = True):
+        from .squashfs_index import SquashfsIndex
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < struct.calcsize(SquashfsImage.SUPERBLOCK_FORMAT):
+            raise SquashfsError(f"{path} is not a squashfs image")
+        (
+            magic, self.inode_count, self.modification_time, self.block_size, self.fragment_count,
+            compression, self.block_log, self.flags, self.id_count, version_major, version_minor,
+            self.root_inode_ref, self.bytes_used, self.id_table_start, self.xattr_table_start,
+            self.inode_table_start, self.directory_table_start, self.fragment_table_start, self.export_table_start
+        ) = struct.unpack_from(SquashfsImage.SUPERBLOCK_FORMAT, self._mmap, 0)
+        if magic != SquashfsImage.MAGIC:
+            raise SquashfsError(f"{path} is not a squashfs image")
+        if (version_major, version_minor) != (4, 0):
+            raise SquashfsError(f"Unsupported squashfs version {version_major}.{version_minor} of {path}")
+        try:
+            self.compression = SquashfsCompression(compression)
+        except ValueError:
+            raise SquashfsError(f"Unknown compression {compression} of {path}")
+        self._decompressor = self._create_decompressor()
+        self._metadata_cache = _LRUCache(max_size=1024)
+        self._directory_cache = _LRUCache(max_size=4096)
+        self._fragment_cache = _LRUCache(max_size=16)
+        self.index = SquashfsIndex.open(path) if use_index else None
+
+    def close(self):
+        self._mmap.close()
+        if self.index:
+            self.index.close()
+
+    def __enter__(self) -> SquashfsImage:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # --------------------------------------------------------------------------
+    # Public API:
+
+    def stat(self, path: str, follow_symlinks: bool = True) -> SquashfsInode:
+        return self._inode(self._resolve(path=path, follow_symlinks=follow_symlinks))
+
+    def stat_entry(self, entry: SquashfsEntry) -> SquashfsInode:
+        """Inode of entry returned by scandir, without resolving its path again."""
+        return self._inode(entry.inode_ref)
+
+    def exists(self, path: str) -> bool:
+        try:
+            self._resolve(path=path)
+            return True
+        except OSError:
+            return False
+
+    def isdir(self, path: str) -> bool:
+        try:
+            return self.stat(path).type == SquashfsEntryType.DIRECTORY
+        except OSError:
+            return False
+
+    def isfile(self, path: str) -> bool:
+        try:
+            return self.stat(path).type == SquashfsEntryType.FILE
+        except OSError:
+            return False
+
+    def scandir(self, path: str = "") -> list[SquashfsEntry]:
+        """Entries of directory, sorted by name. Types are taken from directory table, without reading inodes."""
+        if self.index and (indexed := self._indexed_directory(path)) is not None:
+            return [SquashfsEntry(name=entry.name, path=entry.path, type=entry.type, inode_ref=entry.inode_ref) for entry in indexed]
+        inode = self.stat(path)
+        if inode.type != SquashfsEntryType.DIRECTORY:
+            raise NotADirectoryError(path)
+        prefix = SquashfsImage._normalized(path)
+        return [
+            SquashfsEntry(name=name, path=f"{prefix}/{name}" if prefix else name, type=entry_type, inode_ref=inode_ref)
+            for name, (inode_ref, entry_type) in self._directory(inode).items()
+        ]
+
+    def listdir(self, path: str = "") -> list[str]:
+        return [entry.name for entry in self.scandir(path)]
+
+    def walk(self, path: str = "") -> Iterator[tuple[str, list[str], list[str]]]:
+        """Like os.walk (top-down, symlinks to directories are not followed)."""
+        entries = self.scandir(path)
+        dirnames = [entry.name for entry in entries if entry.is_dir()]
+        filenames = [entry.name for entry in entries if not entry.is_dir()]
+        dirpath = SquashfsImage._normalized(path)
+        yield dirpath, dirnames, filenames
+        for dirname in dirnames:
+            yield from self.walk(f"{dirpath}/{dirname}" if dirpath else dirname)
+
+    def glob(self, pattern: str) -> list[str]:
+        """Paths matching pattern with fnmatch wildcards in any component, eq: usr/lib/python*/site-packages."""
+        paths = [""]
+        for component in SquashfsImage._normalized(pattern).split("/"):
+            matches = []
+            for path in paths:
+                if not any(char in component for char in "*?["):
+                    candidate = f"{path}/{component}" if path else component
+                    if self.exists(candidate):
+                        matches.append(candidate)
+                    continue
+                try:
+                    entries = self.scandir(path)
+                except OSError:
+                    continue
+                matches.extend(entry.path for entry in entries if fnmatch.fnmatchcase(entry.name, component))
+            paths = matches
+        return sorted(paths)
+
+    def read(self, path: str) -> bytes:
+        inode = self.stat(path)
+        if inode.type == SquashfsEntryType.DIRECTORY:
+            raise IsADirectoryError(path)
+        if inode.type != SquashfsEntryType.FILE:
+            raise SquashfsError(f"{path} is not a regular file")
+        return self._read_file(inode)
+
+    def read_text(self, path: str, encoding: str = "utf-8") -> str:
+        return self.read(path).decode(encoding)
+
+    # --------------------------------------------------------------------------
+    # Path resolution:
+
+    @staticmethod
+    def _normalized(path: str) -> str:
+        return "/".join(part for part in path.split("/") if part and part != ".")
+
+    def _indexed_directory(self, path: str) -> list[SquashfsIndexEntry] | None:
+        """Children of directory from index. None if path is not a directory in index (eq. it goes through a symlink)."""
+        if SquashfsImage._normalized(path):
+            entry = self.index.lookup(path)
+            if entry is None or entry.type != SquashfsEntryType.DIRECTORY:
+                return None
+        return self.index.children(path)
+
+    def _resolve(self, path: str, follow_symlinks: bool = True) -> int:
+        """Inode reference of path. Symlinks in parent components are always followed."""
+        if self.index:
+            normalized = SquashfsImage._normalized(path)
+            if not normalized:
+                return self.root_inode_ref
+            entry = self.index.lookup(normalized)
+            if entry and (entry.type != SquashfsEntryType.SYMLINK or not follow_symlinks):
+                return entry.inode_ref
+            if entry is None and ".." not in normalized.split("/"):
+                parent = normalized.rpartition("/")[0]
+                parent_entry = self.index.lookup(parent) if parent else None
+                if not parent or (parent_entry and parent_entry.type == SquashfsEntryType.DIRECTORY):
+                    raise FileNotFoundError(path)
+        parts = [part for part in path.split("/") if part and part != "."]
+        parts.reverse() # Used as a stack.
+        parents: list[int] = []
+        current = self.root_inode_ref
+        hops = 0
+        while parts:
+            name = parts.pop()
+            if name == "..":
+                current = parents.pop() if parents else self.root_inode_ref
+                continue
+            inode = self._inode(current)
+            if inode.type != SquashfsEntryType.DIRECTORY:
+                raise NotADirectoryError(path)
+            entry = self._directory(inode).get(name)
+            if entry is None:
+                raise FileNotFoundError(path)
+            inode_ref, entry_type = entry
+            if entry_type == SquashfsEntryType.SYMLINK and (parts or follow_symlinks):
+                hops += 1
+                if hops > SquashfsImage.MAX_SYMLINK_HOPS:
+                    raise SquashfsError(f"Too many levels of symbolic links in {path}")
+                target = self._inode(inode_ref).symlink_target or ""
+                if target.startswith("/"):
+                    parents, current = [], self.root_inode_ref
+                parts.extend(reversed([part for part in target.split("/") if part and part != "."]))
+                continue
+            parents.append(current)
+            current = inode_ref
+        return current
+
+    # --------------------------------------------------------------------------
+    # Tables:
+
+    def _metadata_block(self, position: int) -> tuple[bytes, int]:
+        """Decompressed metadata block at absolute position and position of the next block."""
+        cached = self._metadata_cache.get(position)
+        if cached is not None:
+            return cached
+        (header,) = struct.unpack_from("<H", self._mmap, position)
+        size = header & 0x7FFF
+        raw = self._mmap[position + 2:position + 2 + size]
+        data = raw if header & 0x8000 else self._decompress(raw, SquashfsImage.METADATA_BLOCK_SIZE)
+        block = (data, position + 2 + size)
+        self._metadata_cache.put(position, block)
+        return block
+
+    def _read_metadata(self, position: int, offset: int, length: int) -> bytes:
+        """Reads length bytes starting at offset in metadata block at position, continuing in following blocks."""
+        result = bytearray()
+        while len(result) < length:
+            data, next_position = self._metadata_block(position)
+            result += data[offset:offset + length - len(result)]
+            if not data:
+                raise SquashfsError(f"Corrupted metadata in {self.path}")
+            offset = 0
+            position = next_position
+        return bytes(result)
+
+    def _inode(self, inode_ref: int) -> SquashfsInode:
+        cursor = _MetadataCursor(image=self, position=self.inode_table_start + (inode_ref >> 16), offset=inode_ref & 0xFFFF)
+        inode_type, mode, _, _, mtime, _ = struct.unpack("<HHHHII", cursor.read(16))
+        match inode_type:
+            case 1:
+                directory_block, _, size, directory_offset, _ = struct.unpack("<IIHHI", cursor.read(16))
+                return SquashfsInode(type=SquashfsEntryType.DIRECTORY, mode=mode, mtime=mtime, size=size, directory_block=directory_block, directory_offset=directory_offset)
+            case 8:
+                _, size, directory_block, _, _, directory_offset, _ = struct.unpack("<IIIIHHI", cursor.read(24))
+                return SquashfsInode(type=SquashfsEntryType.DIRECTORY, mode=mode, mtime=mtime, size=size, directory_block=directory_block, directory_offset=directory_offset)
+            case 2 | 9:
+                if inode_type == 2:
+                    blocks_start, fragment_index, fragment_offset, size = struct.unpack("<IIII", cursor.read(16))
+                else:
+                    blocks_start, size, _, _, fragment_index, fragment_offset, _ = struct.unpack("<QQQIIII", cursor.read(40))
+                if fragment_index == SquashfsImage.NO_FRAGMENT:
+                    block_count = (size + self.block_size - 1) // self.block_size
+                else:
+                    block_count = size // self.block_size
+                block_sizes = struct.unpack(f"<{block_count}I", cursor.read(4 * block_count))
+                return SquashfsInode(
+                    type=SquashfsEntryType.FILE, mode=mode, mtime=mtime, size=size, blocks_start=blocks_start,
+                    block_sizes=block_sizes, fragment_index=fragment_index, fragment_offset=fragment_offset
+                )
+            case 3 | 10:
+                _, target_size = struct.unpack("<II", cursor.read(8))
+                target = cursor.read(target_size).decode("utf-8", "surrogateescape")
+                return SquashfsInode(type=SquashfsEntryType.SYMLINK, mode=mode, mtime=mtime, size=target_size, symlink_target=target)
+            case _ if 4 <= inode_type <= 14:
+                return SquashfsInode(type=SquashfsEntryType((inode_type - 1) % 7 + 1), mode=mode, mtime=mtime, size=0)
+        raise SquashfsError(f"Unknown inode type {inode_type} in {self.path}")
+
+    def _directory(self, inode: SquashfsInode) -> dict[str, tuple[int, SquashfsEntryType]]:
+        """Entries of directory inode: name -> (inode reference, type)."""
+        key = (inode.directory_block, inode.directory_offset)
+        cached = self._directory_cache.get(key)
+        if cached is not None:
+            return cached
+        entries: dict[str, tuple[int, SquashfsEntryType]] = {}
+        # Directory size includes 3 bytes for virtual . and .. entries.
+        if inode.size > 3:
+            data = self._read_metadata(self.directory_table_start + inode.directory_block, inode.directory_offset, inode.size - 3)
+            position = 0
+            while position + 12 <= len(data):
+                count, start, _ = struct.unpack_from("<III", data, position)
+                position += 12
+                for _ in range(count + 1):
+                    offset, _, entry_type, name_size = struct.unpack_from("<HhHH", data, position)
+                    position += 8
+                    name = data[position:position + name_size + 1].decode("utf-8", "surrogateescape")
+                    position += name_size + 1
+                    entries[name] = ((start << 16) | offset, SquashfsEntryType((entry_type - 1) % 7 + 1))
+        self._directory_cache.put(key, entries)
+        return entries
+
+    def _fragment(self, index: int) -> bytes:
+        cached = self._fragment_cache.get(index)
+        if cached is not None:
+            return cached
+        (table_position,) = struct.unpack_from("<Q", self._mmap, self.fragment_table_start + 8 * (index // 512))
+        start, size, _ = struct.unpack("<QII", self._read_metadata(table_position, (index % 512) * 16, 16))
+        data = self._data_block(start, size)
+        self._fragment_cache.put(index, data)
+        return data
+
+    def _data_block(self, position: int, size_entry: int) -> bytes:
+        size = size_entry & 0xFFFFFF
+        raw = self._mmap[position:position + size]
+        return raw if size_entry & 0x1000000 else self._decompress(raw, self.block_size)
+
+    def _read_file(self, inode: SquashfsInode) -> bytes:
+        result = bytearray()
+        position = inode.blocks_start
+        for size_entry in inode.block_sizes:
+            if size_entry & 0xFFFFFF == 0: # Sparse block.
+                result += bytes(min(self.block_size, inode.size - len(result)))
+                continue
+            result += self._data_block(position, size_entry)
+            position += size_entry & 0xFFFFFF
+        if inode.fragment_index != SquashfsImage.NO_FRAGMENT:
+            tail_size = inode.size - len(result)
+            result += self._fragment(inode.fragment_index)[inode.fragment_offset:inode.fragment_offset + tail_size]
+        if len(result) != inode.size:
+            raise SquashfsError(f"Corrupted file data in {self.path}")
+        return bytes(result)
+
+    # --------------------------------------------------------------------------
+    # Compression:
+
+    def _create_decompressor(self) -> Any:
+        match self.compression:
+            case SquashfsCompression.GZIP:
+                return lambda data, max_size: zlib.decompress(data)
+            case SquashfsCompression.XZ:
+                return lambda data, max_size: lzma.decompress(data, format=lzma.FORMAT_XZ)
+            case SquashfsCompression.LZMA:
+                return lambda data, max_size: lzma.decompress(data, format=lzma.FORMAT_ALONE)
+            case SquashfsCompression.ZSTD:
+                try:
+                    from compression import zstd # Python 3.14+
+                    return lambda data, max_size: zstd.decompress(data)
+                except ImportError:
+                    pass
+                try:
+                    import zstandard
+                except ImportError:
+                    raise SquashfsError(f"{self.path} is zstd compressed, which requires zstandard python module")
+                decompressor = zstandard.ZstdDecompressor()
+                return lambda data, max_size: decompressor.decompress(data, max_output_size=max_size)
+            case SquashfsCompression.LZ4:
+                try:
+                    import lz4.block
+                except ImportError:
+                    raise SquashfsError(f"{self.path} is lz4 compressed, which requires lz4 python module")
+                return lambda data, max_size: lz4.block.decompress(data, uncompressed_size=max_size)
+        raise SquashfsError(f"{self.compression.name} compression of {self.path} is not supported")
+
+    def _decompress(self, data: bytes, max_size: int) -> bytes:
+        try:
+            return self._decompressor(data, max_size)
+        except Exception as e:
+            raise SquashfsError(f"Failed to decompress block of {self.path}: {e}")
+
+@final
+class _MetadataCursor:
+    """Sequential reader of metadata, continuing into following blocks."""
+    def __init__(self, image: SquashfsImage, position: int, offset: int):
+        self.image = image
+        self.position = position
+        self.offset = offset
+
+    def read(self, length: int) -> bytes:
+        result = bytearray()
+        while len(result) < length:
+            data, next_position = self.image._metadata_block(self.position)
+            chunk = data[self.offset:self.offset + length - len(result)]
+            result += chunk
+            self.offset += len(chunk)
+            if self.offset >= len(data):
+                if not data:
+                    raise SquashfsError(f"Corrupted metadata in {self.image.path}")
+                self.position, self.offset = next_position, 0
+        return bytes(result)
+
+@final
+class _LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict[Any, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
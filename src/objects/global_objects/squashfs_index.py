@@ -0,0 +1,169 @@
+from __future__ import annotations
+import os, mmap, struct
+from typing import final, NamedTuple
+from .squashfs_image import SquashfsImage, SquashfsEntryType, SquashfsError
+
+@final
+class SquashfsIndexEntry(NamedTuple):
+    path: str
+    type: SquashfsEntryType
+    size: int
+    inode_ref: int
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+@final
+class SquashfsIndex:
+    """Sidecar file tree index of squashfs image, stored as <image>.idx and memory mapped on demand."""
+    """Entries are sorted by (parent directory, name), so path lookups are binary searches and children of"""
+    """a directory are a contiguous range. Paths are kept in a string pool referenced by fixed size entries."""
+    """Index is only used if size and mtime of the image match the ones stored in it."""
+
+    SUFFIX = ".idx"
+    MAGIC = b"CLSQIDX\0"
+    VERSION = 1
+    HEADER_FORMAT = "<8sIIQqQQ" # magic, version, count, image size, image mtime_ns, entries offset, pool offset
+    ENTRY_FORMAT = "<IHHQQB7x"  # path offset, parent length, path length, size, inode reference, type
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+    ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+
+    def __init__(self, index_mmap: mmap.mmap, count: int, entries_offset: int, pool_offset: int):
+        self._mmap = index_mmap
+        self.count = count
+        self._entries_offset = entries_offset
+        self._pool_offset = pool_offset
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        self._mmap.close()
+
+    @staticmethod
+    def path_for(image_path: str) -> str:
+        return image_path + SquashfsIndex.SUFFIX
+
+    @classmethod
+    def open(cls, image_path: str) -> SquashfsIndex | None:
+        """Index of image, or None if it doesn't exist or doesn't match the image."""
+        try:
+            image_stat = os.stat(image_path)
+            with open(SquashfsIndex.path_for(image_path), "rb") as index_file:
+                index_mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            magic, version, count, image_size, image_mtime_ns, entries_offset, pool_offset = struct.unpack_from(SquashfsIndex.HEADER_FORMAT, index_mmap, 0)
+        except struct.error:
+            index_mmap.close()
+            return None
+        if (
+            magic != SquashfsIndex.MAGIC or version != SquashfsIndex.VERSION
+            or (image_size, image_mtime_ns) != (image_stat.st_size, image_stat.st_mtime_ns)
+            or entries_offset + count * SquashfsIndex.ENTRY_SIZE > len(index_mmap)
+        ):
+            index_mmap.close()
+            return None
+        return cls(index_mmap=index_mmap, count=count, entries_offset=entries_offset, pool_offset=pool_offset)
+
+    # --------------------------------------------------------------------------
+    # Queries:
+
+    def lookup(self, path: str) -> SquashfsIndexEntry | None:
+        """Entry of exact path (symlinks are not resolved)."""
+        parent, name = SquashfsIndex._split(SquashfsImage._normalized(path))
+        position = self._lower_bound(parent, name)
+        if position < self.count and self._key(position) == (parent, name):
+            return self._entry(position)
+        return None
+
+    def children(self, path: str) -> list[SquashfsIndexEntry]:
+        """Entries directly inside directory path, sorted by name. Empty if path is not an indexed directory."""
+        directory = SquashfsImage._normalized(path).encode("utf-8", "surrogateescape")
+        start = self._lower_bound(directory, b"")
+        end = self._lower_bound(directory + b"\0", b"")
+        return [self._entry(position) for position in range(start, end)]
+
+    @staticmethod
+    def _split(path: str) -> tuple[bytes, bytes]:
+        parent, _, name = path.rpartition("/")
+        return parent.encode("utf-8", "surrogateescape"), name.encode("utf-8", "surrogateescape")
+
+    def _raw_entry(self, position: int) -> tuple[int, int, int, int, int, int]:
+        return struct.unpack_from(SquashfsIndex.ENTRY_FORMAT, self._mmap, self._entries_offset + position * SquashfsIndex.ENTRY_SIZE)
+
+    def _key(self, position: int) -> tuple[bytes, bytes]:
+        path_offset, parent_length, path_length, _, _, _ = self._raw_entry(position)
+        start = self._pool_offset + path_offset
+        name_start = start + parent_length + (1 if parent_length else 0)
+        return self._mmap[start:start + parent_length], self._mmap[name_start:start + path_length]
+
+    def _entry(self, position: int) -> SquashfsIndexEntry:
+        path_offset, _, path_length, size, inode_ref, entry_type = self._raw_entry(position)
+        start = self._pool_offset + path_offset
+        path = self._mmap[start:start + path_length].decode("utf-8", "surrogateescape")
+        return SquashfsIndexEntry(path=path, type=SquashfsEntryType(entry_type), size=size, inode_ref=inode_ref)
+
+    def _lower_bound(self, parent: bytes, name: bytes) -> int:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < (parent, name):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # --------------------------------------------------------------------------
+    # Generating:
+
+    @staticmethod
+    def write(image_path: str) -> bool:
+        """Generates index of image. Call after image file is in its final location."""
+        try:
+            image_stat = os.stat(image_path)
+            records: list[tuple[bytes, bytes, int, int, int]] = []
+            with SquashfsImage(image_path, use_index=False) as image:
+                pending = [""]
+                while pending:
+                    directory = pending.pop()
+                    for entry in image.scandir(directory):
+                        size = image.stat_entry(entry).size if entry.type in (SquashfsEntryType.FILE, SquashfsEntryType.SYMLINK) else 0
+                        records.append((*SquashfsIndex._split(entry.path), size, entry.inode_ref, entry.type.value))
+                        if entry.is_dir():
+                            pending.append(entry.path)
+            records.sort()
+            pool = bytearray()
+            entries = bytearray()
+            for parent, name, size, inode_ref, entry_type in records:
+                path = parent + b"/" + name if parent else name
+                entries += struct.pack(SquashfsIndex.ENTRY_FORMAT, len(pool), len(parent), len(path), size, inode_ref, entry_type)
+                pool += path
+            entries_offset = SquashfsIndex.HEADER_SIZE
+            pool_offset = entries_offset + len(entries)
+            header = struct.pack(SquashfsIndex.HEADER_FORMAT, SquashfsIndex.MAGIC, SquashfsIndex.VERSION, len(records), image_stat.st_size, image_stat.st_mtime_ns, entries_offset, pool_offset)
+            index_path = SquashfsIndex.path_for(image_path)
+            with open(index_path + ".tmp", "wb") as index_file:
+                index_file.write(header)
+                index_file.write(entries)
+                index_file.write(pool)
+            os.replace(index_path + ".tmp", index_path)
+            return True
+        except (OSError, SquashfsError, struct.error) as e:
+            print(f"Failed to generate index of {image_path}: {e}")
+            return False
+
+    @staticmethod
+    def remove(image_path: str):
+        try:
+            os.remove(SquashfsIndex.path_for(image_path))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def move(image_path: str, new_image_path: str):
+        """Moves index together with renamed image."""
+        if os.path.isfile(SquashfsIndex.path_for(image_path)):
+            os.replace(SquashfsIndex.path_for(image_path), SquashfsIndex.path_for(new_image_path))
@@ -0,0 +1,52 @@
+from __future__ import annotations
+import sys, time, threading
+from contextlib import contextmanager
+from typing import final, Iterator
+
+@final
+class StartupProfiler:
+    """Collects durations of startup phases (imports, repository loading, refreshes)."""
+    """Enabled with --profile-startup. Checked directly in sys.argv, because imports happen before"""
+    """command line options are parsed by Gio.Application."""
+
+    OPTION = "profile-startup"
+
+    enabled = f"--{OPTION}" in sys.argv
+    _start = time.perf_counter()
+    _records: list[tuple[str, float, float]] = [] # Name, start offset, duration.
+    _lock = threading.Lock()
+
+    @staticmethod
+    @contextmanager
+    def measure(name: str) -> Iterator[None]:
+        if not StartupProfiler.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            StartupProfiler.record(name=name, start=start, duration=time.perf_counter() - start)
+
+    @staticmethod
+    def mark(name: str):
+        """Records moment since process start, eq. when window was presented."""
+        if StartupProfiler.enabled:
+            now = time.perf_counter()
+            StartupProfiler.record(name=name, start=StartupProfiler._start, duration=now - StartupProfiler._start)
+
+    @staticmethod
+    def record(name: str, start: float, duration: float):
+        with StartupProfiler._lock:
+            StartupProfiler._records.append((name, start - StartupProfiler._start, duration))
+
+    @staticmethod
+    def report(title: str = "Startup profile"):
+        if not StartupProfiler.enabled:
+            return
+        with StartupProfiler._lock:
+            records = sorted(StartupProfiler._records, key=lambda record: record[1])
+        lines = [f"{title}:"]
+        for name, offset, duration in records:
+            lines.append(f"  {offset * 1000:9.1f} ms  +{duration * 1000:9.1f} ms  {name}")
+        print("\n".join(lines))
@@ -0,0 +1,214 @@
+from __future__ import annotations
+import os, ast, json, hashlib, threading
+from typing import final
+from .project_stage_arguments import StageArguments
+from .squashfs_image import SquashfsImage
+from .toolset_application import ToolsetApplication
+from .toolset_cache import ToolsetCache
+
+@final
+class CatalystStageSchema:
+    """Arguments declared by catalyst stagebase.py and by each target module, as parsed from catalyst sources."""
+    """Contains raw values only, virtual arguments and merging with base are applied by load_catalyst_stage_arguments."""
+
+    CATALYST_PATH = "/usr/lib/python*/site-packages/catalyst"
+    EXCLUDED_TARGETS = {"__init__"}
+
+    def __init__(self, base: StageArguments, targets: dict[str, StageArguments]):
+        self.base = base
+        self.targets = targets
+
+    def serialize(self) -> dict:
+        def serialize_arguments(arguments: StageArguments) -> dict:
+            return {"required": sorted(arguments.required), "valid": sorted(arguments.valid)}
+        return {
+            "base": serialize_arguments(self.base),
+            "targets": {name: serialize_arguments(arguments) for name, arguments in self.targets.items()}
+        }
+
+    @classmethod
+    def init_from(cls, data: dict) -> CatalystStageSchema:
+        def arguments_from(data: dict) -> StageArguments:
+            return StageArguments(required=frozenset(data["required"]), valid=frozenset(data["valid"]))
+        return cls(
+            base=arguments_from(data["base"]),
+            targets={name: arguments_from(arguments) for name, arguments in data["targets"].items()}
+        )
+
+    @staticmethod
+    def extract(image: SquashfsImage) -> CatalystStageSchema:
+        """Parses stagebase.py and all targets of catalyst installed in toolset image."""
+        base_path = next(iter(image.glob(os.path.join(CatalystStageSchema.CATALYST_PATH, "base", "stagebase.py"))), None)
+        if not base_path:
+            raise FileNotFoundError("Could not find stagebase.py in the squashfs archive")
+        targets = {}
+        for target_path in image.glob(os.path.join(CatalystStageSchema.CATALYST_PATH, "targets", "*.py")):
+            target_name = os.path.splitext(os.path.basename(target_path))[0]
+            if target_name not in CatalystStageSchema.EXCLUDED_TARGETS:
+                targets[target_name] = CatalystStageSchema._parse_arguments(image.read_text(target_path))
+        return CatalystStageSchema(base=CatalystStageSchema._parse_arguments(image.read_text(base_path)), targets=dict(sorted(targets.items())))
+
+    @staticmethod
+    def _parse_arguments(code_str: str) -> StageArguments:
+        """Collects strings assigned to required_values and valid_values frozensets. Valid values include required ones."""
+        class Visitor(ast.NodeVisitor):
+            def __init__(self):
+                self.values = {
+                    "required_values": [],
+                    "valid_values": [],
+                }
+                # Keep track of values assigned so far for substitution
+                self._cache = {
+                    "required_values": [],
+                    "valid_values": [],
+                }
+            def visit_ClassDef(self, node: ast.ClassDef):
+                for stmt in node.body:
+                    if isinstance(stmt, ast.Assign):
+                        for target in stmt.targets:
+                            if isinstance(target, ast.Name):
+                                attr_name = target.id
+                                if attr_name in self.values:
+                                    # Extract new elements from right side
+                                    new_elements = self._extract_strings_from_expr(stmt.value)
+                                    # Update cache and values
+                                    self._cache[attr_name].extend(new_elements)
+                                    self.values[attr_name] = list(set(self._cache[attr_name]))  # unique
+                    elif isinstance(stmt, ast.AugAssign):
+                        target = stmt.target
+                        if isinstance(target, ast.Name):
+                            attr_name = target.id
+                            if attr_name in self.values:
+                                new_elements = self._extract_strings_from_expr(stmt.value)
+                                self._cache[attr_name].extend(new_elements)
+                                self.values[attr_name] = list(set(self._cache[attr_name]))
+                self.generic_visit(node)
+            def visit_Assign(self, node):
+                self._handle_assignment(node.targets[0], node.value)
+            def visit_AugAssign(self, node):
+                self._handle_assignment(node.target, node.value)
+            def _handle_assignment(self, target, value):
+                if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == "self":
+                    attr_name = target.attr
+                    if attr_name in self.values:
+                        new_elements = self._extract_strings_from_expr(value)
+                        self.values[attr_name].extend(new_elements)
+            def _extract_strings_from_expr(self, expr):
+                elements = []
+                if isinstance(expr, ast.Call) and isinstance(expr.func, ast.Name) and expr.func.id == "frozenset":
+                    if expr.args and isinstance(expr.args[0], (ast.List, ast.Set, ast.Tuple)):
+                        for elt in expr.args[0].elts:
+                            if isinstance(elt, ast.Constant) and isinstance(elt.value, str):
+                                elements.append(elt.value)
+                elif isinstance(expr, ast.BinOp) and isinstance(expr.op, ast.BitOr):
+                    elements.extend(self._extract_strings_from_expr(expr.left))
+                    elements.extend(self._extract_strings_from_expr(expr.right))
+                elif isinstance(expr, ast.Name):
+                    # Substitute from cached values
+                    name = expr.id
+                    if name in self._cache:
+                        elements.extend(self._cache[name])
+                return elements
+        tree = ast.parse(code_str)
+        visitor = Visitor()
+        visitor.visit(tree)
+        required = frozenset(visitor.values["required_values"])
+        return StageArguments(required=required, valid=required | frozenset(visitor.values["valid_values"]))
+
+@final
+class CatalystStageSchemaCache:
+    """Stores CatalystStageSchema of toolset images in a file inside toolset cache location."""
+    """Schemas are keyed by hash of image superblock (changes whenever image is rebuilt) and catalyst version,"""
+    """so sources of catalyst are parsed only once per toolset image."""
+
+    _instance: CatalystStageSchemaCache | None = None
+
+    FILE_NAME = "catalyst_stage_schemas.json"
+    VERSION = 1
+    MAX_ENTRIES = 32
+    SUPERBLOCK_SIZE = 96
+
+    @classmethod
+    def shared(cls) -> CatalystStageSchemaCache:
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._schemas: dict[str, dict] | None = None # Serialized schemas by key, loaded from file on first use.
+        self._loaded: dict[str, CatalystStageSchema] = {}
+        self._image_hashes: dict[str, tuple[tuple[int, int, int], str]] = {}
+
+    @staticmethod
+    def file_path() -> str:
+        return os.path.join(ToolsetCache.location(), CatalystStageSchemaCache.FILE_NAME)
+
+    def schema(self, toolset: Toolset) -> CatalystStageSchema:
+        """Schema of catalyst in toolset image. Parses image only if schema is not cached yet."""
+        catalyst = toolset.get_app_install(ToolsetApplication.CATALYST)
+        if catalyst is None:
+            raise RuntimeError("This toolset does not have Catalyst installed.")
+        image_path = toolset.file_path()
+        with self._lock:
+            key = f"{self._image_hash(image_path=image_path)}-{catalyst.version}"
+            if (schema := self._loaded.get(key)) is not None:
+                return schema
+            schemas = self._load()
+            schema = None
+            if (data := schemas.get(key)) is not None:
+                try:
+                    schema = CatalystStageSchema.init_from(data)
+                except (KeyError, TypeError) as e:
+                    print(f"Ignoring invalid cached catalyst schema {key}: {e}")
+                    schema = None
+            if schema is None:
+                schema = CatalystStageSchema.extract(image=SquashfsImage.for_path(image_path))
+                schemas.pop(key, None)
+                schemas[key] = schema.serialize()
+                while len(schemas) > CatalystStageSchemaCache.MAX_ENTRIES:
+                    schemas.pop(next(iter(schemas)))
+                self._save()
+            self._loaded[key] = schema
+            return schema
+
+    def prefetch(self, toolset: Toolset):
+        """Prepares schema of toolset in background thread."""
+        def worker():
+            try:
+                self.schema(toolset=toolset)
+            except Exception as e:
+                print(f"Failed to prepare catalyst schema of {toolset.name}: {e}")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _image_hash(self, image_path: str) -> str:
+        stat = os.stat(image_path)
+        fingerprint = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        cached = self._image_hashes.get(image_path)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        with open(image_path, "rb") as image_file:
+            superblock = image_file.read(CatalystStageSchemaCache.SUPERBLOCK_SIZE)
+        image_hash = hashlib.sha256(superblock + stat.st_size.to_bytes(8, "little")).hexdigest()
+        self._image_hashes[image_path] = (fingerprint, image_hash)
+        return image_hash
+
+    def _load(self) -> dict[str, dict]:
+        if self._schemas is None:
+            try:
+                with open(CatalystStageSchemaCache.file_path(), "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                self._schemas = data.get("schemas", {}) if data.get("version") == CatalystStageSchemaCache.VERSION else {}
+            except (OSError, ValueError, AttributeError):
+                self._schemas = {}
+        return self._schemas
+
+    def _save(self):
+        path = CatalystStageSchemaCache.file_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump({"version": CatalystStageSchemaCache.VERSION, "schemas": self._schemas}, file)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Failed to save catalyst schema cache: {e}")
@@ -66,25 +66,25 @@ class ProjectDirectory(GitDirectory):
             self.metadata = ProjectConfiguration()
         return self.metadata
 
-    def _get_by_id(self, items, target_id, attr):
+    def _get_by_id(self, repository: Repository, target_id, attr):
         if not target_id:
             return None
-        return next((item for item in items if getattr(item, attr) == target_id), None)
+        return repository.find(attr, target_id)
 
     def get_toolset(self) -> Toolset | None:
         if self.metadata is None:
             return None
-        return self._get_by_id(Repository.Toolset.value, self.metadata.toolset_id, 'uuid')
+        return self._get_by_id(Repository.Toolset, self.metadata.toolset_id, 'uuid')
 
     def get_releng_directory(self) -> RelengDirectory | None:
         if self.metadata is None:
             return None
-        return self._get_by_id(Repository.RelengDirectory.value, self.metadata.releng_directory_id, 'id')
+        return self._get_by_id(Repository.RelengDirectory, self.metadata.releng_directory_id, 'id')
 
     def get_snapshot(self) -> Snapshot | None:
         if self.metadata is None:
             return None
-        return self._get_by_id(Repository.Snapshot.value, self.metadata.snapshot_id, 'filename')
+        return self._get_by_id(Repository.Snapshot, self.metadata.snapshot_id, 'filename')
 
     def get_architecture(self) -> Architecture | None:
         if self.metadata is None:
@@ -1,13 +1,15 @@
 from __future__ import annotations
-import os, subprocess, ast, uuid
+import uuid
 from .repository import Serializable
 from .toolset import Toolset, ToolsetApplication, ToolsetEnv
 from .root_helper_client import RootHelperClient
 from .releng_directory import RelengDirectory
+from .releng_template_index import RelengTemplateIndex
 from .event_bus import EventBus, SharedEvent
 from .architecture import Architecture
 from .snapshot import PortageProfile
 from .snapshot import Snapshot
+from .catalyst_stage_schema import CatalystStageSchemaCache
 from .repository import Repository
 from typing import Any
 from dataclasses import dataclass
@@ -65,130 +67,34 @@ class ProjectStageEvent(Enum):
 
 def load_catalyst_stage_arguments(toolset: Toolset, target_name: str | None) -> StageArguments:
     """Loads the list of arguments used by catalyst targets"""
-
-    def extract_frozenset_values(code_str: str) -> dict[str, list[str]]:
-        class Visitor(ast.NodeVisitor):
-            def __init__(self):
-                self.values = {
-                    "required_values": [],
-                    "valid_values": [],
-                }
-                # Keep track of values assigned so far for substitution
-                self._cache = {
-                    "required_values": [],
-                    "valid_values": [],
-                }
-            def visit_ClassDef(self, node: ast.ClassDef):
-                for stmt in node.body:
-                    if isinstance(stmt, ast.Assign):
-                        for target in stmt.targets:
-                            if isinstance(target, ast.Name):
-                                attr_name = target.id
-                                if attr_name in self.values:
-                                    # Extract new elements from right side
-                                    new_elements = self._extract_strings_from_expr(stmt.value)
-                                    # Update cache and values
-                                    self._cache[attr_name].extend(new_elements)
-                                    self.values[attr_name] = list(set(self._cache[attr_name]))  # unique
-                    elif isinstance(stmt, ast.AugAssign):
-                        target = stmt.target
-                        if isinstance(target, ast.Name):
-                            attr_name = target.id
-                            if attr_name in self.values:
-                                new_elements = self._extract_strings_from_expr(stmt.value)
-                                self._cache[attr_name].extend(new_elements)
-                                self.values[attr_name] = list(set(self._cache[attr_name]))
-                self.generic_visit(node)
-            def visit_Assign(self, node):
-                self._handle_assignment(node.targets[0], node.value)
-            def visit_AugAssign(self, node):
-                self._handle_assignment(node.target, node.value)
-            def _handle_assignment(self, target, value):
-                if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == "self":
-                    attr_name = target.attr
-                    if attr_name in self.values:
-                        new_elements = self._extract_strings_from_expr(value)
-                        self.values[attr_name].extend(new_elements)
-            def _extract_strings_from_expr(self, expr):
-                elements = []
-                if isinstance(expr, ast.Call) and isinstance(expr.func, ast.Name) and expr.func.id == "frozenset":
-                    if expr.args and isinstance(expr.args[0], (ast.List, ast.Set, ast.Tuple)):
-                        for elt in expr.args[0].elts:
-                            if isinstance(elt, ast.Constant) and isinstance(elt.value, str):
-                                elements.append(elt.value)
-                elif isinstance(expr, ast.BinOp) and isinstance(expr.op, ast.BitOr):
-                    elements.extend(self._extract_strings_from_expr(expr.left))
-                    elements.extend(self._extract_strings_from_expr(expr.right))
-                elif isinstance(expr, ast.Name):
-                    # Substitute from cached values
-                    name = expr.id
-                    if name in self._cache:
-                        elements.extend(self._cache[name])
-                return elements
-        tree = ast.parse(code_str)
-        visitor = Visitor()
-        visitor.visit(tree)
-        return visitor.values
+    """Arguments are parsed once per toolset image and then served from CatalystStageSchemaCache."""
 
     if toolset.get_app_install(ToolsetApplication.CATALYST) is None:
         raise RuntimeError("This toolset does not have Catalyst installed.")
     if toolset.env != ToolsetEnv.EXTERNAL:
         raise RuntimeError("Currently only EXTERNAL toolsets are supported for this functionality.")
 
-    toolset_file_path = toolset.file_path()
-    catalyst_path = "/usr/lib/python*/site-packages/catalyst"
-    catalyst_path_base = os.path.join(catalyst_path, "base")
-    catalyst_path_targets = os.path.join(catalyst_path, "targets")
-    if target_name is not None:
-        catalyst_path_stage = os.path.join(catalyst_path_targets, f"{target_name}.py")
-    else:
-        catalyst_path_stage = os.path.join(catalyst_path_base, "stagebase.py")
-
-    # Find stage .py path:
-    output = subprocess.check_output(
-        ['unsquashfs', '-l', toolset_file_path, catalyst_path_stage],
-        text=True
-    )
-    catalyst_path_stage_found = None
-    catalyst_path_stage_basename = os.path.basename(catalyst_path_stage)
-    for line in output.splitlines():
-        line = line.strip()
-        if line.endswith(catalyst_path_stage_basename):
-            catalyst_path_stage_found = line[len('squashfs-root/'):]
-            break
-    if not catalyst_path_stage_found:
+    schema = CatalystStageSchemaCache.shared().schema(toolset=toolset)
+    if target_name is not None and target_name not in schema.targets:
         raise FileNotFoundError("Could not find stage .py in the squashfs archive")
-
-    # Read stage arguments:
-    stage_content = subprocess.check_output(
-        ['unsquashfs', '-cat', toolset_file_path, catalyst_path_stage_found],
-        text=True
-    )
-    results = extract_frozenset_values(stage_content)
-    required_values = results["required_values"]
-    valid_values = list(set(results["required_values"]) | set(results["valid_values"]))
+    stage_arguments = schema.targets[target_name] if target_name is not None else schema.base
+    required_values = set(stage_arguments.required)
+    valid_values = set(stage_arguments.valid)
 
     # Append virtual values:
-    valid_values.append(StageArgumentDetails.name.value)
-    required_values.append(StageArgumentDetails.name.value)
-    valid_values.append(StageArgumentDetails.parent.value)
+    valid_values.add(StageArgumentDetails.name.value)
+    required_values.add(StageArgumentDetails.name.value)
+    valid_values.add(StageArgumentDetails.parent.value)
     if target_name and target_name != 'stage1':
-        required_values.append(StageArgumentDetails.parent.value)
-    valid_values.append(StageArgumentDetails.releng_template.value)
+        required_values.add(StageArgumentDetails.parent.value)
+    valid_values.add(StageArgumentDetails.releng_template.value)
 
-    # Check if needs to also load stagebase and combine
+    # Combine with base stage arguments (stagebase.py)
     if target_name is not None:
-        # Load the base stage arguments (stagebase.py)
         base_args = load_catalyst_stage_arguments(toolset, target_name=None)
-        # Merge required and valid
-        required = frozenset(required_values)
-        valid = frozenset(valid_values)
-        # Combine with base
-        combined_required = required | base_args.required
-        combined_valid = valid | base_args.valid
         return StageArguments(
-            required=combined_required,
-            valid=combined_valid
+            required=frozenset(required_values) | base_args.required,
+            valid=frozenset(valid_values) | base_args.valid
         )
     else:
         return StageArguments(
@@ -271,55 +177,23 @@ def load_catalyst_stage_automatic_arguments_options(stage: ProjectStage, arg_det
         case _: return []
 
 def load_catalyst_targets(toolset: Toolset) -> list[str]:
-    """Loads the list of available targets as their paths inside squashfs file"""
+    """Loads the list of available targets of catalyst installed in toolset"""
 
     if toolset.get_app_install(ToolsetApplication.CATALYST) is None:
         raise RuntimeError("This toolset does not have Catalyst installed.")
     if toolset.env != ToolsetEnv.EXTERNAL:
         raise RuntimeError("Currently only EXTERNAL toolsets are supported for this functionality.")
 
-    toolset_file_path = toolset.file_path()
-    catalyst_path = "/usr/lib/python*/site-packages/catalyst"
-    catalyst_path_targets = os.path.join(catalyst_path, "targets")
-
-    # Read the list of potential target files:
-    output = subprocess.check_output(
-        ['unsquashfs', '-l', toolset_file_path, f"{catalyst_path_targets}/*.py"],
-        text=True
-    )
-    except_files = {'__init__.py', 'snapshot.py'}
-    target_files = [
-        os.path.splitext(os.path.basename(line))[0]
-        for line in output.splitlines()
-        if line.strip().endswith('.py') and os.path.basename(line) not in except_files
-    ]
-    return target_files
+    except_targets = {'snapshot'}
+    return [target for target in CatalystStageSchemaCache.shared().schema(toolset=toolset).targets if target not in except_targets]
 
 # ------------------------------------------------------------------------------
 # Loading releng templates:
 
 def load_releng_templates(releng_directory: RelengDirectory, stage_name: str, architecture: Architecture) -> list[str]:
-    specs_path = os.path.join(releng_directory.directory_path(), "releases/specs")
-    templates = []
-    prefix = architecture.releng_base_arch().value + "/"
-    for root, _, files in os.walk(specs_path):
-        for file in files:
-            if file.endswith(".spec"):
-                full_path = os.path.join(root, file)
-                # Check if file contains the desired stage_name
-                try:
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        for line in f:
-                            line = line.strip()
-                            if line.startswith("target:") and line.split(":", 1)[1].strip() == stage_name.replace('_', '-'):
-                                rel_path = os.path.relpath(full_path, specs_path)
-                                if rel_path.startswith(prefix):
-                                    rel_path = rel_path.removeprefix(prefix)
-                                    templates.append(rel_path)
-                                    break
-                except Exception as e:
-                    print(f"Warning: Failed to read {full_path}: {e}")
-    return templates
+    """Names of releng templates for given target, relative to architecture directory"""
+    index = RelengTemplateIndex.for_directory(releng_directory=releng_directory)
+    return [template.name for template in index.templates_for(arch=architecture.releng_base_arch().value, target=stage_name)]
 
 def load_stage_possible_seeds(stage: ProjectStage, project_directory: ProjectDirectory):
     def _get_descendant_ids(stage: ProjectStage, project_directory: ProjectDirectory) -> list[int]:
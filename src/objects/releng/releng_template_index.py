@@ -0,0 +1,177 @@
+from __future__ import annotations
+import os, re, subprocess, threading, hashlib
+from typing import final, NamedTuple
+from .event_bus import SharedEvent
+
+@final
+class RelengTemplate(NamedTuple):
+    arch: str # Releng base arch directory, eq: amd64.
+    name: str # Path relative to arch directory, eq: 23.0-default/stage1-openrc.spec.
+    values: dict[str, str] # Spec keys with their values. Multiline values are joined with spaces.
+
+    @property
+    def target(self) -> str | None:
+        return self.values.get("target")
+
+    @property
+    def profile(self) -> str | None:
+        return self.values.get("profile")
+
+    @property
+    def subarch(self) -> str | None:
+        return self.values.get("subarch")
+
+    @property
+    def interpreter(self) -> str | None:
+        return self.values.get("interpreter")
+
+@final
+class RelengTemplateIndex:
+    """Parsed spec files from releases/specs of releng directory, grouped by arch and target."""
+    """Indexes are cached per RelengDirectory and rebuilt in background when git HEAD or uncommitted changes"""
+    """of specs change, so lookups never wait for git."""
+
+    SPECS_PATH = "releases/specs"
+
+    _cache: dict[str, tuple[str | None, RelengTemplateIndex]] = {} # By releng directory path: (state key, index).
+    _cache_lock = threading.Lock()
+    _build_locks: dict[str, threading.Lock] = {}
+    _observed: set[str] = set() # Directories which STATE_UPDATED events trigger verifying cache.
+
+    def __init__(self, templates: list[RelengTemplate]):
+        self.templates = templates
+        self._by_name: dict[tuple[str, str], RelengTemplate] = {}
+        self._by_target: dict[tuple[str, str], list[RelengTemplate]] = {}
+        for template in templates:
+            self._by_name[(template.arch, template.name)] = template
+            if template.target:
+                self._by_target.setdefault((template.arch, template.target), []).append(template)
+
+    # --------------------------------------------------------------------------
+    # Queries:
+
+    def templates_for(self, arch: str, target: str) -> list[RelengTemplate]:
+        """Templates of given releng base arch using catalyst target, eq: stage1."""
+        return self._by_target.get((arch, target.replace('_', '-')), [])
+
+    def template(self, arch: str, name: str) -> RelengTemplate | None:
+        return self._by_name.get((arch, name))
+
+    # --------------------------------------------------------------------------
+    # Building:
+
+    @staticmethod
+    def build(specs_path: str) -> RelengTemplateIndex:
+        templates = []
+        for root, _, files in os.walk(specs_path):
+            for file in files:
+                if not file.endswith(".spec"):
+                    continue
+                full_path = os.path.join(root, file)
+                rel_path = os.path.relpath(full_path, specs_path)
+                arch, _, name = rel_path.partition("/")
+                if not name:
+                    continue
+                try:
+                    with open(full_path, 'r', encoding='utf-8') as f:
+                        values = RelengTemplateIndex._parse_spec(f)
+                except Exception as e:
+                    print(f"Warning: Failed to read {full_path}: {e}")
+                    continue
+                templates.append(RelengTemplate(arch=arch, name=name, values=values))
+        templates.sort(key=lambda template: (template.arch, template.name))
+        return RelengTemplateIndex(templates=templates)
+
+    @staticmethod
+    def _parse_spec(lines) -> dict[str, str]:
+        """Reads "key: value" entries. Lines without a key continue value of previous key."""
+        values: dict[str, str] = {}
+        key = None
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if match := re.match(r"^([\w/-]+):\s*(.*)$", line):
+                key, value = match.group(1), match.group(2)
+                values[key] = value
+            elif key is not None:
+                values[key] = f"{values[key]} {line}".strip()
+        return values
+
+    # --------------------------------------------------------------------------
+    # Caching:
+
+    @staticmethod
+    def for_directory(releng_directory: RelengDirectory) -> RelengTemplateIndex:
+        """Cached index of releng directory, without checking git state. Only first call for directory builds it."""
+        """Cache is verified in background, after prefetch and whenever releng directory updates its git status."""
+        directory = releng_directory.directory_path()
+        with RelengTemplateIndex._cache_lock:
+            cached = RelengTemplateIndex._cache.get(directory)
+        if cached:
+            return cached[1]
+        index = RelengTemplateIndex._refresh(releng_directory=releng_directory, check_state=False)
+        RelengTemplateIndex.prefetch(releng_directory=releng_directory) # Stores git state of built index.
+        return index
+
+    @staticmethod
+    def prefetch(releng_directory: RelengDirectory):
+        """Builds index of releng directory in background, or rebuilds it if git state changed."""
+        from .background_executor import BackgroundExecutor
+        BackgroundExecutor.shared().submit(RelengTemplateIndex._refresh, releng_directory=releng_directory)
+
+    @staticmethod
+    def _refresh(releng_directory: RelengDirectory, check_state: bool = True) -> RelengTemplateIndex:
+        """Rebuilds index if HEAD commit or uncommitted changes of specs changed. Runs git, avoid calling in main loop."""
+        directory = releng_directory.directory_path()
+        with RelengTemplateIndex._cache_lock:
+            build_lock = RelengTemplateIndex._build_locks.setdefault(directory, threading.Lock())
+            if directory not in RelengTemplateIndex._observed:
+                RelengTemplateIndex._observed.add(directory)
+                releng_directory.event_bus.subscribe(SharedEvent.STATE_UPDATED, RelengTemplateIndex._directory_state_updated)
+        state = RelengTemplateIndex._state_key(directory=directory) if check_state else None
+        # Concurrent requests for the same directory wait for a single build.
+        with build_lock:
+            with RelengTemplateIndex._cache_lock:
+                cached = RelengTemplateIndex._cache.get(directory)
+                if cached and not check_state:
+                    return cached[1]
+                if cached and state is not None and cached[0] in (state, None):
+                    RelengTemplateIndex._cache[directory] = (state, cached[1]) # Index built by lookup has no state yet.
+                    return cached[1]
+            index = RelengTemplateIndex.build(specs_path=os.path.join(directory, RelengTemplateIndex.SPECS_PATH))
+            with RelengTemplateIndex._cache_lock:
+                RelengTemplateIndex._cache[directory] = (state, index)
+            return index
+
+    @staticmethod
+    def _directory_state_updated(releng_directory: RelengDirectory):
+        """Called in main loop after git status of releng directory was refreshed."""
+        RelengTemplateIndex.prefetch(releng_directory=releng_directory)
+
+    @staticmethod
+    def _state_key(directory: str) -> str | None:
+        """HEAD commit with list of modified spec files and their stat. None if directory is not a git repository."""
+        try:
+            head = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+            status = subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=all", "-z", "--", RelengTemplateIndex.SPECS_PATH],
+                cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+        except OSError:
+            return None
+        if head.returncode != 0 or status.returncode != 0:
+            return None
+        state = hashlib.sha256(head.stdout.strip().encode())
+        for entry in filter(None, status.stdout.split("\0")):
+            # Same files can be modified again without changing status, so include their stat.
+            state.update(entry.encode("utf-8", "surrogateescape"))
+            try:
+                stat = os.stat(os.path.join(directory, entry[3:]))
+                state.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+            except OSError:
+                pass
+        return state.hexdigest()
@@ -7,11 +7,13 @@ from typing import Any, Callable
 from gi.repository import Gio
 from dataclasses import dataclass, field
 from .runtime_env import RuntimeEnv
+from .event_bus import EventBus, EventPolicy, EventDelivery
 from .settings import *
 from .root_helper_server import ServerCommand, ServerFunction
 from .root_helper_server import ServerResponse, ServerResponseStatusCode
 from .root_helper_server import RootHelperServer, StreamPipe, StreamPipeEvent, WatchDog
 from .root_function import ROOT_FUNCTION_REGISTRY
+from .app_manifest import AppManifest
 
 class RootHelperClient:
 
@@ -195,15 +197,20 @@ class RootHelperClient:
     def collect_root_function_sources(self) -> str:
         """Returns all registered root function sources as a single"""
         """Python string, with @root_function decorators removed."""
-        if not ROOT_FUNCTION_REGISTRY:
+        """Sources are taken from AppManifest if available, so modules defining them don't need to be imported."""
+        manifest = AppManifest.shared()
+        if manifest is not None:
+            sources = manifest.root_function_sources()
+        else:
+            sources = []
+            for func in ROOT_FUNCTION_REGISTRY.values():
+                try:
+                    source = inspect.getsource(func)
+                    sources.append(source.strip())
+                except OSError:
+                    print(f"Warning: could not get source for function {func.__name__}")
+        if not sources:
             return ""
-        sources = []
-        for func in ROOT_FUNCTION_REGISTRY.values():
-            try:
-                source = inspect.getsource(func)
-                sources.append(source.strip())
-            except OSError:
-                print(f"Warning: could not get source for function {func.__name__}")
         return "\n\n# ---- Injected root functions ----\n\n" + "\n\n".join(sources)
 
     def initialize_server_connectivity(self, token: str, timeout: int | None = None) -> bool:
@@ -506,9 +513,11 @@ class RootHelperClientEvents(Enum):
 
 @final
 class ServerCallEvents(Enum):
-    NEW_OUTPUT_LINE = auto() # new line added to collected output
+    NEW_OUTPUT_LINE = auto() # new line added to collected output, delivered in batches as list of lines
     CALL_WILL_TERMINATE = auto()
 
+EventBus.set_policy(ServerCallEvents.NEW_OUTPUT_LINE, policy=EventPolicy(delivery=EventDelivery.BATCH, max_rate=20))
+
 @dataclass
 class ServerCall:
     """Captures details about ongoing server call."""
@@ -1,29 +1,32 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from .repository import Serializable, Repository
 from typing import Self
 import os
-import subprocess
 import re
 from collections import defaultdict
 from .architecture import Architecture
+from .squashfs_image import SquashfsImage, SquashfsError
 from typing import NamedTuple
 
 @dataclass
 class Snapshot(Serializable):
     filename: str
     date: datetime | None
+    fingerprint: tuple[int, int, int] | None = field(default=None, compare=False) # Of snapshot file, when date was read from it.
     def serialize(self) -> dict:
         return {
             "filename": self.filename,
-            "date": self.date.isoformat() if self.date else None
+            "date": self.date.isoformat() if self.date else None,
+            "fingerprint": list(self.fingerprint) if self.fingerprint else None
         }
     @classmethod
     def init_from(cls, data: dict) -> Self:
         return cls(
             filename=data["filename"],
-            date=datetime.fromisoformat(data["date"]) if data.get("date") else None
+            date=datetime.fromisoformat(data["date"]) if data.get("date") else None,
+            fingerprint=tuple(data["fingerprint"]) if data.get("fingerprint") else None
         )
 
     @property
@@ -40,36 +43,29 @@ class Snapshot(Serializable):
 
     def load_ebuilds(self) -> dict[str, dict[str, list[str]]]:
         snapshot_file_path = self.file_path()
-
+        nested_dict = defaultdict(lambda: defaultdict(list))
         try:
-            output = subprocess.check_output(['unsquashfs', '-l', snapshot_file_path], text=True)
-        except subprocess.CalledProcessError as e:
+            image = SquashfsImage.for_path(snapshot_file_path)
+            # Ebuilds are only in <category>/<package>/, so other directories of the tree don't need to be listed.
+            try:
+                categories = set(image.read_text("profiles/categories").split())
+            except OSError:
+                categories = None
+            for category in image.scandir():
+                if not category.is_dir() or (categories is not None and category.name not in categories):
+                    continue
+                for package in image.scandir(category.path):
+                    if not package.is_dir():
+                        continue
+                    for entry in image.scandir(package.path):
+                        # Match version from filename: package-version.ebuild
+                        match = re.match(rf"^{re.escape(package.name)}-(.+)\.ebuild$", entry.name)
+                        if match:
+                            nested_dict[category.name][package.name].append(match.group(1))
+        except (OSError, SquashfsError) as e:
             print(f"Error reading {snapshot_file_path}: {e}")
             return {}
 
-        nested_dict = defaultdict(lambda: defaultdict(list))
-
-        for line in output.splitlines():
-            line = line.strip()
-            if not line.startswith('squashfs-root/'):
-                continue
-
-            path = line[len('squashfs-root/'):]
-            if not path.endswith('.ebuild'):
-                continue
-
-            parts = path.split('/')
-            if len(parts) < 3:
-                continue  # Skip malformed paths
-
-            category, package, filename = parts[:3]
-
-            # Match version from filename: package-version.ebuild
-            match = re.match(rf"^{re.escape(package)}-(.+)\.ebuild$", filename)
-            if match:
-                version = match.group(1)
-                nested_dict[category][package].append(version)
-
         # Convert defaultdicts to normal dicts
         return {
             category: dict(sorted(packages.items()))
@@ -78,7 +74,7 @@ class Snapshot(Serializable):
 
     def load_profiles(self, arch: Architecture) -> list[PortageProfile]:
         # TODO: Needs additional mapping, doesnt work for example for ppc64le
-        profiles_contents = subprocess.check_output(['unsquashfs', '-cat', self.file_path(), "profiles/profiles.desc"], text=True)
+        profiles_contents = SquashfsImage.for_path(self.file_path()).read_text("profiles/profiles.desc")
         return [
             PortageProfile(path=parts[1], stability=parts[2], repo="gentoo")
             for line in profiles_contents.splitlines()
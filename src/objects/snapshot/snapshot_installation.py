@@ -1,18 +1,22 @@
 from __future__ import annotations
-import os, threading, subprocess
+import os, threading
 from typing import final
 from .multistage_process import (
     MultiStageProcess, MultiStageProcessStage,
     MultiStageProcessState, MultiStageProcessStageState
 )
-from .toolset import Toolset, BindMount
+from .toolset import Toolset
+from .toolset_spawn import ToolsetSpawn, BindMount
+from .toolset_spawn_pool import ToolsetSpawnPool
 from .snapshot_manager import SnapshotManager
 from .snapshot import Snapshot
 from .root_function import root_function
 from .repository import Repository
 from .root_helper_server import ServerResponse, ServerResponseStatusCode
 from datetime import datetime
-from .helper_functions import mount_squashfs, umount_squashfs, parse_strict_rfc_datetime
+from .helper_functions import mount_squashfs, umount_squashfs, parse_strict_rfc_datetime, file_fingerprint
+from .squashfs_image import SquashfsImage
+from .squashfs_index import SquashfsIndex
 
 # ------------------------------------------------------------------------------
 # Installation process.
@@ -26,6 +30,7 @@ class SnapshotInstallation(MultiStageProcess):
         self.toolset = toolset
         self.file = file
         self.custom_filename = custom_filename # Works only with file
+        self.toolset_spawn: ToolsetSpawn | None = None # Read-only spawn used for generating snapshot.
         super().__init__(title="Generating Portage snapshot")
 
     def setup_stages(self):
@@ -59,7 +64,7 @@ class SnapshotInstallationStep(MultiStageProcessStage):
             if self.server_call.thread:
                 self.server_call.thread.join()
             self.server_call = None
-    def run_command_in_toolset(self, command: str, progress_handler: Callable[[str], float | None] | None = None) -> bool:
+    def run_command_in_toolset(self, command: str, progress_handler: Callable[[str], float | None] | None = None, exclusive: bool = False) -> bool:
         try:
             return_value = False
             done_event = threading.Event()
@@ -72,10 +77,11 @@ class SnapshotInstallationStep(MultiStageProcessStage):
                 progress = progress_handler(output_line)
                 if progress is not None:
                     self._update_progress(progress)
-            self.server_call = self.multistage_process.toolset.run_command(
+            self.server_call = self.multistage_process.toolset_spawn.run_command(
                 command=command,
                 handler=output_handler if progress_handler is not None else None,
-                completion_handler=completion_handler
+                completion_handler=completion_handler,
+                exclusive=exclusive
             )
             self.server_call.thread.join()
             done_event.wait()
@@ -93,41 +99,11 @@ class SnapshotInstallationStepPrepareToolset(SnapshotInstallationStep):
     def __init__(self, toolset: Toolset, multistage_process: MultiStageProcess):
         super().__init__(name="Prepare toolset", description="Spawns toolset with required bindings", multistage_process=multistage_process)
         self.toolset = toolset
-        self.unspawn = False
-        self.release = False
     def start(self):
         super().start()
         try:
-            if self.toolset.in_use:
-                raise RuntimeError("Toolset is currently in use")
-            def toolset_has_required_binding() -> bool:
-                if not self.toolset.spawned:
-                    return False
-                required_bindings = self.required_bindings()
-                current_bindings = self.toolset.additional_bindings or []
-                for required in required_bindings:
-                    print(f"Checking if toolset contains: {required.mount_path}")
-                    found = any(
-                        existing.mount_path == required.mount_path and
-                        existing.host_path == required.host_path and
-                        existing.toolset_path == required.toolset_path
-                        for existing in current_bindings
-                    )
-                    if not found:
-                        print(f"Missing required binding: {required}")
-                        return False
-                return True
-            if not self.toolset.reserve():
-                raise RuntimeError("Failed to reserve toolset")
-            self.release = True
-            if self.toolset.spawned and not toolset_has_required_binding():
-                # Toolset needs to be respawned to get correct bindings
-                self.toolset.unspawn()
-            if not self.toolset.spawned:
-                self.toolset.spawn(additional_bindings=self.required_bindings())
-                self.unspawn = True
-            else:
-                self.unspawn = False
+            # Uses separate read-only spawn with required bindings, so other spawns of this toolset can keep running.
+            self.multistage_process.toolset_spawn = ToolsetSpawnPool.shared().reserve(toolset=self.toolset, additional_bindings=self.required_bindings())
             self.complete(MultiStageProcessStageState.COMPLETED)
         except Exception as e:
             print(f"Error during toolset preparation: {e}")
@@ -135,10 +111,9 @@ class SnapshotInstallationStepPrepareToolset(SnapshotInstallationStep):
     def cleanup(self) -> bool:
         if not super().cleanup():
             return False
-        if self.unspawn:
-            self.toolset.unspawn()
-        if self.release:
-            self.toolset.release()
+        if self.multistage_process.toolset_spawn:
+            ToolsetSpawnPool.shared().release(spawn=self.multistage_process.toolset_spawn)
+            self.multistage_process.toolset_spawn = None
         return True
     def required_bindings(self) -> [BindMount]:
         return [
@@ -252,8 +227,10 @@ class SnapshotInstallationStepAnalyze(SnapshotInstallationStep):
                 raise RuntimeError("Unknown spanshot")
             snapshots_location = os.path.realpath(os.path.expanduser(Repository.Settings.value.snapshots_location))
             snapshot_real_path = os.path.join(snapshots_location, self.multistage_process.snapshot.filename)
-            # Mount snapshot and read timestamp from it.
-            output = subprocess.check_output(['unsquashfs', '-cat', snapshot_real_path, "metadata/timestamp.chk"], text=True)
+            # Index is written once, so later listings of snapshot don't need to walk its directory tables.
+            SquashfsIndex.write(image_path=snapshot_real_path)
+            # Read timestamp from snapshot image.
+            output = SquashfsImage.for_path(snapshot_real_path).read_text("metadata/timestamp.chk")
             def read_timestamp_from_output(output: str):
                 try:
                     timestamp = parse_strict_rfc_datetime(output.strip())
@@ -263,6 +240,7 @@ class SnapshotInstallationStepAnalyze(SnapshotInstallationStep):
                     print(e)
                     return None
             self.multistage_process.snapshot.date = read_timestamp_from_output(output=output)
+            self.multistage_process.snapshot.fingerprint = file_fingerprint(snapshot_real_path)
             self.complete(MultiStageProcessStageState.COMPLETED)
         except Exception as e:
             print(f"Error during snapshot generation: {e}")
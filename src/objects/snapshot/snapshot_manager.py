@@ -1,9 +1,15 @@
 from typing import final
 from datetime import datetime
 from .repository import Repository
-import os, subprocess
+import os
+from concurrent.futures import Future
+from gi.repository import GLib
 from .snapshot import Snapshot
-from .helper_functions import parse_strict_rfc_datetime
+from .helper_functions import parse_strict_rfc_datetime, file_fingerprint
+from .squashfs_image import SquashfsImage
+from .squashfs_index import SquashfsIndex
+from .background_executor import BackgroundExecutor
+from .startup_profiler import StartupProfiler
 
 @final
 class SnapshotManager:
@@ -17,9 +23,21 @@ class SnapshotManager:
             cls._instance = cls()
         return cls._instance
 
-    def refresh(self):
-        snapshots = Repository.Snapshot.value
-        # Detect missing snapshots and add them to repository without date
+    def refresh(self, background: bool = False) -> Future | None:
+        """Synchronizes repository with .sqfs files in snapshots location. Timestamp is only read from files"""
+        """that are new or whose fingerprint changed. In background mode files are scanned in separate thread"""
+        """and repository is updated in main thread."""
+        if not background:
+            self._apply_refresh(*self._scan())
+            return None
+        def worker():
+            with StartupProfiler.measure("refresh SnapshotManager"):
+                found_filenames, changes = self._scan()
+            GLib.idle_add(self._apply_refresh, found_filenames, changes)
+        return BackgroundExecutor.shared().submit(worker)
+
+    def _scan(self) -> tuple[set[str], dict[str, tuple[tuple[int, int, int], datetime | None]]]:
+        """Returns filenames of all snapshot files and (fingerprint, date) of new or modified ones."""
         snapshots_location = os.path.realpath(os.path.expanduser(Repository.Settings.value.snapshots_location))
         # --- Step 1: Scan directory for existing .sqfs files ---
         if not os.path.isdir(snapshots_location):
@@ -28,33 +46,45 @@ class SnapshotManager:
             f for f in os.listdir(snapshots_location)
             if f.endswith(".sqfs") and os.path.isfile(os.path.join(snapshots_location, f))
         }
-        # --- Step 2: Check for new snapshots not in repository ---
-        existing_filenames = {snapshot.filename for snapshot in snapshots}
-        missing_files = found_filenames - existing_filenames
-        for filename in missing_files:
+        # --- Step 2: Read timestamps of files not matching repository fingerprints ---
+        known_fingerprints = {snapshot.filename: snapshot.fingerprint for snapshot in Repository.Snapshot.value}
+        changes = {}
+        for filename in found_filenames:
             full_path = os.path.join(snapshots_location, filename)
+            fingerprint = file_fingerprint(full_path)
+            if fingerprint is None or known_fingerprints.get(filename) == fingerprint:
+                continue
             try:
-                output = subprocess.check_output(['unsquashfs', '-cat', full_path, "metadata/timestamp.chk"], text=True)
+                output = SquashfsImage.for_path(full_path).read_text("metadata/timestamp.chk")
                 try:
                     timestamp = parse_strict_rfc_datetime(output.strip())
                 except Exception as e:
                     print(e)
                     timestamp = None
-                self.add_snapshot(Snapshot(filename=filename, date=timestamp))
+                changes[filename] = (fingerprint, timestamp)
             except Exception as e:
                 print(f"Error reading {full_path}: {e}")
-        # --- Step 3: Remove records for deleted snapshot files ---
-        deleted_snapshots = [snapshot for snapshot in snapshots if snapshot.filename not in found_filenames]
-        for snapshot in deleted_snapshots:
-            self.remove_snapshot(snapshot)
+        return found_filenames, changes
+
+    def _apply_refresh(self, found_filenames: set[str], changes: dict[str, tuple[tuple[int, int, int], datetime | None]]) -> bool:
+        # Single save and change event for the whole refresh.
+        with Repository.Snapshot.transaction():
+            # --- Step 3: Add new and modified snapshots ---
+            for filename, (fingerprint, timestamp) in changes.items():
+                self.add_snapshot(Snapshot(filename=filename, date=timestamp, fingerprint=fingerprint))
+            # --- Step 4: Remove records for deleted snapshot files ---
+            deleted_snapshots = [snapshot for snapshot in Repository.Snapshot.value if snapshot.filename not in found_filenames]
+            for snapshot in deleted_snapshots:
+                self.remove_snapshot(snapshot)
+        return False # Remove idle callback after running once
 
     def add_snapshot(self, snapshot: Snapshot):
-        # Remove existing snapshot with the same filename
-        Repository.Snapshot.value = [s for s in Repository.Snapshot.value if s.filename != snapshot.filename]
-        Repository.Snapshot.value.append(snapshot)
+        # Remove existing snapshot with the same filename. Assigned once, so repository is saved once.
+        Repository.Snapshot.value = [s for s in Repository.Snapshot.value if s.filename != snapshot.filename] + [snapshot]
 
     def remove_snapshot(self, snapshot: Snapshot):
         if os.path.isfile(snapshot.file_path()):
             os.remove(snapshot.file_path())
+        SquashfsIndex.remove(image_path=snapshot.file_path())
         Repository.Snapshot.value.remove(snapshot)
 
@@ -0,0 +1,193 @@
+from __future__ import annotations
+import os, re
+from typing import final, Callable
+from enum import Enum
+from .root_function import root_function
+from .repository import Repository
+from .toolset_spawn import BindMount
+
+@final
+class PortageTmpfsMode(Enum):
+    DISABLED = "disabled" # Portage builds on disk.
+    ENABLED  = "enabled"  # Portage builds in tmpfs limited by portage_tmpfs_max_size.
+    AUTO     = "auto"     # Portage builds in tmpfs if enough memory is available, limited by available memory.
+
+@final
+class PortageTmpfs:
+    """Memory backed portage build directory (and optionally catalyst tmpdir) for spawns."""
+    """Tmpfs is mounted by bwrap inside the sandbox, so it is removed together with the command that used it."""
+    """Packages from portage_tmpfs_exceptions are built on disk, using PORTAGE_TMPDIR set in package.env."""
+
+    PORTAGE_TMPDIR_PATH = "/var/tmp/portage"
+    CATALYST_TMPDIR_PATH = "/var/tmp/catalyst/tmp"
+    DISK_TMPDIR_PATH = "/var/tmp/notmpfs" # PORTAGE_TMPDIR of excepted packages.
+    LOG_DIR_PATH = "/var/tmp/notmpfs/logs" # PORT_LOGDIR of emerge calls with disk fallback. On disk, so logs outlive tmpfs.
+    OUT_OF_SPACE_MARKER = "catalystlab-tmpfs-out-of-space:" # Prefix of printed build logs containing ENOSPC.
+    CONFIG_NAME = "catalystlab-notmpfs" # Name of env file and package.env entry in toolset portage config.
+    MIN_SIZE = 2 * 1024 ** 3 # Auto mode doesn't use tmpfs if less memory is available.
+    MAX_FALLBACK_RETRIES = 3 # Number of packages moved to disk during one emerge call before giving up.
+
+    @staticmethod
+    def mode() -> PortageTmpfsMode:
+        try:
+            return PortageTmpfsMode(Repository.Settings.value.portage_tmpfs_mode)
+        except ValueError:
+            return PortageTmpfsMode.AUTO
+
+    @staticmethod
+    def available_memory() -> int:
+        """MemAvailable from /proc/meminfo in bytes. 0 if it can't be read."""
+        try:
+            with open("/proc/meminfo") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    @staticmethod
+    def size(mode: PortageTmpfsMode | None = None) -> int | None:
+        """Size of tmpfs for given mode (mode from settings by default). None if tmpfs should not be used."""
+        mode = mode or PortageTmpfs.mode()
+        max_size = Repository.Settings.value.portage_tmpfs_max_size
+        match mode:
+            case PortageTmpfsMode.DISABLED:
+                return None
+            case PortageTmpfsMode.ENABLED:
+                return max_size
+            case PortageTmpfsMode.AUTO:
+                # Leave at least half of available memory for compilers themselves.
+                size = min(max_size, PortageTmpfs.available_memory() // 2)
+                return size if size >= PortageTmpfs.MIN_SIZE else None
+
+    @staticmethod
+    def bindings(mode: PortageTmpfsMode | None = None) -> list[BindMount]:
+        """Bindings for portage build directories. Disk directory is always bound, so package.env entries remain valid."""
+        size = PortageTmpfs.size(mode=mode)
+        bindings = [
+            BindMount(mount_path=PortageTmpfs.PORTAGE_TMPDIR_PATH, create_if_missing=True, owner="portage:portage", tmpfs_size=size),
+            BindMount(mount_path=PortageTmpfs.DISK_TMPDIR_PATH, create_if_missing=True, owner="portage:portage"),
+        ]
+        if size and Repository.Settings.value.portage_tmpfs_catalyst:
+            bindings.append(BindMount(mount_path=PortageTmpfs.CATALYST_TMPDIR_PATH, tmpfs_size=size))
+        return bindings
+
+    @staticmethod
+    def is_mounted(toolset_spawn: ToolsetSpawn) -> bool:
+        return any(
+            binding.mount_path == PortageTmpfs.PORTAGE_TMPDIR_PATH and binding.tmpfs_size
+            for binding in toolset_spawn.current_bindings or []
+        )
+
+    # --------------------------------------------------------------------------
+    # Disk fallback:
+
+    @staticmethod
+    def add_exception(package: str):
+        """Adds package to packages built on disk. Stored in settings, so next builds don't try tmpfs again."""
+        exceptions = Repository.Settings.value.portage_tmpfs_exceptions
+        if package not in exceptions:
+            Repository.Settings.value.portage_tmpfs_exceptions = exceptions + [package]
+
+    @staticmethod
+    def write_exceptions_config(toolset_root: str):
+        """Writes package.env entries building excepted packages on disk to writable toolset."""
+        _write_portage_tmpfs_config(
+            toolset_root=toolset_root,
+            name=PortageTmpfs.CONFIG_NAME,
+            disk_tmpdir=PortageTmpfs.DISK_TMPDIR_PATH,
+            packages=Repository.Settings.value.portage_tmpfs_exceptions
+        )
+
+    @staticmethod
+    def run_emerge(toolset_spawn: ToolsetSpawn, run_command: Callable[..., bool], command: str, progress_handler: Callable[[str], float | None] | None = None, **kwargs) -> bool:
+        """Runs emerge command through run_command (run_command_in_toolset of a step) with disk fallback."""
+        """If package builds run out of space in tmpfs, packages are added to exceptions and command is retried."""
+        """Failed packages are taken from emerge failure messages and checked in their own build logs, so this"""
+        """also works with parallel emerge jobs, which hide and interleave build output."""
+        if not toolset_spawn.store_changes or not PortageTmpfs.is_mounted(toolset_spawn=toolset_spawn):
+            return run_command(command=command, progress_handler=progress_handler, **kwargs)
+        PortageTmpfs.write_exceptions_config(toolset_root=toolset_spawn.toolset.toolset_root())
+        for _ in range(PortageTmpfs.MAX_FALLBACK_RETRIES + 1):
+            watcher = PortageTmpfsWatcher()
+            def output_handler(output_line: str) -> float | None:
+                watcher.handle_line(output_line)
+                return progress_handler(output_line) if progress_handler else None
+            if run_command(command=PortageTmpfs._watched_command(command=command), progress_handler=output_handler, **kwargs):
+                return True
+            exceptions = Repository.Settings.value.portage_tmpfs_exceptions
+            packages = [package for package in watcher.out_of_space_packages if package not in exceptions]
+            if not packages:
+                return False
+            for package in packages:
+                print(f"{package} ran out of space in tmpfs, retrying on disk")
+                PortageTmpfs.add_exception(package=package)
+            PortageTmpfs.write_exceptions_config(toolset_root=toolset_spawn.toolset.toolset_root())
+        return False
+
+    @staticmethod
+    def _watched_command(command: str) -> str:
+        """Stores build logs on disk and prints those containing ENOSPC after emerge, keeping its exit status."""
+        log_dir = PortageTmpfs.LOG_DIR_PATH
+        return (
+            f"rm -rf {log_dir}; PORT_LOGDIR={log_dir} {command}; status=$?; "
+            f"zgrep -l \"No space left on device\" {log_dir}/* 2>/dev/null | sed \"s|^|{PortageTmpfs.OUT_OF_SPACE_MARKER} |\"; "
+            "exit $status"
+        )
+
+@final
+class PortageTmpfsWatcher:
+    """Finds packages which builds failed because portage tmpfs was full, from output of PortageTmpfs._watched_command."""
+    """Failed packages and their logs come from "Failed to emerge <cpv>, Log file:" messages (and the failure summary),"""
+    """logs containing ENOSPC are listed after emerge with OUT_OF_SPACE_MARKER."""
+
+    FAILED_PATTERN = re.compile(r"(?:^>>> Failed to emerge |^ \* \()([\w+.-]+/[\w+.-]+?)(?::[^,\s]*)?(?:, ebuild scheduled for merge\))?, Log file:(?:\s+'([^']+)')?")
+    LOG_PATH_PATTERN = re.compile(r"^(?:>>>|\s\*)\s+'([^']+)'")
+    ANSI_PATTERN = re.compile(r"\x1b\[[0-9;]*m")
+
+    def __init__(self):
+        self.failed_logs: dict[str, str] = {} # Log file name: failed cpv.
+        self.out_of_space_logs: set[str] = set() # Log file names containing ENOSPC.
+        self._log_pending_cpv: str | None = None # Failed cpv waiting for log path printed in next line.
+
+    @property
+    def out_of_space_packages(self) -> list[str]:
+        """Category and name of failed packages which build logs contain ENOSPC."""
+        from .toolset_package_index import InstalledPackage
+        packages = []
+        for log_name, cpv in self.failed_logs.items():
+            package = InstalledPackage.split_cpv(cpv)[0]
+            if log_name in self.out_of_space_logs and package not in packages:
+                packages.append(package)
+        return packages
+
+    def handle_line(self, output_line: str):
+        line = PortageTmpfsWatcher.ANSI_PATTERN.sub("", output_line.rstrip())
+        if line.startswith(PortageTmpfs.OUT_OF_SPACE_MARKER):
+            self.out_of_space_logs.add(os.path.basename(line[len(PortageTmpfs.OUT_OF_SPACE_MARKER):].strip()))
+        elif match := PortageTmpfsWatcher.FAILED_PATTERN.match(line):
+            self._log_pending_cpv = None
+            if match.group(2):
+                self.failed_logs[os.path.basename(match.group(2))] = match.group(1)
+            else:
+                self._log_pending_cpv = match.group(1)
+        elif self._log_pending_cpv:
+            if match := PortageTmpfsWatcher.LOG_PATH_PATTERN.match(line):
+                self.failed_logs[os.path.basename(match.group(1))] = self._log_pending_cpv
+            self._log_pending_cpv = None
+
+@root_function
+def _write_portage_tmpfs_config(toolset_root: str, name: str, disk_tmpdir: str, packages: list[str]):
+    import os
+    env_dir = os.path.join(toolset_root, "etc", "portage", "env")
+    package_env_dir = os.path.join(toolset_root, "etc", "portage", "package.env")
+    if os.path.isfile(package_env_dir):
+        raise RuntimeError(f"{package_env_dir} is a file, can't add {name} entries")
+    os.makedirs(env_dir, exist_ok=True)
+    os.makedirs(package_env_dir, exist_ok=True)
+    with open(os.path.join(env_dir, name), "w") as f:
+        f.write(f'PORTAGE_TMPDIR="{disk_tmpdir}"\n')
+    with open(os.path.join(package_env_dir, name), "w") as f:
+        for package in packages:
+            f.write(f"{package} {name}\n")
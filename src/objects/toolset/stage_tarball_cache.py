@@ -0,0 +1,236 @@
+from __future__ import annotations
+import os, re, json, fcntl, hashlib, threading, queue, requests
+from typing import final, Callable, BinaryIO, Iterable, Iterator
+from urllib.parse import urlparse
+from .toolset_cache import ToolsetCache
+from .ranged_downloader import RangedDownloader
+
+@final
+class StageTarballCache:
+    """Content-addressed local cache of downloaded stage tarballs."""
+    """Tarballs are stored by sha512 in <cache location>/stage3/objects and index.json maps URLs to hashes,"""
+    """so later installations of the same stage skip the network entirely. Checksums are verified against"""
+    """DIGESTS published next to the tarball, while downloading. Tarballs are downloaded by RangedDownloader,"""
+    """interrupted downloads are kept in partial directory and resumed using HTTP Range requests."""
+    """Partial file is preallocated and written out of order, so its size doesn't tell how much was downloaded."""
+    """Length of data written continuously from the start is stored next to it in .offset file instead."""
+    _instance = None
+
+    CHUNK_SIZE = 1024 * 1024
+    TIMEOUT = 10
+    OFFSET_CHECKPOINT_SIZE = 64 * 1024 * 1024 # Partial offset is stored every this many bytes while downloading.
+
+    @classmethod
+    def shared(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.access_lock = threading.RLock()
+
+    @staticmethod
+    def directory() -> str:
+        return os.path.join(ToolsetCache.location(), "stage3")
+
+    @staticmethod
+    def object_path(sha512: str) -> str:
+        return os.path.join(StageTarballCache.directory(), "objects", sha512)
+
+    @staticmethod
+    def partial_path(url: str) -> str:
+        return os.path.join(StageTarballCache.directory(), "partial", hashlib.sha256(url.encode()).hexdigest() + ".part")
+
+    @staticmethod
+    def partial_offset_path(url: str) -> str:
+        return StageTarballCache.partial_path(url=url) + ".offset"
+
+    @staticmethod
+    def _load_partial_offset(url: str, partial_size: int) -> int:
+        """Length of partial download that can be resumed. 0 if it's not known, eq. after a crash before first checkpoint."""
+        try:
+            with open(StageTarballCache.partial_offset_path(url=url)) as offset_file:
+                return max(0, min(int(offset_file.read().strip()), partial_size))
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def _store_partial_offset(url: str, partial_file: BinaryIO, offset: int):
+        # Data must reach the disk before offset pointing past it.
+        os.fdatasync(partial_file.fileno())
+        offset_path = StageTarballCache.partial_offset_path(url=url)
+        tmp_path = offset_path + ".tmp"
+        with open(tmp_path, "w") as offset_file:
+            offset_file.write(str(offset))
+        os.replace(tmp_path, offset_path)
+
+    @staticmethod
+    def _remove_partial(url: str):
+        for path in [StageTarballCache.partial_path(url=url), StageTarballCache.partial_offset_path(url=url)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # --------------------------------------------------------------------------
+    # Index:
+
+    @staticmethod
+    def _index_path() -> str:
+        return os.path.join(StageTarballCache.directory(), "index.json")
+
+    def _load_index(self) -> dict[str, str]:
+        try:
+            with open(StageTarballCache._index_path()) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _store_in_index(self, url: str, sha512: str):
+        with self.access_lock:
+            index = self._load_index()
+            index[url] = sha512
+            index_path = StageTarballCache._index_path()
+            tmp_path = index_path + ".tmp"
+            with open(tmp_path, "w") as index_file:
+                json.dump(index, index_file, indent=2)
+            os.replace(tmp_path, index_path)
+
+    def cached_path(self, url: str) -> str | None:
+        """Path of cached tarball for URL, or None if it's not cached."""
+        sha512 = self._load_index().get(url)
+        if sha512 and os.path.isfile(StageTarballCache.object_path(sha512)):
+            return StageTarballCache.object_path(sha512)
+        return None
+
+    # --------------------------------------------------------------------------
+    # Fetching:
+
+    @staticmethod
+    def fetch_digest(url: str) -> str | None:
+        """Reads sha512 of tarball from <url>.DIGESTS. Supports both old (sectioned) and new (signed) formats."""
+        try:
+            response = requests.get(url + ".DIGESTS", timeout=StageTarballCache.TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Failed to download DIGESTS for {url}: {e}")
+            return None
+        filename = os.path.basename(urlparse(url).path)
+        section = None
+        for line in response.text.splitlines():
+            line = line.strip()
+            if line.startswith("#"):
+                section = line.upper()
+                continue
+            match = re.match(r"^([0-9a-fA-F]+)\s+\*?(\S+)$", line)
+            # SHA512 is the only 128 hex digits long hash used in DIGESTS (BLAKE2B is in its own section).
+            if match and match.group(2) == filename and len(match.group(1)) == 128 and (section is None or "SHA512" in section):
+                return match.group(1).lower()
+        return None
+
+    def fetch(self, url: str, consumer: Callable[[bytes], None], progress_handler: Callable[[float], None] | None = None, cancel_event: threading.Event | None = None) -> str | None:
+        """Streams tarball to consumer (eq. FIFO of extraction), from cache or network."""
+        """Returns path of cached tarball, or None if cancelled. Raises if checksum doesn't match."""
+        cached_path = self.cached_path(url=url)
+        if cached_path:
+            print(f"Using cached stage tarball {cached_path}")
+            total_size = os.path.getsize(cached_path)
+            with open(cached_path, "rb") as cached_file:
+                if not self._copy(chunks=StageTarballCache._file_chunks(cached_file), consumers=[consumer], total_size=total_size, offset=0, progress_handler=progress_handler, cancel_event=cancel_event):
+                    return None
+            return cached_path
+        expected_sha512 = StageTarballCache.fetch_digest(url=url)
+        partial_path = StageTarballCache.partial_path(url=url)
+        os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+        os.makedirs(os.path.dirname(StageTarballCache.object_path("")), exist_ok=True)
+        # Not opened in append mode, downloader writes segments with pwrite.
+        with os.fdopen(os.open(partial_path, os.O_RDWR | os.O_CREAT, 0o644), "r+b") as partial_file:
+            try:
+                fcntl.flock(partial_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError(f"{url} is already being downloaded")
+            hasher = _ParallelHasher()
+            try:
+                # Feed already downloaded part first, then continue from the network.
+                # Anything past stored offset might be preallocated space or incomplete segments.
+                offset = StageTarballCache._load_partial_offset(url=url, partial_size=os.path.getsize(partial_path))
+                partial_file.truncate(offset)
+                partial_file.seek(0)
+                if offset:
+                    print(f"Resuming download of {url} from {offset} bytes")
+                if not self._copy(chunks=StageTarballCache._file_chunks(partial_file), consumers=[consumer, hasher.update], total_size=None, offset=0, progress_handler=None, cancel_event=cancel_event):
+                    return None
+                if not self._download(url=url, partial_file=partial_file, offset=offset, consumers=[consumer, hasher.update], progress_handler=progress_handler, cancel_event=cancel_event):
+                    return None
+            finally:
+                sha512 = hasher.finish()
+            if expected_sha512 and sha512 != expected_sha512:
+                StageTarballCache._remove_partial(url=url)
+                raise RuntimeError(f"Checksum of {url} doesn't match DIGESTS")
+            if not expected_sha512:
+                print(f"Warning: {url} could not be verified, DIGESTS not available")
+            object_path = StageTarballCache.object_path(sha512)
+            os.replace(partial_path, object_path)
+            StageTarballCache._remove_partial(url=url)
+        self._store_in_index(url=url, sha512=sha512)
+        return object_path
+
+    def _download(self, url: str, partial_file: BinaryIO, offset: int, consumers: list[Callable[[bytes], None]], progress_handler: Callable[[float], None] | None, cancel_event: threading.Event | None) -> bool:
+        """Downloads remaining bytes of url to partial_file over several connections, passing them to consumers in order."""
+        downloader = RangedDownloader(url=url, file=partial_file, offset=offset)
+        def report_progress(chunk: bytes):
+            if progress_handler and downloader.progress is not None:
+                progress_handler(downloader.progress)
+        consumed = offset
+        checkpoint = offset
+        def store_checkpoint(chunk: bytes):
+            # Consumed chunks are in order, so everything before them is written.
+            nonlocal consumed, checkpoint
+            consumed += len(chunk)
+            if consumed - checkpoint >= StageTarballCache.OFFSET_CHECKPOINT_SIZE:
+                StageTarballCache._store_partial_offset(url=url, partial_file=partial_file, offset=consumed)
+                checkpoint = consumed
+        chunks = downloader.chunks()
+        try:
+            return self._copy(chunks=chunks, consumers=[*consumers, report_progress, store_checkpoint], total_size=None, offset=offset, progress_handler=None, cancel_event=cancel_event)
+        finally:
+            chunks.close()
+            # Keep only bytes downloaded continuously from the start, so next attempt can resume with Range.
+            partial_file.truncate(downloader.contiguous_end)
+            StageTarballCache._store_partial_offset(url=url, partial_file=partial_file, offset=downloader.contiguous_end)
+
+    @staticmethod
+    def _file_chunks(file: BinaryIO) -> Iterator[bytes]:
+        return iter(lambda: file.read(StageTarballCache.CHUNK_SIZE), b"")
+
+    @staticmethod
+    def _copy(chunks: Iterable[bytes], consumers: list[Callable[[bytes], None]], total_size: int | None, offset: int, progress_handler: Callable[[float], None] | None, cancel_event: threading.Event | None) -> bool:
+        """Passes chunks to all consumers. Returns False if cancelled."""
+        copied = offset
+        for chunk in chunks:
+            if cancel_event and cancel_event.is_set():
+                return False
+            for consumer in consumers:
+                consumer(chunk)
+            copied += len(chunk)
+            if progress_handler and total_size:
+                progress_handler(copied / total_size)
+        return True
+
+@final
+class _ParallelHasher:
+    """Computes sha512 in a separate thread, so hashing runs in parallel with download and extraction."""
+    def __init__(self):
+        self.hash = hashlib.sha512()
+        self.queue: queue.Queue[bytes | None] = queue.Queue(maxsize=64)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    def _run(self):
+        while (chunk := self.queue.get()) is not None:
+            self.hash.update(chunk) # hashlib releases GIL for big buffers.
+    def update(self, chunk: bytes):
+        self.queue.put(chunk)
+    def finish(self) -> str:
+        self.queue.put(None)
+        self.thread.join()
+        return self.hash.hexdigest()
@@ -5,7 +5,7 @@ from pathlib import Path
 from collections import namedtuple
 from .architecture import Emulation
 from .root_helper_client import ServerCall
-import uuid
+import uuid, os
 
 # ------------------------------------------------------------------------------
 # Toolset applications.
@@ -93,12 +93,12 @@ ToolsetApplication.LINUX_HEADERS = ToolsetApplication(
 def toolset_additional_analysis_qemu(app: ToolsetApplication, toolset: 'Toolset', metadata: dict[str, Any]):
     from .toolset import Toolset
     bin_directory = Path(toolset.toolset_root()) / "bin"
-    qemu_systems = Emulation.get_all_qemu_systems()
-    found_qemu_binaries = []
-    for qemu_binary in qemu_systems:
-        binary_path = bin_directory / qemu_binary
-        if binary_path.is_file():
-            found_qemu_binaries.append(qemu_binary)
+    # Single directory listing instead of checking every possible binary.
+    try:
+        bin_entries = {entry.name for entry in os.scandir(bin_directory) if entry.is_file()}
+    except OSError:
+        bin_entries = set()
+    found_qemu_binaries = [qemu_binary for qemu_binary in Emulation.get_all_qemu_systems() if qemu_binary in bin_entries]
     metadata.setdefault(app.package, {})["interpreters"] = found_qemu_binaries
 
 ToolsetApplication.QEMU = ToolsetApplication(
@@ -0,0 +1,262 @@
+from __future__ import annotations
+import os, fcntl, threading, subprocess
+from concurrent.futures import Future
+from typing import final
+from enum import Enum, auto
+from .root_function import root_function
+from .repository import Repository
+from .architecture import Architecture
+from .toolset_spawn import BindMount
+from .background_executor import BackgroundExecutor
+from .helper_functions import directory_disk_usage
+
+@final
+class ToolsetCacheType(Enum):
+    DISTFILES = auto() # Source archives, shared by all toolsets.
+    BINPKGS   = auto() # Binary packages, shared by toolsets of the same architecture.
+    CCACHE    = auto() # Compiler cache, shared by toolsets of the same architecture. Bound only for toolsets using ccache.
+    BINHOST   = auto() # Local binary package host, shared by toolsets of the same architecture and profile.
+
+    @property
+    def mount_path(self) -> str:
+        match self:
+            case ToolsetCacheType.DISTFILES:
+                return "/var/cache/distfiles"
+            case ToolsetCacheType.BINPKGS:
+                return "/var/cache/binpkgs"
+            case ToolsetCacheType.CCACHE:
+                return "/var/cache/ccache"
+            case ToolsetCacheType.BINHOST:
+                return "/var/cache/catalystlab-binhost"
+
+    @property
+    def directory_name(self) -> str:
+        match self:
+            case ToolsetCacheType.DISTFILES:
+                return "distfiles"
+            case ToolsetCacheType.BINPKGS:
+                return os.path.join("binpkgs", Architecture.HOST.value)
+            case ToolsetCacheType.CCACHE:
+                return os.path.join("ccache", Architecture.HOST.value)
+            case ToolsetCacheType.BINHOST:
+                return os.path.join("binhost", Architecture.HOST.value) # Contains subdirectory for every profile.
+
+@final
+class ToolsetCache:
+    """Persistent host-side distfiles, binpkgs, ccache and local binhost caches, shared between toolsets and spawns."""
+    """Spawns hold shared lock on cache while spawned. Pruning takes exclusive lock, so it only runs"""
+    """when no spawn is using the cache. Portage itself handles locking between concurrent emerge calls."""
+    _instance = None
+
+    @classmethod
+    def shared(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.access_lock = threading.RLock()
+        self.spawn_locks: dict[ToolsetSpawn, list[int]] = {} # Spawn -> opened lock file descriptors.
+        self._prune_future: Future | None = None
+        self._prepared_directories: set[tuple[str, int, int]] = set() # (directory, uid, gid) with access granted.
+
+    @property
+    def enabled(self) -> bool:
+        return Repository.Settings.value.toolset_cache_enabled
+
+    @staticmethod
+    def location() -> str:
+        return os.path.realpath(os.path.expanduser(Repository.Settings.value.toolset_cache_location))
+
+    @property
+    def binhost_enabled(self) -> bool:
+        return self.enabled and Repository.Settings.value.toolset_binhost_enabled
+
+    @staticmethod
+    def directory(cache_type: ToolsetCacheType, profile: str | None = None) -> str:
+        """Use profile to get local binhost directory of given profile."""
+        directory = os.path.join(ToolsetCache.location(), cache_type.directory_name)
+        if profile:
+            directory = os.path.join(directory, profile.replace("/", "_"))
+        return directory
+
+    @staticmethod
+    def profile(toolset_root: str) -> str | None:
+        """Portage profile selected in toolset, eq: default/linux/amd64/23.0. None if it can't be determined."""
+        try:
+            profile_target = os.readlink(os.path.join(toolset_root, "etc", "portage", "make.profile"))
+        except OSError:
+            return None
+        _, separator, profile = os.path.normpath(profile_target).partition("profiles/")
+        return (profile.strip("/") or None) if separator else None
+
+    @staticmethod
+    def lock_file_path(cache_type: ToolsetCacheType) -> str:
+        # Lock files are kept next to cache directories, in directory owned by user.
+        return os.path.join(ToolsetCache.location(), f".{cache_type.name.lower()}.lock")
+
+    def bindings(self, toolset_root: str, use_ccache: bool = False, profile: str | None = None) -> list[BindMount]:
+        """Bindings for spawns. Falls back to empty temporary directories if caches are disabled or can't be prepared."""
+        """Local binhost is bound only if toolset profile is known, as packages can't be shared between profiles."""
+        """Host directories keep their owner, portage user of toolset gets access to them through ACL entries."""
+        bindings = []
+        portage_ids = ToolsetCache.portage_ids(toolset_root=toolset_root) if self.enabled else None
+        for cache_type in ToolsetCacheType:
+            if (cache_type == ToolsetCacheType.CCACHE and not use_ccache) or (cache_type == ToolsetCacheType.BINHOST and not profile):
+                continue
+            directory = ToolsetCache.directory(cache_type, profile=profile if cache_type == ToolsetCacheType.BINHOST else None)
+            if (
+                not self.enabled
+                or (cache_type == ToolsetCacheType.BINHOST and not self.binhost_enabled)
+                or not self._prepare_directory(directory=directory, portage_ids=portage_ids)
+            ):
+                # Disabled caches are bound as empty temporary directories, so portage doesn't write to toolset image.
+                bindings.append(BindMount(mount_path=cache_type.mount_path, create_if_missing=True, owner="portage:portage"))
+                continue
+            bindings.append(BindMount(mount_path=cache_type.mount_path, host_path=directory, store_changes=True))
+        return bindings
+
+    @staticmethod
+    def portage_ids(toolset_root: str) -> tuple[int, int] | None:
+        """Uid and gid of portage user and group in toolset. None if they can't be read."""
+        def lookup(database: str) -> int | None:
+            try:
+                with open(os.path.join(toolset_root, "etc", database)) as file:
+                    for line in file:
+                        fields = line.strip().split(":")
+                        if len(fields) > 2 and fields[0] == "portage":
+                            return int(fields[2])
+            except (OSError, ValueError):
+                pass
+            return None
+        uid, gid = lookup("passwd"), lookup("group")
+        return (uid, gid) if uid is not None and gid is not None else None
+
+    def _prepare_directory(self, directory: str, portage_ids: tuple[int, int] | None) -> bool:
+        """Creates cache directory as current user and grants portage user of toolset access to it with ACL."""
+        """Default ACL entries keep files created by portage accessible to user. False if directory can't be used."""
+        if portage_ids is None:
+            return False
+        uid, gid = portage_ids
+        with self.access_lock:
+            if (directory, uid, gid) in self._prepared_directories:
+                return True
+            try:
+                os.makedirs(directory, exist_ok=True)
+                entries = f"u:{uid}:rwX,g:{gid}:rwX,d:u:{uid}:rwX,d:g:{gid}:rwX,d:u:{os.getuid()}:rwX"
+                subprocess.run(["setfacl", "-m", entries, directory], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"Can't use cache directory {directory}, using temporary one: {getattr(e, 'stderr', None) or e}")
+                return False
+            self._prepared_directories.add((directory, uid, gid))
+            return True
+
+    # --------------------------------------------------------------------------
+    # Locking:
+
+    def acquire(self, spawn: ToolsetSpawn):
+        """Takes shared lock on caches for the lifetime of spawn."""
+        if not self.enabled:
+            return
+        with self.access_lock:
+            if spawn in self.spawn_locks:
+                return
+            os.makedirs(ToolsetCache.location(), exist_ok=True)
+            descriptors = []
+            for cache_type in ToolsetCacheType:
+                descriptor = os.open(ToolsetCache.lock_file_path(cache_type), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(descriptor, fcntl.LOCK_SH)
+                descriptors.append(descriptor)
+            self.spawn_locks[spawn] = descriptors
+
+    def release(self, spawn: ToolsetSpawn):
+        with self.access_lock:
+            for descriptor in self.spawn_locks.pop(spawn, []):
+                fcntl.flock(descriptor, fcntl.LOCK_UN)
+                os.close(descriptor)
+
+    # --------------------------------------------------------------------------
+    # Size accounting and pruning:
+
+    @staticmethod
+    def size(cache_type: ToolsetCacheType) -> int:
+        """Disk usage of given cache in bytes."""
+        return directory_disk_usage(ToolsetCache.directory(cache_type))
+
+    def total_size(self) -> int:
+        return sum(ToolsetCache.size(cache_type) for cache_type in ToolsetCacheType)
+
+    def prune(self, max_size: int | None = None) -> bool:
+        """Removes least recently used files until caches fit in max_size (toolset_cache_max_size by default)."""
+        """Skipped if any spawn is using caches. Returns True if pruning was performed."""
+        if not self.enabled:
+            return False
+        if max_size is None:
+            max_size = Repository.Settings.value.toolset_cache_max_size
+        # Measured without holding access_lock, as it walks all cached files.
+        if not os.path.isdir(ToolsetCache.location()) or self.total_size() <= max_size:
+            return False
+        with self.access_lock:
+            descriptors = []
+            try:
+                for cache_type in ToolsetCacheType:
+                    descriptor = os.open(ToolsetCache.lock_file_path(cache_type), os.O_RDWR | os.O_CREAT, 0o644)
+                    descriptors.append(descriptor)
+                    fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print("Toolset caches are in use, pruning skipped")
+                return False
+            else:
+                _prune_toolset_caches(
+                    directories=[ToolsetCache.directory(cache_type) for cache_type in ToolsetCacheType],
+                    max_size=max_size
+                )
+                return True
+            finally:
+                for descriptor in descriptors:
+                    os.close(descriptor)
+
+    def prune_in_background(self) -> Future:
+        """Runs prune with BackgroundExecutor, so measuring caches doesn't block main loop."""
+        """Returns already scheduled pruning if it didn't finish yet."""
+        with self.access_lock:
+            if self._prune_future is None or self._prune_future.done():
+                self._prune_future = BackgroundExecutor.shared().submit(self.prune)
+            return self._prune_future
+
+@root_function
+def _prune_toolset_caches(directories: list[str], max_size: int):
+    """Removes least recently used files from cache directories until their total size fits in max_size."""
+    """Binpkgs and binhost Packages indexes are removed from pruned directories, so portage regenerates them on next use."""
+    import os
+    entries = [] # (last_used, size, path)
+    total_size = 0
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    file_stat = os.lstat(path)
+                except OSError:
+                    continue
+                size = file_stat.st_blocks * 512
+                total_size += size
+                if name in ("Packages", "ccache.conf") or name.startswith("."):
+                    continue # Keep indexes, configs and lock files.
+                entries.append((max(file_stat.st_atime, file_stat.st_mtime), size, path))
+    pruned_directories = set()
+    for last_used, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+            pruned_directories.add(next(directory for directory in directories if path.startswith(directory + "/")))
+        except OSError as e:
+            print(f"Failed to remove {path}: {e}")
+    for directory in pruned_directories:
+        # Local binhost keeps separate index for every profile subdirectory.
+        for root, dirs, files in os.walk(directory):
+            if "Packages" in files:
+                os.remove(os.path.join(root, "Packages"))
+    print(f"Toolset caches pruned to {total_size} bytes")
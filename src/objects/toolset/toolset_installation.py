@@ -1,12 +1,19 @@
 from __future__ import annotations
-import os, uuid, shutil, tempfile, threading, re, random, string, requests, time
-from typing import final, Callable
+import os, uuid, shutil, tempfile, threading, re, random, string, time
+from typing import final, Callable, Any
 from pathlib import Path
 from .root_function import root_function
 from .root_helper_server import ServerResponse, ServerResponseStatusCode
 from .repository import Repository
 from .toolset import Toolset, ToolsetEnv
-from .helper_functions import create_temp_workdir, delete_temp_workdir, create_squashfs, extract
+from .toolset_spawn import ToolsetSpawn
+from .toolset_cache import ToolsetCache, ToolsetCacheType
+from .stage_tarball_cache import StageTarballCache
+from .squashfs_index import SquashfsIndex
+from .portage_tmpfs import PortageTmpfs
+from .toolset_parallelism import ToolsetParallelism
+from .toolset_application import PortageConfig
+from .helper_functions import create_temp_workdir, delete_temp_workdir, create_squashfs, extract, open_fifo_for_writing, file_fingerprint
 from .toolset_manager import ToolsetManager
 
 from .multistage_process import (
@@ -21,21 +28,29 @@ from .multistage_process import (
 @final
 class ToolsetInstallation(MultiStageProcess):
     """Handles the full toolset installation lifecycle."""
-    def __init__(self, alias: str, stage_url: ParseResult, allow_binpkgs: bool, apps_selection: list[ToolsetApplicationSelection]):
+    def __init__(self, alias: str, stage_url: ParseResult, allow_binpkgs: bool, apps_selection: list[ToolsetApplicationSelection], use_ccache: bool = False):
         self.alias = alias
         self.stage_url = stage_url
         self.allow_binpkgs = allow_binpkgs
+        self.use_ccache = use_ccache
         self.apps_selection = apps_selection
+        self.toolset_spawn: ToolsetSpawn | None = None # Writable spawn used by installation steps.
         self._process_selected_apps()
         super().__init__(title="Toolset installation")
 
     def setup_stages(self):
         self.stages.append(ToolsetInstallationStepDownload(url=self.stage_url, multistage_process=self))
-        self.stages.append(ToolsetInstallationStepExtract(multistage_process=self))
         self.stages.append(ToolsetInstallationStepSpawn(multistage_process=self))
         self.stages.append(ToolsetInstallationStepUpdatePortage(multistage_process=self))
-        for app_selection in self.apps_selection:
-            self.stages.append(ToolsetInstallationStepInstallApp(app_selection=app_selection, multistage_process=self))
+        if ToolsetCache.shared().binhost_enabled:
+            self.stages.append(ToolsetInstallationStepSetupBinhost(multistage_process=self))
+        if self.use_ccache:
+            self.stages.append(ToolsetInstallationStepSetupCcache(multistage_process=self))
+        if self.apps_selection:
+            # All apps are emerged by single stage, app stages only present its progress.
+            app_stages = [ToolsetInstallationStepInstallApp(app_selection=app_selection, multistage_process=self) for app_selection in self.apps_selection]
+            self.stages.append(ToolsetInstallationStepInstallApps(app_stages=app_stages, multistage_process=self))
+            self.stages.extend(app_stages)
         self.stages.append(ToolsetInstallationStepVerify(multistage_process=self))
         self.stages.append(ToolsetInstallationStepCompress(multistage_process=self))
 
@@ -86,8 +101,12 @@ class ToolsetInstallationStep(MultiStageProcessStage):
             if self.server_call.thread:
                 self.server_call.thread.join()
             self.server_call = None
-    def run_command_in_toolset(self, command: str, progress_handler: Callable[[str], float | None] | None = None) -> bool:
+    def run_command_in_toolset(self, command: str, progress_handler: Callable[[str], float | None] | None = None, exclusive: bool = False, collect_ccache_stats: bool = False) -> bool:
+        """Use collect_ccache_stats for commands compiling packages, to store ccache statistics of this step in toolset metadata."""
         try:
+            toolset_spawn = self.multistage_process.toolset_spawn
+            metadata = self.multistage_process.toolset.metadata
+            ccache_stats = read_ccache_stats(toolset_spawn=toolset_spawn) if collect_ccache_stats and metadata.get('use_ccache') else None
             return_value = False
             done_event = threading.Event()
             def completion_handler(response: ServerResponse):
@@ -99,14 +118,17 @@ class ToolsetInstallationStep(MultiStageProcessStage):
                 progress = progress_handler(output_line)
                 if progress is not None:
                     self._update_progress(progress)
-            self.server_call = self.multistage_process.toolset.run_command(
+            self.server_call = toolset_spawn.run_command(
                 command=command,
                 handler=output_handler if progress_handler is not None else None,
-                completion_handler=completion_handler
+                completion_handler=completion_handler,
+                exclusive=exclusive
             )
             self.server_call.thread.join()
             done_event.wait()
             self.server_call = None
+            if ccache_stats:
+                store_ccache_stats(metadata=metadata, step_name=self.name, stats_before=ccache_stats, stats_after=read_ccache_stats(toolset_spawn=toolset_spawn))
             return return_value
         except Exception as e:
             print(f"Error running toolset command: {e}")
@@ -117,87 +139,55 @@ class ToolsetInstallationStep(MultiStageProcessStage):
 
 @final
 class ToolsetInstallationStepDownload(ToolsetInstallationStep):
+    """Downloads stage tarball and extracts it at the same time. Downloaded bytes are written to FIFO read"""
+    """by extract root function, so the step takes as long as the slower of both. Tarball is stored in"""
+    """StageTarballCache, so installing the same stage again reads it from disk instead of network."""
     def __init__(self, url: ParseResult, multistage_process: MultiStageProcess):
-        super().__init__(name="Download stage tarball", description="Downloading Gentoo stage tarball", multistage_process=multistage_process)
+        super().__init__(name="Download stage tarball", description="Downloads and extracts Gentoo stage tarball", multistage_process=multistage_process)
         self.url = url
-    def start(self):
-        super().start()
-        try:
-            response = requests.get(self.url.geturl(), stream=True, timeout=10)
-            response.raise_for_status()
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            chunk_size = 1024 * 1024 # 1MB chunks.
-            os.makedirs('/tmp/catalystlab', exist_ok=True)
-            with tempfile.NamedTemporaryFile(delete=False, dir='/tmp/catalystlab') as tmp_file:
-                self.multistage_process.tmp_stage_file = tmp_file
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if self._cancel_event.is_set():
-                        return
-                    if chunk:
-                        tmp_file.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size:
-                            progress = downloaded / total_size
-                            self._update_progress(progress)
-            self.complete(MultiStageProcessStageState.COMPLETED)
-        except Exception as e:
-            print(f"Error during download: {e}")
-            self.complete(MultiStageProcessStageState.FAILED)
-    def cleanup(self) -> bool:
-        if not super().cleanup():
-            return False
-        if hasattr(self.multistage_process, 'tmp_stage_file'):
-            try:
-                self.multistage_process.tmp_stage_file.close()
-                os.remove(self.multistage_process.tmp_stage_file.name)
-            except Exception as e:
-                print(f"Failed to delete temp file: {e}")
-        return True
-
-@final
-class ToolsetInstallationStepExtract(ToolsetInstallationStep):
-    def __init__(self, multistage_process: MultiStageProcess):
-        super().__init__(name="Extract stage tarball", description="Extracts Gentoo stage tarball to work directory", multistage_process=multistage_process)
+        self.fifo_dir: str | None = None
     def start(self):
         super().start()
         try:
             self.multistage_process.tmp_stage_extract_dir = create_temp_workdir(prefix=f"toolsets/{Toolset.sanitized_name_for_name(name=self.multistage_process.alias)}/setup_")
+            os.makedirs('/tmp/catalystlab', exist_ok=True)
+            self.fifo_dir = tempfile.mkdtemp(dir='/tmp/catalystlab')
+            fifo_path = os.path.join(self.fifo_dir, "stage.fifo")
+            os.mkfifo(fifo_path, 0o600)
             return_value = False
             done_event = threading.Event()
             def completion_handler(response: ServerResponse):
                 nonlocal return_value
                 return_value = response.code == ServerResponseStatusCode.OK
                 done_event.set()
-            def output_handler(output_line: str):
-                if output_line.startswith("PROGRESS: "):
-                    try:
-                        progress_str = output_line[len("PROGRESS: "):]
-                        progress_value = float(progress_str)
-                        self._update_progress(progress_value)
-                    except ValueError:
-                        pass
             self.server_call = extract._async_raw(
-                handler=output_handler,
+                handler=None,
                 completion_handler=completion_handler,
-                tarball=self.multistage_process.tmp_stage_file.name,
-                directory=self.multistage_process.tmp_stage_extract_dir
+                tarball=fifo_path,
+                directory=self.multistage_process.tmp_stage_extract_dir,
+                compression=next((suffix for suffix in ("xz", "zst", "bz2", "gz") if self.url.path.endswith("." + suffix)), None)
             )
+            with open_fifo_for_writing(path=fifo_path, abort_event=done_event) as fifo:
+                # Progress is tracked by compressed bytes, extraction keeps pace through FIFO.
+                if not StageTarballCache.shared().fetch(url=self.url.geturl(), consumer=fifo.write, progress_handler=self._update_progress, cancel_event=self._cancel_event):
+                    return
             self.server_call.thread.join()
             done_event.wait()
             if not self._cancel_event.is_set():
                 self.server_call = None
                 self.complete(MultiStageProcessStageState.COMPLETED if return_value else MultiStageProcessStageState.FAILED)
         except Exception as e:
-            print(f"Error extracting stage tarball: {e}")
+            print(f"Error during download: {e}")
             self.complete(MultiStageProcessStageState.FAILED)
     def cleanup(self) -> bool:
         if not super().cleanup():
             return False
-        if hasattr(self.multistage_process, "tmp_stage_extract_dir") and self.multistage_process.tmp_stage_extract_dir:
+        if self.fifo_dir:
+            shutil.rmtree(self.fifo_dir, ignore_errors=True)
+            self.fifo_dir = None
+        if getattr(self.multistage_process, "tmp_stage_extract_dir", None):
             delete_temp_workdir(self.multistage_process.tmp_stage_extract_dir)
-            return True
-        return False
+        return True
 
 @final
 class ToolsetInstallationStepSpawn(ToolsetInstallationStep):
@@ -213,9 +203,11 @@ class ToolsetInstallationStepSpawn(ToolsetInstallationStep):
             self.multistage_process.toolset.metadata['date_updated'] = now
             self.multistage_process.toolset.metadata['source'] = self.multistage_process.stage_url.geturl()
             self.multistage_process.toolset.metadata['allow_binpkgs'] = self.multistage_process.allow_binpkgs
+            self.multistage_process.toolset.metadata['use_ccache'] = self.multistage_process.use_ccache
             if not self.multistage_process.toolset.reserve():
                 raise RuntimeError("Failed to reserve toolset")
-            self.multistage_process.toolset.spawn(store_changes=True)
+            self.multistage_process.toolset_spawn = self.multistage_process.toolset.spawn(store_changes=True)
+            ToolsetParallelism.write_make_conf(toolset=self.multistage_process.toolset)
             commands = [
                 "env-update && source /etc/profile",
                 "getuto"
@@ -235,8 +227,8 @@ class ToolsetInstallationStepSpawn(ToolsetInstallationStep):
         if not super().cleanup():
             return False
         if getattr(self.multistage_process, 'toolset', None):
-            if self.multistage_process.toolset.spawned:
-                self.multistage_process.toolset.unspawn(rebuild_squashfs_if_needed=False)
+            if self.multistage_process.toolset_spawn in self.multistage_process.toolset.spawns:
+                self.multistage_process.toolset.unspawn(spawn=self.multistage_process.toolset_spawn, rebuild_squashfs_if_needed=False)
             self.multistage_process.toolset.release()
             return True
         return False
@@ -260,44 +252,126 @@ class ToolsetInstallationStepUpdatePortage(ToolsetInstallationStep):
                 match = re.match(pattern, output_line)
                 if match:
                     return int(match.group(1)) / 100.0
-            result = self.run_command_in_toolset(command="emerge-webrsync", progress_handler=progress_handler)
+            result = self.run_command_in_toolset(command="emerge-webrsync", progress_handler=progress_handler, exclusive=True)
             self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
         except Exception as e:
             print(f"Error synchronizing Portage: {e}")
             self.complete(MultiStageProcessStageState.FAILED)
 
 @final
-class ToolsetInstallationStepInstallApp(ToolsetInstallationStep):
-    def __init__(self, app_selection: ToolsetApplicationSelection, multistage_process: MultiStageProcess):
-        super().__init__(name=f"Install {app_selection.app.name}", description=f"Emerges {app_selection.app.package} package", multistage_process=multistage_process)
-        self.app_selection = app_selection
+class ToolsetInstallationStepSetupBinhost(ToolsetInstallationStep):
+    def __init__(self, multistage_process: MultiStageProcess):
+        super().__init__(name="Setup binary packages", description="Configures local binary package host", multistage_process=multistage_process)
     def start(self):
         super().start()
         try:
+            result = True
+            if is_binhost_bound(toolset_spawn=self.multistage_process.toolset_spawn):
+                result = self.run_command_in_toolset(command=BINHOST_INDEX_COMMAND, exclusive=True)
+            self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
+        except Exception as e:
+            print(f"Error during binary packages setup: {e}")
+            self.complete(MultiStageProcessStageState.FAILED)
+
+@final
+class ToolsetInstallationStepSetupCcache(ToolsetInstallationStep):
+    def __init__(self, multistage_process: MultiStageProcess):
+        super().__init__(name="Setup ccache", description="Installs and configures compiler cache", multistage_process=multistage_process)
+    def start(self):
+        super().start()
+        try:
+            flags = "--getbinpkg --noreplace" if self.multistage_process.allow_binpkgs else "--noreplace"
+            command = binhost_emerge_command(toolset_spawn=self.multistage_process.toolset_spawn, command=f"emerge {flags} {CCACHE_PACKAGE}")
+            result = self.run_command_in_toolset(command=command, exclusive=True)
+            if result:
+                for config in CCACHE_PORTAGE_CONFIG:
+                    insert_portage_config(config_dir=config.directory, config_entries=config.entries, app_name=CCACHE_CONFIG_NAME, toolset_root=self.multistage_process.toolset.toolset_root())
+            self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
+        except Exception as e:
+            print(f"Error during ccache setup: {e}")
+            self.complete(MultiStageProcessStageState.FAILED)
+
+@final
+class ToolsetInstallationStepInstallApps(ToolsetInstallationStep):
+    """Writes portage configs and patches of all apps, then emerges all of them with single emerge call."""
+    """Dependencies are calculated once and independent packages are built in parallel, using --jobs and"""
+    """--load-average from EMERGE_DEFAULT_OPTS set in spawn by ToolsetParallelism. Progress of"""
+    """every app is presented by its app stage, using packages from merge list that precede it."""
+    def __init__(self, app_stages: list[ToolsetInstallationStepInstallApp], multistage_process: MultiStageProcess):
+        super().__init__(name="Install applications", description="Emerges selected applications with their dependencies", multistage_process=multistage_process)
+        self.app_stages = app_stages
+    def start(self):
+        super().start()
+        try:
+            for app_stage in self.app_stages:
+                if self._cancel_event.is_set():
+                    return
+                app_stage.write_portage_files()
+            tracker = EmergeAppsProgressTracker(packages=[app_stage.app_selection.app.package for app_stage in self.app_stages])
             def progress_handler(output_line: str) -> float or None:
-                pattern = r"^>>> Completed \((\d+) of (\d+)\)"
-                match = re.match(pattern, output_line)
-                if match:
-                    n, m = map(int, match.groups())
-                    return n / m
-            if self.app_selection.version.config:
-                for config in self.app_selection.version.config:
-                    if self._cancel_event.is_set():
-                        return
-                    insert_portage_config(config_dir=config.directory, config_entries=config.entries, app_name=self.app_selection.app.name, toolset_root=self.multistage_process.toolset.toolset_root())
-            for patch_file in self.app_selection.patches:
-                file_input_stream = patch_file.read()
-                file_info = file_input_stream.query_info("standard::size", None)
-                file_size = file_info.get_size()
-                patch_content = file_input_stream.read_bytes(file_size, None).get_data().decode()
-                insert_portage_patch(patch_content=patch_content, patch_filename=patch_file.get_basename(), app_package=self.app_selection.app.package, toolset_root=self.multistage_process.toolset.toolset_root())
+                if not tracker.handle_line(output_line):
+                    return None
+                for app_stage, app_progress in zip(self.app_stages, tracker.apps_progress):
+                    app_stage.update_progress(progress=app_progress)
+                return tracker.progress
             flags = "--getbinpkg --deep --update --changed-use" if self.multistage_process.allow_binpkgs else "--deep --update --changed-use"
-            result = self.run_command_in_toolset(command=f"emerge {flags} {self.app_selection.app.package}", progress_handler=progress_handler)
+            packages = " ".join(app_stage.app_selection.app.package for app_stage in self.app_stages)
+            command = binhost_emerge_command(
+                toolset_spawn=self.multistage_process.toolset_spawn,
+                command=f"emerge --verbose {flags} {packages}",
+                excluded_packages=[app_stage.app_selection.app.package for app_stage in self.app_stages if app_stage.app_selection.patches]
+            )
+            result = PortageTmpfs.run_emerge(
+                toolset_spawn=self.multistage_process.toolset_spawn,
+                run_command=self.run_command_in_toolset,
+                command=command,
+                progress_handler=progress_handler,
+                exclusive=True,
+                collect_ccache_stats=True
+            )
+            for app_stage in self.app_stages:
+                app_stage.update_progress(progress=1.0 if result else None, failed=not result)
             self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
         except Exception as e:
-            print(f"Error during app installation: {e}")
+            print(f"Error during apps installation: {e}")
             self.complete(MultiStageProcessStageState.FAILED)
 
+@final
+class ToolsetInstallationStepInstallApp(ToolsetInstallationStep):
+    """Presents installation progress of single app. Work is done by ToolsetInstallationStepInstallApps."""
+    def __init__(self, app_selection: ToolsetApplicationSelection, multistage_process: MultiStageProcess):
+        super().__init__(name=f"Install {app_selection.app.name}", description=f"Emerges {app_selection.app.package} package", multistage_process=multistage_process)
+        self.app_selection = app_selection
+    def start(self):
+        super().start()
+        # Normally completed by ToolsetInstallationStepInstallApps already.
+        self.complete(MultiStageProcessStageState.COMPLETED)
+    def write_portage_files(self):
+        if self.app_selection.version.config:
+            for config in self.app_selection.version.config:
+                insert_portage_config(config_dir=config.directory, config_entries=config.entries, app_name=self.app_selection.app.name, toolset_root=self.multistage_process.toolset.toolset_root())
+        for patch_file in self.app_selection.patches:
+            file_input_stream = patch_file.read()
+            file_info = file_input_stream.query_info("standard::size", None)
+            file_size = file_info.get_size()
+            patch_content = file_input_stream.read_bytes(file_size, None).get_data().decode()
+            insert_portage_patch(patch_content=patch_content, patch_filename=patch_file.get_basename(), app_package=self.app_selection.app.package, toolset_root=self.multistage_process.toolset.toolset_root())
+    def update_progress(self, progress: float | None, failed: bool = False):
+        """Updates state without continuing the process, as this stage doesn't run its own work."""
+        if self.state in (MultiStageProcessStageState.COMPLETED, MultiStageProcessStageState.FAILED):
+            return
+        if failed:
+            if self.state == MultiStageProcessStageState.IN_PROGRESS:
+                self._update_state(MultiStageProcessStageState.FAILED)
+            return
+        if progress is None:
+            return
+        if progress >= 1.0:
+            self._update_state(MultiStageProcessStageState.COMPLETED)
+        elif self.state == MultiStageProcessStageState.SCHEDULED:
+            self._update_state(MultiStageProcessStageState.IN_PROGRESS)
+        self._update_progress(min(progress, 1.0))
+
 @final
 class ToolsetInstallationStepVerify(ToolsetInstallationStep):
     def __init__(self, multistage_process: MultiStageProcess):
@@ -305,8 +379,7 @@ class ToolsetInstallationStepVerify(ToolsetInstallationStep):
     def start(self):
         super().start()
         try:
-            analysis_result = self.multistage_process.toolset.analyze(save=True)
-            self.multistage_process.toolset.write_metadata_to_json(metadata=analysis_result)
+            analysis_result = self.multistage_process.toolset.analyze(save=True) # Also writes toolset.json and package index.
             self.complete(MultiStageProcessStageState.COMPLETED if analysis_result else MultiStageProcessStageState.FAILED)
         except Exception as e:
             print(f"Error during toolset verification: {e}")
@@ -333,7 +406,9 @@ class ToolsetInstallationStepCompress(ToolsetInstallationStep):
             file_path = self.multistage_process.toolset.file_path()
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             shutil.move(self.toolset_squashfs_file, file_path)
-            self.multistage_process.toolset.unspawn(rebuild_squashfs_if_needed=False, clean_squashfs_binding_dir=False) # Need to unspawn now, to prevent issues with unmounting after squashfs_file was set
+            SquashfsIndex.write(image_path=file_path)
+            self.multistage_process.toolset.fingerprint = file_fingerprint(file_path)
+            self.multistage_process.toolset.unspawn(spawn=self.multistage_process.toolset_spawn, rebuild_squashfs_if_needed=False, clean_squashfs_binding_dir=False) # Need to unspawn now, to prevent issues with unmounting after squashfs_file was set
             self.complete(MultiStageProcessStageState.COMPLETED)
         except Exception as e:
             print(f"Error during toolset compression: {e}")
@@ -377,3 +452,141 @@ def insert_portage_patch(patch_content: str, patch_filename: str, app_package: s
     with open(patch_file_path, "w", encoding="utf-8") as f:
         f.write(patch_content)
 
+# ------------------------------------------------------------------------------
+# Compiler cache.
+# ------------------------------------------------------------------------------
+
+CCACHE_PACKAGE = "dev-util/ccache"
+CCACHE_CONFIG_NAME = "catalystlab-ccache" # Name of env file and package.env entry in toolset portage config.
+CCACHE_PORTAGE_CONFIG = (
+    PortageConfig(directory="env", entries=('FEATURES="ccache"', f'CCACHE_DIR="{ToolsetCacheType.CCACHE.mount_path}"')),
+    PortageConfig(directory="package.env", entries=(f"*/* {CCACHE_CONFIG_NAME}",)),
+)
+
+def read_ccache_stats(toolset_spawn: ToolsetSpawn) -> dict[str, Any] | None:
+    """Runs ccache -s in toolset spawn and returns parsed statistics, or None if not available."""
+    output_lines: list[str] = []
+    done_event = threading.Event()
+    try:
+        toolset_spawn.run_command(
+            command=f"CCACHE_DIR={ToolsetCacheType.CCACHE.mount_path} ccache -s",
+            handler=output_lines.append,
+            completion_handler=lambda _: done_event.set()
+        )
+        done_event.wait()
+    except Exception as e:
+        print(f"Failed to read ccache statistics: {e}")
+        return None
+    return parse_ccache_stats(output_lines=output_lines)
+
+def parse_ccache_stats(output_lines: list[str]) -> dict[str, Any] | None:
+    """Parses hits, misses and cache size from ccache -s output. Supports ccache 3.x and 4.x formats."""
+    hits = None
+    misses = None
+    cache_size = None
+    for line in output_lines:
+        line = line.strip()
+        if match := re.match(r"^Hits:\s+(\d+)", line):
+            if hits is None: # First entry is local storage summary.
+                hits = int(match.group(1))
+        elif match := re.match(r"^Misses:\s+(\d+)", line):
+            if misses is None:
+                misses = int(match.group(1))
+        elif match := re.match(r"^cache hit \((?:direct|preprocessed)\)\s+(\d+)", line):
+            hits = (hits or 0) + int(match.group(1))
+        elif match := re.match(r"^cache miss\s+(\d+)", line):
+            misses = int(match.group(1))
+        elif match := re.match(r"^Cache size \((\w+)\):\s+([\d.]+)", line):
+            cache_size = f"{match.group(2)} {match.group(1)}"
+        elif match := re.match(r"^cache size\s+([\d.]+ \w+)", line):
+            cache_size = match.group(1)
+    if hits is None or misses is None:
+        return None
+    return {"hits": hits, "misses": misses, "cache_size": cache_size}
+
+def store_ccache_stats(metadata: dict[str, Any], step_name: str, stats_before: dict[str, Any], stats_after: dict[str, Any] | None):
+    """Stores current ccache statistics and hits/misses of given step in toolset metadata."""
+    if not stats_after:
+        return
+    metadata['ccache_stats'] = {
+        **stats_after,
+        "last_step": {
+            "name": step_name,
+            "hits": stats_after["hits"] - stats_before["hits"],
+            "misses": stats_after["misses"] - stats_before["misses"]
+        }
+    }
+
+# ------------------------------------------------------------------------------
+# Local binary package host.
+# ------------------------------------------------------------------------------
+
+BINHOST_CONFIG_NAME = "catalystlab-binhost" # Name of binrepos.conf entry added by earlier versions, removed on update.
+BINHOST_INDEX_COMMAND = f"PKGDIR={ToolsetCacheType.BINHOST.mount_path} emaint binhost --fix" # Creates or refreshes Packages index.
+
+def is_binhost_bound(toolset_spawn: ToolsetSpawn) -> bool:
+    """Checks if persistent local binhost directory is bound in spawn."""
+    return any(
+        binding.mount_path == ToolsetCacheType.BINHOST.mount_path and binding.host_path
+        for binding in toolset_spawn.current_bindings
+    )
+
+def binhost_emerge_command(toolset_spawn: ToolsetSpawn, command: str, excluded_packages: list[str] | None = None) -> str:
+    """Extends emerge command, so that built packages are published in local binhost and packages already there are reused."""
+    """Local binhost of toolset architecture and profile is used as PKGDIR, so portage maintains its Packages index."""
+    """Packages are published by --buildpkg and consumed by --usepkg. It's not added to binrepos.conf, as --getbinpkg"""
+    """would then fetch packages from PKGDIR into itself."""
+    """Use excluded_packages for packages built with user patches, which are not tracked in binary packages metadata."""
+    if not is_binhost_bound(toolset_spawn=toolset_spawn):
+        return command
+    exclude_flags = "".join(f" --usepkg-exclude={package} --buildpkg-exclude={package}" for package in excluded_packages or [])
+    return f"PKGDIR={ToolsetCacheType.BINHOST.mount_path} {command} --buildpkg --usepkg{exclude_flags}"
+
+# ------------------------------------------------------------------------------
+# Combined emerge.
+# ------------------------------------------------------------------------------
+
+@final
+class EmergeAppsProgressTracker:
+    """Attributes emerge --verbose progress to apps. Every package from merge list belongs to the first app"""
+    """placed after it (or the app itself), as dependencies are merged before packages requiring them."""
+    MERGE_LIST_PATTERN = re.compile(r"^\[(?:ebuild|binary)[^\]]*\]\s+([\w+.-]+/[^\s:]+)")
+    COMPLETED_PATTERN = re.compile(r"^>>> Completed \((\d+) of (\d+)\) ([\w+.-]+/[^\s:]+)")
+    def __init__(self, packages: list[str]):
+        self.packages = packages # Package names of apps, eq: dev-util/catalyst
+        self.merge_list: list[str] = [] # Package versions in merge order, eq: dev-util/catalyst-4.0.1
+        self.completed: set[str] = set()
+        self.total: int | None = None
+    def handle_line(self, output_line: str) -> bool:
+        """Returns True if progress changed."""
+        output_line = output_line.strip()
+        if output_line.startswith("Calculating dependencies"): # Emerge was started again.
+            self.merge_list = []
+            self.completed = set()
+            self.total = None
+            return True
+        if match := self.MERGE_LIST_PATTERN.match(output_line):
+            self.merge_list.append(match.group(1))
+            return False
+        if match := self.COMPLETED_PATTERN.match(output_line):
+            self.completed.add(match.group(3))
+            self.total = int(match.group(2))
+            return True
+        return False
+    @property
+    def progress(self) -> float | None:
+        return len(self.completed) / self.total if self.total else None
+    @property
+    def apps_progress(self) -> list[float | None]:
+        """Progress of every app. Apps not present in merge list are already installed."""
+        def app_index(package: str) -> int | None:
+            pattern = re.compile(rf"^{re.escape(package)}-\d")
+            return next((index for index, version in enumerate(self.merge_list) if pattern.match(version)), None)
+        indexes = {package: app_index(package) for package in self.packages}
+        progress: dict[str, float] = {}
+        segment_start = 0
+        for package in sorted((package for package in self.packages if indexes[package] is not None), key=indexes.get):
+            segment = self.merge_list[segment_start:indexes[package] + 1]
+            segment_start = indexes[package] + 1
+            progress[package] = sum(1 for version in segment if version in self.completed) / len(segment)
+        return [progress.get(package, 1.0 if self.merge_list else None) for package in self.packages]
@@ -1,6 +1,14 @@
 from .repository import Repository
-import os, shutil, uuid, subprocess, json
+import os, shutil, uuid, json
+from typing import Any
+from concurrent.futures import Future
+from gi.repository import GLib
 from .toolset import Toolset, ToolsetEnv
+from .squashfs_image import SquashfsImage, SquashfsError
+from .squashfs_index import SquashfsIndex
+from .helper_functions import file_fingerprint
+from .background_executor import BackgroundExecutor
+from .startup_profiler import StartupProfiler
 
 class ToolsetManager:
     _instance = None
@@ -13,9 +21,21 @@ class ToolsetManager:
             cls._instance = cls()
         return cls._instance
 
-    def refresh(self):
-        toolsets = Repository.Toolset.value
-        # Detect missing toolsets and add them to repository
+    def refresh(self, background: bool = False) -> Future | None:
+        """Synchronizes repository with .sqfs files in toolsets location. Metadata is only read from files"""
+        """that are new or whose fingerprint changed. In background mode files are scanned in separate thread"""
+        """and repository is updated in main thread."""
+        if not background:
+            self._apply_refresh(*self._scan())
+            return None
+        def worker():
+            with StartupProfiler.measure("refresh ToolsetManager"):
+                found_filenames, changes = self._scan()
+            GLib.idle_add(self._apply_refresh, found_filenames, changes)
+        return BackgroundExecutor.shared().submit(worker)
+
+    def _scan(self) -> tuple[set[str], dict[str, tuple[tuple[int, int, int], dict[str, Any]]]]:
+        """Returns filenames of all toolset files and (fingerprint, metadata) of new or modified ones."""
         toolsets_location = os.path.realpath(os.path.expanduser(Repository.Settings.value.toolsets_location))
         # --- Step 1: Scan directory for existing .sqfs files ---
         if not os.path.isdir(toolsets_location):
@@ -24,37 +44,61 @@ class ToolsetManager:
             f for f in os.listdir(toolsets_location)
             if f.endswith(".sqfs") and os.path.isfile(os.path.join(toolsets_location, f))
         }
-        # --- Step 2: Check for new toolsets not in repository ---
-        existing_filenames = {toolset.filename for toolset in toolsets}
-        missing_files = found_filenames - existing_filenames
-        for filename in missing_files:
+        # --- Step 2: Read metadata of files not matching repository fingerprints ---
+        known_fingerprints = {toolset.filename: toolset.fingerprint for toolset in Repository.Toolset.value}
+        changes = {}
+        for filename in found_filenames:
             full_path = os.path.join(toolsets_location, filename)
+            fingerprint = file_fingerprint(full_path)
+            if fingerprint is None or known_fingerprints.get(filename) == fingerprint:
+                continue
             # Load metadata from json file:
             try:
-                output = subprocess.check_output(['unsquashfs', '-cat', full_path, "toolset.json"], text=True)
-                metadata = json.loads(output)
-                toolset = Toolset(
-                    env=ToolsetEnv.EXTERNAL,
-                    uuid=uuid.uuid4(),
-                    name=filename[:-5], # Removes .sqfs
-                    metadata=metadata
-                )
-                self.add_toolset(toolset)
-            except subprocess.CalledProcessError as e:
+                output = SquashfsImage.for_path(full_path).read_text("toolset.json")
+                changes[filename] = (fingerprint, json.loads(output))
+            except (OSError, SquashfsError, ValueError) as e:
                 print(f"Error reading {full_path}: {e}")
-        # --- Step 3: Remove records for deleted toolset files ---
-        deleted_toolsets = [toolset for toolset in toolsets if toolset.filename not in found_filenames]
-        for toolset in deleted_toolsets:
-            self.remove_toolset(toolset)
+        return found_filenames, changes
+
+    def _apply_refresh(self, found_filenames: set[str], changes: dict[str, tuple[tuple[int, int, int], dict[str, Any]]]) -> bool:
+        # Single save and change event for the whole refresh.
+        with Repository.Toolset.transaction():
+            toolsets = Repository.Toolset.value
+            # --- Step 3: Update modified toolsets and add new ones ---
+            existing_toolsets = {toolset.filename: toolset for toolset in toolsets}
+            modified = False
+            for filename, (fingerprint, metadata) in changes.items():
+                if toolset := existing_toolsets.get(filename):
+                    if toolset.spawned:
+                        continue # File is being rebuilt by this toolset.
+                    toolset.metadata = metadata
+                    toolset.fingerprint = fingerprint
+                    modified = True
+                else:
+                    toolset = Toolset(
+                        env=ToolsetEnv.EXTERNAL,
+                        uuid=uuid.uuid4(),
+                        name=filename[:-5], # Removes .sqfs
+                        metadata=metadata,
+                        fingerprint=fingerprint
+                    )
+                    self.add_toolset(toolset)
+            if modified:
+                Repository.Toolset.save()
+            # --- Step 4: Remove records for deleted toolset files ---
+            deleted_toolsets = [toolset for toolset in Repository.Toolset.value if toolset.filename not in found_filenames]
+            for toolset in deleted_toolsets:
+                self.remove_toolset(toolset)
+        return False # Remove idle callback after running once
 
     def add_toolset(self, toolset: Toolset):
-        # Remove existing toolset before adding.
-        Repository.Toolset.value = [s for s in Repository.Toolset.value if s.uuid != toolset.uuid]
-        Repository.Toolset.value.append(toolset)
+        # Remove existing toolset before adding. Assigned once, so repository is saved once.
+        Repository.Toolset.value = [s for s in Repository.Toolset.value if s.uuid != toolset.uuid] + [toolset]
 
     def remove_toolset(self, toolset: Toolset):
         if os.path.isfile(toolset.file_path()):
             os.remove(toolset.file_path())
+        SquashfsIndex.remove(image_path=toolset.file_path())
         Repository.Toolset.value.remove(toolset)
 
     def is_name_available(self, name: str) -> bool:
@@ -68,6 +112,7 @@ class ToolsetManager:
             raise RuntimeError(f"Toolset name {name} is not available")
         new_path = Toolset.file_path_for_name(name=name)
         shutil.move(toolset.file_path(), new_path)
+        SquashfsIndex.move(image_path=toolset.file_path(), new_image_path=new_path)
         toolset.name = name
         Repository.Toolset.save()
 
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import os, re, json, threading
+from typing import final, NamedTuple
+from .root_function import root_function
+from .squashfs_image import SquashfsImage, SquashfsError
+
+@final
+class InstalledPackage(NamedTuple):
+    cpv: str # eq: dev-util/catalyst-4.0.0-r1
+    slot: str
+    use: tuple[str, ...] # Enabled USE flags.
+    size: int # Installed size in bytes.
+
+    @property
+    def package(self) -> str:
+        """Category and name, eq: dev-util/catalyst."""
+        return InstalledPackage.split_cpv(self.cpv)[0]
+
+    @property
+    def version(self) -> str:
+        """Version with revision, eq: 4.0.0-r1."""
+        return InstalledPackage.split_cpv(self.cpv)[1]
+
+    @staticmethod
+    def split_cpv(cpv: str) -> tuple[str, str]:
+        match = re.match(r"^(.+?)-(\d+(?:\.\d+)*[a-z]?(?:_(?:alpha|beta|pre|rc|p)\d*)*(?:-r\d+)?)$", cpv)
+        return (match.group(1), match.group(2)) if match else (cpv, "")
+
+@final
+class ToolsetPackageIndex:
+    """Index of packages installed in toolset (cpv, slot, USE and size from /var/db/pkg)."""
+    """Generated whenever toolset.json is written and stored next to it in toolset root, so it is a part of"""
+    """toolset image and can be queried without spawning toolset or walking the package database."""
+
+    FILE_NAME = "toolset_packages.json"
+    VERSION = 1
+
+    _cache: dict[str, tuple[tuple[int, int], ToolsetPackageIndex]] = {} # Indexes loaded from images, by image path.
+    _cache_lock = threading.Lock()
+
+    def __init__(self, packages: list[InstalledPackage]):
+        self.packages = packages
+        self._by_package: dict[str, list[InstalledPackage]] = {}
+        for package in packages:
+            self._by_package.setdefault(package.package, []).append(package)
+
+    # --------------------------------------------------------------------------
+    # Queries:
+
+    def find(self, package: str) -> list[InstalledPackage]:
+        """Installed versions (slots) of package, eq: dev-util/catalyst."""
+        return self._by_package.get(package, [])
+
+    def version(self, package: str) -> str | None:
+        installed = self.find(package=package)
+        return installed[0].version if installed else None
+
+    def total_size(self) -> int:
+        return sum(package.size for package in self.packages)
+
+    # --------------------------------------------------------------------------
+    # Serialization:
+
+    def serialize(self) -> dict:
+        return {
+            "version": ToolsetPackageIndex.VERSION,
+            "packages": [[package.cpv, package.slot, " ".join(package.use), package.size] for package in self.packages]
+        }
+
+    @classmethod
+    def init_from(cls, data: dict) -> ToolsetPackageIndex:
+        if data.get("version") != ToolsetPackageIndex.VERSION:
+            raise ValueError(f"Unsupported package index version {data.get('version')}")
+        return cls(packages=[
+            InstalledPackage(cpv=cpv, slot=slot, use=tuple(use.split()), size=size)
+            for cpv, slot, use, size in data.get("packages", [])
+        ])
+
+    # --------------------------------------------------------------------------
+    # Generating and loading:
+
+    @staticmethod
+    def build(toolset_root: str) -> ToolsetPackageIndex:
+        """Reads package database of toolset root. Empty index if toolset has no package database."""
+        def read(path: str) -> str:
+            try:
+                with open(path) as file:
+                    return file.read().strip()
+            except OSError:
+                return ""
+        vdb_path = os.path.join(toolset_root, "var", "db", "pkg")
+        packages: list[InstalledPackage] = []
+        try:
+            categories = [entry for entry in os.scandir(vdb_path) if entry.is_dir()]
+        except OSError:
+            return ToolsetPackageIndex(packages=[])
+        for category in sorted(categories, key=lambda entry: entry.name):
+            for package in sorted(os.scandir(category.path), key=lambda entry: entry.name):
+                if not package.is_dir() or package.name.startswith("-MERGING-"):
+                    continue
+                size = read(os.path.join(package.path, "SIZE"))
+                packages.append(InstalledPackage(
+                    cpv=f"{category.name}/{package.name}",
+                    slot=read(os.path.join(package.path, "SLOT")) or "0",
+                    use=tuple(read(os.path.join(package.path, "USE")).split()),
+                    size=int(size) if size.isdigit() else 0
+                ))
+        return ToolsetPackageIndex(packages=packages)
+
+    @staticmethod
+    def write(toolset_root: str, index: ToolsetPackageIndex | None = None) -> ToolsetPackageIndex:
+        """Stores index in toolset root, building it first if not given."""
+        if index is None:
+            index = ToolsetPackageIndex.build(toolset_root=toolset_root)
+        _write_package_index(toolset_root=toolset_root, file_name=ToolsetPackageIndex.FILE_NAME, index=index.serialize())
+        return index
+
+    @staticmethod
+    def for_toolset(toolset: Toolset) -> ToolsetPackageIndex | None:
+        """Index of toolset, read from spawned toolset root or from toolset image, without spawning it."""
+        """Index from image is cached until image changes. None if toolset doesn't contain index."""
+        from .toolset import ToolsetEnv
+        toolset_root = toolset.toolset_root()
+        if toolset.env == ToolsetEnv.SYSTEM:
+            return ToolsetPackageIndex.build(toolset_root=toolset_root)
+        if toolset.spawned and toolset_root:
+            try:
+                with open(os.path.join(toolset_root, ToolsetPackageIndex.FILE_NAME)) as index_file:
+                    return ToolsetPackageIndex.init_from(json.load(index_file))
+            except (OSError, ValueError) as e:
+                print(f"Failed to read package index of {toolset.name}: {e}")
+                return None
+        file_path = toolset.file_path()
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+        with ToolsetPackageIndex._cache_lock:
+            cached = ToolsetPackageIndex._cache.get(file_path)
+            if cached and cached[0] == fingerprint:
+                return cached[1]
+        try:
+            output = SquashfsImage.for_path(file_path).read_text(ToolsetPackageIndex.FILE_NAME)
+            index = ToolsetPackageIndex.init_from(json.loads(output))
+        except (OSError, SquashfsError, ValueError) as e:
+            print(f"Failed to read package index of {toolset.name}: {e}")
+            return None
+        with ToolsetPackageIndex._cache_lock:
+            ToolsetPackageIndex._cache[file_path] = (fingerprint, index)
+        return index
+
+@root_function
+def _write_package_index(toolset_root: str, file_name: str, index: dict):
+    import os, json
+    index_path = os.path.join(toolset_root, file_name)
+    with open(index_path + ".tmp", "w") as index_file:
+        json.dump(index, index_file, separators=(",", ":"))
+    os.replace(index_path + ".tmp", index_path)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import os, re
+from typing import final, Any
+from .root_function import root_function
+
+@final
+class ToolsetParallelism:
+    """Parallel build settings (MAKEOPTS and EMERGE_DEFAULT_OPTS) derived from host CPUs and memory."""
+    """Values are passed to every spawn as environment variables, which take precedence over make.conf,"""
+    """so toolset moved to another machine uses its resources. Toolset can override them in metadata, eq:"""
+    """metadata['parallelism'] = {"make_jobs": 4, "emerge_jobs": 2, "load_average": 6.0}"""
+
+    METADATA_KEY = "parallelism"
+    MEMORY_PER_MAKE_JOB = 2 * 1024 ** 3 # Compilers of big C++ projects need up to 2 GiB per job.
+    MAX_EMERGE_JOBS = 4
+    MAKE_CONF_MARKER = "CatalystLab parallelism" # Marks block managed by CatalystLab in make.conf.
+    JOBS_OPTION_PATTERN = re.compile(r"^(?:--jobs(?:=\S*)?|-j\d*|--load-average(?:=\S*)?|-l[\d.]*)$")
+
+    @staticmethod
+    def total_memory() -> int:
+        """MemTotal from /proc/meminfo in bytes. 0 if it can't be read."""
+        try:
+            with open("/proc/meminfo") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemTotal:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    @staticmethod
+    def host_values() -> dict[str, Any]:
+        cpu_count = os.cpu_count() or 1
+        memory_jobs = ToolsetParallelism.total_memory() // ToolsetParallelism.MEMORY_PER_MAKE_JOB
+        make_jobs = max(1, min(cpu_count, memory_jobs) if memory_jobs else cpu_count)
+        # Parallel emerge jobs share make jobs, load average keeps them from overloading the host.
+        emerge_jobs = max(1, min(ToolsetParallelism.MAX_EMERGE_JOBS, make_jobs // 4))
+        return {"make_jobs": make_jobs, "emerge_jobs": emerge_jobs, "load_average": float(cpu_count)}
+
+    @staticmethod
+    def values(toolset: Toolset) -> dict[str, Any]:
+        """Host values with overrides from toolset metadata applied."""
+        values = ToolsetParallelism.host_values()
+        overrides = (toolset.metadata or {}).get(ToolsetParallelism.METADATA_KEY) or {}
+        for key, default in list(values.items()):
+            try:
+                value = type(default)(overrides[key])
+                if value > 0:
+                    values[key] = value
+            except (KeyError, TypeError, ValueError):
+                pass
+        return values
+
+    @staticmethod
+    def environment(toolset: Toolset, toolset_root: str) -> dict[str, str]:
+        """Environment variables for spawns of toolset. Keeps other EMERGE_DEFAULT_OPTS from toolset make.conf."""
+        values = ToolsetParallelism.values(toolset=toolset)
+        load_average = f"{values['load_average']:g}"
+        emerge_default_opts = [
+            option for option in ToolsetParallelism.make_conf_emerge_default_opts(toolset_root=toolset_root).split()
+            if not ToolsetParallelism.JOBS_OPTION_PATTERN.match(option)
+        ]
+        emerge_default_opts += [f"--jobs={values['emerge_jobs']}", f"--load-average={load_average}"]
+        return {
+            "MAKEOPTS": f"-j{values['make_jobs']} -l{load_average}",
+            "EMERGE_DEFAULT_OPTS": " ".join(emerge_default_opts)
+        }
+
+    @staticmethod
+    def make_conf_emerge_default_opts(toolset_root: str) -> str:
+        """EMERGE_DEFAULT_OPTS set in toolset make.conf, ignoring block written by CatalystLab."""
+        make_conf_path = os.path.join(toolset_root, "etc", "portage", "make.conf")
+        try:
+            paths = (
+                [os.path.join(make_conf_path, name) for name in sorted(os.listdir(make_conf_path))]
+                if os.path.isdir(make_conf_path) else [make_conf_path]
+            )
+        except OSError:
+            return ""
+        value = ""
+        for path in paths:
+            try:
+                with open(path) as make_conf:
+                    content = make_conf.read()
+            except OSError:
+                continue
+            content = re.sub(
+                rf"# BEGIN {ToolsetParallelism.MAKE_CONF_MARKER}.*?# END {ToolsetParallelism.MAKE_CONF_MARKER}\n?", "",
+                content, flags=re.DOTALL
+            )
+            for match in re.finditer(r'^\s*EMERGE_DEFAULT_OPTS\s*=\s*"([^"]*)"', content, flags=re.MULTILINE):
+                value = match.group(1).replace("${EMERGE_DEFAULT_OPTS}", value).replace("$EMERGE_DEFAULT_OPTS", value)
+        return value
+
+    @staticmethod
+    def write_make_conf(toolset: Toolset):
+        """Stores current values in writable toolset make.conf, so they are also used outside of CatalystLab."""
+        toolset_root = toolset.toolset_root()
+        _write_make_conf_parallelism(
+            toolset_root=toolset_root,
+            marker=ToolsetParallelism.MAKE_CONF_MARKER,
+            environment=ToolsetParallelism.environment(toolset=toolset, toolset_root=toolset_root)
+        )
+
+@root_function
+def _write_make_conf_parallelism(toolset_root: str, marker: str, environment: dict[str, str]):
+    """Replaces block marked with marker in make.conf with given variables."""
+    import os, re
+    make_conf_path = os.path.join(toolset_root, "etc", "portage", "make.conf")
+    if os.path.isdir(make_conf_path):
+        make_conf_path = os.path.join(make_conf_path, "zz-catalystlab-parallelism")
+    content = ""
+    if os.path.isfile(make_conf_path):
+        with open(make_conf_path) as make_conf:
+            content = make_conf.read()
+    content = re.sub(rf"# BEGIN {marker}.*?# END {marker}\n?", "", content, flags=re.DOTALL)
+    if content and not content.endswith("\n"):
+        content += "\n"
+    content += f"# BEGIN {marker}\n"
+    content += "".join(f'{name}="{value}"\n' for name, value in environment.items())
+    content += f"# END {marker}\n"
+    with open(make_conf_path, "w") as make_conf:
+        make_conf.write(content)
@@ -0,0 +1,511 @@
+from __future__ import annotations
+import os, uuid, threading
+from typing import final, Any
+from dataclasses import dataclass, replace
+from enum import Enum, auto
+from pathlib import Path
+from .root_function import root_function
+from .event_bus import EventBus, SharedEvent
+from .root_helper_server import ServerResponse
+from .hotfix_patching import HotFix, load_patch_contents
+from .helper_functions import delete_temp_workdir
+
+class ToolsetSpawnEvents(Enum):
+    SPAWNED_CHANGED = auto()
+    IN_USE_CHANGED = auto()
+
+@final
+class ToolsetSpawn:
+    """Single spawn instance of a Toolset."""
+    """Every spawn has its own work_dir, bindings and running calls, while all spawns"""
+    """of the same toolset share one mounted toolset image (Toolset.toolset_root)."""
+    """Create using Toolset.spawn() and remove using Toolset.unspawn(spawn=...)."""
+    def __init__(self, toolset: Toolset, store_changes: bool = False, hot_fixes: list[HotFix] | None = None, additional_bindings: list[BindMount] | None = None, portage_tmpfs: PortageTmpfsMode | None = None):
+        self.uuid = uuid.uuid4()
+        self.toolset = toolset
+        self.access_lock = threading.RLock()
+        self.spawned = False # Spawned means that directories in /tmp are prepared to be used with bwrap.
+        self.in_use: int = 0 # Number of bwrap instances currently running on this spawn.
+        self.held = False # Held by process using it between commands (reserved from ToolsetSpawnPool), can't be removed by others.
+        self.running_calls: list[ServerCall] = [] # Calls currently running in this spawn.
+        self.exclusive_call: ServerCall | None = None # Call that requested exclusive access to this spawn.
+        self.store_changes = store_changes
+        self.hot_fixes = hot_fixes
+        self.additional_bindings = additional_bindings
+        self.portage_tmpfs = portage_tmpfs # Mode of tmpfs for portage build directory. None uses mode from settings.
+        self.bind_options: list[str] | None = None # Binding options prepared in this spawn for bwrap command.
+        self.environment: dict[str, str] = {} # Environment variables set for commands, eq: MAKEOPTS.
+        self.current_bindings: list[BindMount] | None = None
+        self.work_dir: str | None = None
+        self._resolved_toolset_root: str | None = None
+        self._base_bindings: list[BindMount] = [] # Bindings prepared at spawn, excluding additional_bindings.
+        self._base_bind_options: list[str] = []
+        self._rebind_count = 0
+        self.event_bus = EventBus[ToolsetSpawnEvents]()
+
+    def __repr__(self):
+        return f"ToolsetSpawn(toolset={self.toolset.name!r}, store_changes={self.store_changes}, in_use={self.in_use})"
+
+    # --------------------------------------------------------------------------
+    # Spawning cycle (called by Toolset):
+
+    def _spawn(self, toolset_root: str):
+        """Prepare /tmp folders for bwrap calls."""
+        from .toolset_cache import ToolsetCache
+        from .portage_tmpfs import PortageTmpfs
+        from .toolset_parallelism import ToolsetParallelism
+        with self.access_lock:
+            if self.spawned:
+                raise RuntimeError(f"{self} already spawned.")
+            store_changes = self.store_changes
+
+            # Prepare /tmp directories and bind_options
+            resolved_toolset_root = str(Path(toolset_root).resolve())
+            if resolved_toolset_root == "/" and store_changes:
+                raise RuntimeError("Cannot use store_changes with host toolset")
+            if not os.path.isdir(resolved_toolset_root):
+                raise RuntimeError(f"Toolset root directory not found: {resolved_toolset_root}")
+
+            _system_bindings = [ # System.
+                BindMount(mount_path="/usr",   toolset_path="/usr",   store_changes=store_changes),
+                BindMount(mount_path="/bin",   toolset_path="/bin",   store_changes=store_changes),
+                BindMount(mount_path="/sbin",  toolset_path="/sbin",  store_changes=store_changes),
+                BindMount(mount_path="/lib",   toolset_path="/lib",   store_changes=store_changes),
+                BindMount(mount_path="/lib32", toolset_path="/lib32", store_changes=store_changes),
+                BindMount(mount_path="/lib64", toolset_path="/lib64", store_changes=store_changes),
+            ]
+            _devices_bindings = [ # Devices.
+                BindMount(mount_path="/dev/kvm", host_path="/dev/kvm", store_changes=True) # Store changes is added only to use --dev-bind flag
+            ]
+            _config_bindings = [ # Config.
+                BindMount(mount_path="/etc", toolset_path="/etc", store_changes=store_changes),
+                BindMount(mount_path="/etc/resolv.conf", host_path="/etc/resolv.conf"), # Take resolv.conf directly from main system
+            ]
+            _working_bindings = [ # Working.
+                BindMount(mount_path="/var", toolset_path="/var", store_changes=store_changes),
+                # Work/tmp/cache directories that should always be stored in temporary directory, not in the real toolset.
+                BindMount(mount_path="/tmp", create_if_missing=True),
+                BindMount(mount_path="/var/tmp", create_if_missing=True),
+                BindMount(mount_path="/var/cache", create_if_missing=True),
+                # Portage build directory, optionally in tmpfs, with disk directory for excepted packages.
+                *PortageTmpfs.bindings(mode=self.portage_tmpfs),
+                # Persistent distfiles, binpkgs, ccache and local binhost caches shared by all spawns (temporary if caches are disabled).
+                *ToolsetCache.shared().bindings(
+                    toolset_root=resolved_toolset_root,
+                    use_ccache=self.toolset.metadata.get('use_ccache', False),
+                    profile=ToolsetCache.profile(toolset_root=resolved_toolset_root)
+                ),
+                # Uncomment if portage tree should not be kept in squashfs
+                #BindMount(mount_path="/var/db/repos", create_if_missing=True),
+            ]
+            # Base bindings. Additional bindings are prepared separately, so they can be replaced using rebind().
+            bindings = self._resolved_bindings(_system_bindings + _config_bindings + _devices_bindings + _working_bindings, resolved_toolset_root)
+            additional_bindings = self._resolved_bindings(self.additional_bindings or [], resolved_toolset_root)
+
+            # Declarative spec, prepared by root in a single call.
+            spawn_spec = {
+                "prefix": f"toolsets/{self.toolset.sanitized_name_for_name(name=self.toolset.name)}/bwrap_",
+                "toolset_root": resolved_toolset_root,
+                "bindings": [binding.spec for binding in bindings],
+                "additional_bindings": [binding.spec for binding in additional_bindings],
+                "hot_fixes": [
+                    {
+                        "source_path": patch.source_path,
+                        "patch_contents": load_patch_contents(patch_spec=patch)
+                    }
+                    for patch in [fix.get_patch_spec for fix in (self.hot_fixes or [])]
+                ]
+            }
+            ToolsetCache.shared().acquire(spawn=self)
+            try:
+                spawn_plan = _prepare_toolset_spawn(spec=spawn_spec)
+            except Exception as e:
+                ToolsetCache.shared().release(spawn=self)
+                raise e
+
+            # Apply returned bind plan:
+            for hot_fix_binding in spawn_plan["hot_fix_bindings"]:
+                # Convert patch file to BindMount structure
+                bindings.append(BindMount(mount_path=hot_fix_binding["mount_path"], host_path=hot_fix_binding["host_path"], resolve_host_path=False))
+            self.work_dir = spawn_plan["work_dir"]
+            # Parallelism is calculated on every spawn, so it follows the host toolset is used on.
+            self.environment = ToolsetParallelism.environment(toolset=self.toolset, toolset_root=resolved_toolset_root)
+            self._resolved_toolset_root = resolved_toolset_root
+            self._base_bindings = self._bindings_from_plan(bindings, spawn_plan["base"])
+            self._base_bind_options = spawn_plan["base"]["bind_options"]
+            self.current_bindings = self._base_bindings + self._bindings_from_plan(additional_bindings, spawn_plan["additional"])
+            self.bind_options = self._base_bind_options + spawn_plan["additional"]["bind_options"]
+            self.spawned = True
+            self.event_bus.emit(ToolsetSpawnEvents.SPAWNED_CHANGED, self.spawned)
+            self.event_bus.emit(SharedEvent.STATE_UPDATED, self)
+
+    def rebind(self, additional_bindings: list[BindMount] | None = None):
+        """Replaces additional bindings of spawned instance without preparing it again."""
+        """Only new additional bindings are prepared in existing work_dir. Base bindings and hot fixes are kept."""
+        with self.access_lock:
+            if not self.spawned:
+                raise RuntimeError(f"{self} is not spawned.")
+            if self.in_use:
+                raise RuntimeError(f"{self} is currently in use.")
+            resolved_bindings = self._resolved_bindings(additional_bindings or [], self._resolved_toolset_root)
+            additional_bind_options = []
+            if resolved_bindings:
+                self._rebind_count += 1
+                plan = _prepare_toolset_bindings(
+                    work_dir=self.work_dir,
+                    toolset_root=self._resolved_toolset_root,
+                    bindings=[binding.spec for binding in resolved_bindings],
+                    mapping_prefix=f"r{self._rebind_count}_"
+                )
+                resolved_bindings = self._bindings_from_plan(resolved_bindings, plan)
+                additional_bind_options = plan["bind_options"]
+            self.additional_bindings = additional_bindings
+            self.current_bindings = self._base_bindings + resolved_bindings
+            self.bind_options = self._base_bind_options + additional_bind_options
+            self.event_bus.emit(SharedEvent.STATE_UPDATED, self)
+
+    def has_additional_bindings(self, bindings: list[BindMount] | None) -> bool:
+        """Checks if spawn was prepared with the same additional bindings."""
+        def key(binding: BindMount):
+            return (binding.mount_path, binding.host_path, binding.toolset_path, binding.store_changes)
+        return sorted(map(key, self.additional_bindings or [])) == sorted(map(key, bindings or []))
+
+    @staticmethod
+    def _resolved_bindings(bindings: list[BindMount], resolved_toolset_root: str) -> list[BindMount]:
+        """Returns copies of bindings with host_path mapped from toolset_path and expanded."""
+        resolved = []
+        for bind in bindings:
+            if bind.owner and bind.host_path and not bind.store_changes:
+                raise ValueError(f"Can set owner of read-only host binding: {bind.host_path}")
+            if bind.host_path and bind.toolset_path:
+                raise ValueError(f"BindMount for mount_path '{bind.mount_path}' has both host_path and toolset_path set. Only one is allowed.")
+            bind = replace(bind)
+            if bind.toolset_path:
+                bind.host_path = os.path.join(resolved_toolset_root, bind.toolset_path.lstrip("/"))
+            # Resolve host_path.
+            if bind.host_path:
+                bind.host_path = os.path.expanduser(bind.host_path)
+            resolved.append(bind)
+        return resolved
+
+    @staticmethod
+    def _bindings_from_plan(bindings: list[BindMount], plan: dict[str, Any]) -> list[BindMount]:
+        """Removes bindings skipped by root while preparing bind plan."""
+        skipped_indexes = plan["skipped_indexes"]
+        return [binding for index, binding in enumerate(bindings) if index not in skipped_indexes]
+
+    def _unspawn(self):
+        """Clear tmp folders."""
+        from .toolset_cache import ToolsetCache
+        with self.access_lock:
+            if not self.spawned:
+                raise RuntimeError(f"{self} is not spawned.")
+            if self.in_use:
+                raise RuntimeError(f"{self} is currently in use.")
+            try:
+                if self.work_dir:
+                    delete_temp_workdir(path=self.work_dir)
+                # Reset spawned settings:
+                self.work_dir = None
+                self.current_bindings = None
+                self.bind_options = None
+                self.environment = {}
+                self._resolved_toolset_root = None
+                self._base_bindings = []
+                self._base_bind_options = []
+                self.spawned = False
+                self.event_bus.emit(ToolsetSpawnEvents.SPAWNED_CHANGED, self.spawned)
+                self.event_bus.emit(SharedEvent.STATE_UPDATED, self)
+            except Exception as e:
+                print(f"Error deleting toolset spawn work_dir: {e}")
+                raise e
+            ToolsetCache.shared().release(spawn=self)
+        # Prune caches when they are no longer used by any spawn. Errors are reported by BackgroundExecutor.
+        ToolsetCache.shared().prune_in_background()
+
+    def unspawn(self, rebuild_squashfs_if_needed: bool = True, clean_squashfs_binding_dir: bool = True):
+        """Shortcut for Toolset.unspawn(spawn=self)."""
+        self.toolset.unspawn(spawn=self, rebuild_squashfs_if_needed=rebuild_squashfs_if_needed, clean_squashfs_binding_dir=clean_squashfs_binding_dir)
+
+    # --------------------------------------------------------------------------
+    # Calling commands:
+
+    def run_command(self, command: str, handler: callable | None = None, completion_handler: callable | None = None, exclusive: bool = False) -> ServerCall:
+        """Runs command in this spawn. Multiple commands can run at the same time, sharing the same bindings."""
+        """Use exclusive for commands that can't run next to others, like emerge modifying VDB."""
+        # TODO: Add required parameters checks, like store_changes matches spawned env, required bindings are set correctly etc.
+        with self.access_lock:
+            if not self.spawned:
+                raise RuntimeError(f"{self} is not spawned.")
+            if self.exclusive_call is not None:
+                raise RuntimeError(f"{self} is currently in exclusive use.")
+            if exclusive and self.in_use:
+                raise RuntimeError(f"{self} is currently in use.")
+            self._set_in_use(self.in_use + 1)
+
+            call: ServerCall | None = None
+            def on_complete(completion_handler: callable | None, result: ServerResponse):
+                with self.access_lock:
+                    if call in self.running_calls:
+                        self.running_calls.remove(call)
+                    if self.exclusive_call is call:
+                        self.exclusive_call = None
+                    self._set_in_use(self.in_use - 1)
+                if completion_handler:
+                    try:
+                        completion_handler(result)
+                    except Exception as e:
+                        print(f"Completion handler raised exception: {e}")
+            try:
+                fake_root = os.path.join(self.work_dir, "fake_root")
+                call = _start_toolset_command._async_raw(
+                    handler=handler,
+                    # Wraps completion block to update in_use counter additionally after it's done
+                    completion_handler=lambda x: on_complete(completion_handler, x),
+                    work_dir=self.work_dir,
+                    fake_root=fake_root,
+                    bind_options=self.bind_options,
+                    command_to_run=command,
+                    environment=self.environment
+                )
+                # Completion handler waits for access_lock, so call is registered before it can be removed.
+                self.running_calls.append(call)
+                if exclusive:
+                    self.exclusive_call = call
+                return call
+            except Exception as e:
+                print(f"Failed to execute command: {e}")
+                self._set_in_use(self.in_use - 1)
+                raise e
+
+    def _set_in_use(self, value: int):
+        self.in_use = value
+        self.event_bus.emit(ToolsetSpawnEvents.IN_USE_CHANGED, self.in_use)
+        self.event_bus.emit(SharedEvent.STATE_UPDATED, self)
+        self.toolset._spawn_in_use_changed(spawn=self)
+
+@dataclass
+class BindMount:
+    mount_path: str                 # Mount location inside the isolated environment.
+    host_path: str | None = None    # None if mount point is an empty dir from overlay.
+    toolset_path: str | None = None # Host path relative to toolset root.
+    store_changes: bool = False     # True if changes should be stored outside isolated env.
+    resolve_host_path: bool = True  # Whether to resolve path through runtime_env.
+    create_if_missing: bool = False # Creates directory if not found on host.
+    owner: str | None = None        # Sets owner of given file/dir. Works with toolset_path, tmp or writable host bindings
+    tmpfs_size: int | None = None   # Mounts size limited tmpfs instead of empty dir. Works only without host_path.
+
+    @property
+    def spec(self) -> dict[str, Any]:
+        """Declarative form passed to root functions preparing bindings."""
+        return {
+            "mount_path": self.mount_path,
+            "host_path": self.host_path,
+            "store_changes": self.store_changes,
+            "create_if_missing": self.create_if_missing,
+            "owner": self.owner,
+            "tmpfs_size": self.tmpfs_size
+        }
+
+@root_function
+def _start_toolset_command(work_dir: str, fake_root: str, bind_options: list[str], command_to_run: str, environment: dict[str, str] | None = None):
+    import subprocess, shlex
+    #subprocess.run(["chown", "-R", "root:root", work_dir], check=True) # This could change the ownership of work_dir for root, but probably is not needed.
+    run_dir = RootHelperServer.get_runtime_dir(uid=RootHelperServer.shared().uid, runtime_env_name="CL_SERVER_RUNTIME_DIR")
+    bwrap_path = os.path.join(run_dir, "bwrap")
+    cmd_bwrap = (
+        f"{bwrap_path} "
+        "--die-with-parent "
+        "--unshare-uts --unshare-ipc --unshare-pid --unshare-cgroup "
+        "--hostname catalyst-lab "
+        "--bind " + fake_root + " / "
+        "--dev /dev "
+        "--proc /proc "
+        "--setenv HOME / "
+        "--setenv LANG C.UTF-8 "
+        "--setenv LC_ALL C.UTF-8 "
+    ) + "".join(f"--setenv {name} {shlex.quote(value)} " for name, value in (environment or {}).items())
+    arguments_string = " ".join(bind_options) + " bash -c '" + command_to_run + "'"
+    exec_call = cmd_bwrap + arguments_string
+    print(exec_call)
+    try:
+        result = subprocess.run(exec_call, shell=True).returncode
+        if result != 0:
+            raise RuntimeError(f"Toolset call returned exit code: {result}")
+    except Exception as e:
+        # Note: We don't handle exceptions here, because if the root function throws,
+        # the exception will be just returned as a result of this call, which is what we want.
+        raise e
+
+@root_function
+def _prepare_toolset_spawn(spec: dict[str, Any]) -> dict[str, Any]:
+    """Prepares whole spawn work_dir in a single root call, using declarative spec created by ToolsetSpawn."""
+    """Creates fake_root, overlay and hotfix directories with correct ownership, applies hot fixes,"""
+    """prepares bindings and validates sandbox with a single bwrap run. Returns bind plan."""
+    import os, shutil, subprocess, tempfile
+    uid = RootHelperServer.shared().uid
+    toolset_root = spec["toolset_root"]
+    work_dir = create_temp_workdir(prefix=spec["prefix"])
+    try:
+        # Prepare work dirs:
+        fake_root = os.path.join(work_dir, "fake_root")
+        overlay_root = os.path.join(work_dir, "overlay")
+        hotfixes_workdir = os.path.join(work_dir, "hotfixes") # Stores patched files if needed
+        for path in [fake_root, overlay_root, os.path.join(overlay_root, "upper"), os.path.join(overlay_root, "work"), hotfixes_workdir]:
+            os.makedirs(path, exist_ok=False)
+            os.chown(path, uid, uid)
+
+        # Apply hot fixes to copies of toolset files:
+        hot_fix_bindings = []
+        for hot_fix in spec["hot_fixes"]:
+            original_path = os.path.join(toolset_root, hot_fix["source_path"].lstrip("/"))
+            if not os.path.isfile(original_path):
+                print(f"Original file not found: {original_path}. Patching skipped")
+                continue
+            target_path = os.path.join(hotfixes_workdir, os.path.relpath(hot_fix["source_path"], "/"))
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            shutil.copy2(original_path, target_path)
+            with tempfile.NamedTemporaryFile(mode="w", suffix=".patch", delete=False) as temp_patch_file:
+                temp_patch_file.write(hot_fix["patch_contents"])
+                temp_patch_path = temp_patch_file.name
+            try:
+                result = subprocess.run(["patch", target_path, temp_patch_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            finally:
+                os.remove(temp_patch_path)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to apply patch:\nstdout:\n{result.stdout}\nstderr:\n{result.stderr}")
+            hot_fix_bindings.append({"mount_path": hot_fix["source_path"], "host_path": target_path})
+
+        base_plan = _prepare_toolset_bindings(
+            work_dir=work_dir,
+            toolset_root=toolset_root,
+            bindings=spec["bindings"] + [
+                {"mount_path": binding["mount_path"], "host_path": binding["host_path"], "store_changes": False, "create_if_missing": False, "owner": None}
+                for binding in hot_fix_bindings
+            ]
+        )
+        additional_plan = _prepare_toolset_bindings(
+            work_dir=work_dir,
+            toolset_root=toolset_root,
+            bindings=spec["additional_bindings"],
+            mapping_prefix="a_"
+        )
+
+        # Validate sandbox with single run.
+        _start_toolset_command(work_dir=work_dir, fake_root=fake_root, bind_options=base_plan["bind_options"] + additional_plan["bind_options"], command_to_run="true")
+
+        return {
+            "work_dir": work_dir,
+            "base": base_plan,
+            "additional": additional_plan,
+            "hot_fix_bindings": hot_fix_bindings
+        }
+    except Exception as e:
+        delete_temp_workdir(path=work_dir)
+        raise e
+
+@root_function
+def _prepare_toolset_bindings(work_dir: str, toolset_root: str, bindings: list[dict[str, Any]], mapping_prefix: str = "") -> dict[str, Any]:
+    """Prepares directories for given binding specs inside existing spawn work_dir and returns their bind options."""
+    """Used by _prepare_toolset_spawn and directly by ToolsetSpawn.rebind. mapping_prefix keeps overlay entries unique."""
+    """Owner is set on the mount root only, so persistent host directories are not walked on every spawn."""
+    import os, stat
+    uid = RootHelperServer.shared().uid
+    fake_root = os.path.join(work_dir, "fake_root")
+    overlay_root = os.path.join(work_dir, "overlay")
+
+    def resolve_owner(owner: str) -> tuple[int, int]:
+        # Owners are resolved using toolset user database, not the one from host.
+        def lookup(database: str, name: str) -> int:
+            if name.isdigit():
+                return int(name)
+            with open(os.path.join(toolset_root, "etc", database)) as file:
+                for line in file:
+                    fields = line.strip().split(":")
+                    if len(fields) > 2 and fields[0] == name:
+                        return int(fields[2])
+            raise KeyError(f"{name} not found in toolset /etc/{database}")
+        user, _, group = owner.partition(":")
+        return lookup("passwd", user), lookup("group", group or user)
+
+    # Name overlay entries using indexes to avoid overlaps.
+    mapping_index = 0
+    def create_overlay_dir(field: str, mount_path: str) -> str:
+        path = f"{overlay_root}/{field}/{mapping_prefix}{mapping_index}{mount_path.replace('/', '_')}".replace("//", "/")
+        os.makedirs(path, exist_ok=False)
+        os.chown(path, uid, uid)
+        return path
+
+    bind_options = []
+    skipped_indexes = []
+    owner_changes = [] # (path, owner)
+    for index, binding in enumerate(bindings):
+        host_path = binding["host_path"]
+        mount_path = binding["mount_path"]
+        owner = resolve_owner(binding["owner"]) if binding["owner"] else None
+        # Handle not existing host paths.
+        if host_path is not None and not os.path.lexists(host_path):
+            # Create in host if store_changes is set.
+            if binding["create_if_missing"] and binding["store_changes"]:
+                print(f"Path {host_path} not found. Creating directory in host.")
+                os.makedirs(host_path)
+            # Skip not existing bindings with host_path set:
+            else:
+                print(f"Path {host_path} not found. Skipping binding.")
+                skipped_indexes.append(index)
+                continue
+        # Memory backed dirs:
+        if host_path is None and binding.get("tmpfs_size"):
+            bind_options.extend(["--size", str(binding["tmpfs_size"]), "--tmpfs", mount_path])
+            continue
+        # Empty writable dirs:
+        if host_path is None:
+            tmp_path = create_overlay_dir("upper", mount_path)
+            mapping_index += 1
+            if owner:
+                owner_changes.append((tmp_path, owner))
+            bind_options.extend(["--bind", tmp_path, mount_path])
+            continue
+        # Symlinks (keep as symlinks in isolated env):
+        if os.path.islink(host_path):
+            fake_symlink_path = os.path.join(fake_root, mount_path.lstrip("/"))
+            os.makedirs(os.path.dirname(fake_symlink_path), exist_ok=True)
+            if os.path.lexists(fake_symlink_path): # Left by previous rebind.
+                os.remove(fake_symlink_path)
+            os.symlink(os.readlink(host_path), fake_symlink_path)
+            continue
+        mode = os.stat(host_path).st_mode
+        # Char devices:
+        if stat.S_ISCHR(mode):
+            bind_options.extend(["--dev-bind" if binding["store_changes"] else "--ro-bind", host_path, mount_path])
+            continue
+        # Standard files:
+        if stat.S_ISREG(mode):
+            bind_options.extend(["--bind" if binding["store_changes"] else "--ro-bind", host_path, mount_path])
+            continue
+        # Directories:
+        if stat.S_ISDIR(mode):
+            if binding["store_changes"]:
+                if owner:
+                    owner_changes.append((host_path, owner))
+                bind_options.extend(["--bind", host_path, mount_path])
+            else:
+                upper = create_overlay_dir("upper", mount_path)
+                work = create_overlay_dir("work", mount_path)
+                mapping_index += 1
+                if owner:
+                    owner_changes.append((upper, owner))
+                bind_options.extend([
+                    "--overlay-src", host_path,
+                    "--overlay", upper, work, mount_path
+                ])
+            continue
+
+    # Set bindings owners directly, without launching sandbox for it.
+    for path, owner in owner_changes:
+        os.chown(path, *owner, follow_symlinks=False)
+
+    return {
+        "bind_options": bind_options,
+        "skipped_indexes": skipped_indexes
+    }
@@ -0,0 +1,127 @@
+from __future__ import annotations
+import os, threading
+from typing import final
+from collections import OrderedDict
+from .repository import Repository
+from .toolset import Toolset
+from .toolset_spawn import ToolsetSpawn, BindMount
+from .background_executor import BackgroundExecutor
+from .helper_functions import directory_disk_usage
+
+@final
+class ToolsetSpawnPool:
+    """Optional warm pool of read-only toolset spawns."""
+    """Keeps most recently used toolsets mounted and spawned after processes are done with them,"""
+    """so the next process can start calling commands without preparing the toolset again."""
+    """Bounded by count and disk usage of mounted images, least recently used entries are evicted first."""
+    _instance = None
+
+    @classmethod
+    def shared(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.access_lock = threading.RLock()
+        self.idle_spawns: OrderedDict[ToolsetSpawn, int] = OrderedDict() # Idle spawn -> disk usage, ordered from least recently used.
+        self._measured_toolsets: set[Toolset] = set() # Toolsets which images are being measured in background.
+
+    @property
+    def enabled(self) -> bool:
+        return Repository.Settings.value.toolset_spawn_pool_enabled
+
+    # --------------------------------------------------------------------------
+    # Reserving:
+
+    def reserve(self, toolset: Toolset, additional_bindings: list[BindMount] | None = None) -> ToolsetSpawn:
+        """Hands out read-only spawn of toolset with given additional bindings."""
+        """Reuses idle spawn if available, rebinding only additional bindings. Otherwise spawns a new one."""
+        with self.access_lock:
+            spawn = next((spawn for spawn in self.idle_spawns if spawn.toolset is toolset), None)
+            if spawn is not None:
+                self.idle_spawns.pop(spawn)
+                if spawn.spawned and spawn in toolset.spawns:
+                    if not spawn.has_additional_bindings(additional_bindings):
+                        spawn.rebind(additional_bindings=additional_bindings)
+                    spawn.held = True
+                    return spawn
+            spawn = toolset.spawn(additional_bindings=additional_bindings)
+            spawn.held = True
+            return spawn
+
+    def release(self, spawn: ToolsetSpawn):
+        """Returns spawn to the pool, or unspawns it if pool is disabled or already holds this toolset."""
+        with self.access_lock:
+            spawn.held = False
+            toolset = spawn.toolset
+            if spawn not in toolset.spawns:
+                return
+            if (
+                not self.enabled
+                or spawn.store_changes
+                or any(idle.toolset is toolset for idle in self.idle_spawns)
+            ):
+                toolset.unspawn(spawn=spawn)
+                return
+            if toolset.image_disk_usage is not None:
+                self.idle_spawns[spawn] = toolset.image_disk_usage
+            else:
+                # Estimated from compressed image until unpacked image is measured in background.
+                self.idle_spawns[spawn] = self._image_file_size(toolset)
+                if toolset not in self._measured_toolsets:
+                    self._measured_toolsets.add(toolset)
+                    BackgroundExecutor.shared().submit(self._measure, toolset, toolset.squashfs_binding_dir)
+            self._evict()
+
+    def _measure(self, toolset: Toolset, squashfs_binding_dir: str | None):
+        """Measures unpacked image once per mount. Result is kept in toolset until image is unmounted."""
+        disk_usage = directory_disk_usage(squashfs_binding_dir) if squashfs_binding_dir else 0
+        with self.access_lock:
+            self._measured_toolsets.discard(toolset)
+            if toolset.squashfs_binding_dir != squashfs_binding_dir:
+                return # Unmounted while measuring.
+            toolset.image_disk_usage = disk_usage
+            for spawn in self.idle_spawns:
+                if spawn.toolset is toolset:
+                    self.idle_spawns[spawn] = disk_usage
+            self._evict()
+
+    @staticmethod
+    def _image_file_size(toolset: Toolset) -> int:
+        try:
+            return os.path.getsize(toolset.file_path())
+        except (OSError, TypeError):
+            return 0
+
+    # --------------------------------------------------------------------------
+    # Evicting:
+
+    def evict(self, toolset: Toolset):
+        """Removes idle spawns of given toolset, for example before spawning it with store_changes."""
+        with self.access_lock:
+            for spawn in [spawn for spawn in self.idle_spawns if spawn.toolset is toolset]:
+                self._remove(spawn)
+
+    def clear(self):
+        """Removes all idle spawns."""
+        with self.access_lock:
+            for spawn in list(self.idle_spawns):
+                self._remove(spawn)
+
+    def _evict(self):
+        settings = Repository.Settings.value
+        while self.idle_spawns and (
+            len(self.idle_spawns) > settings.toolset_spawn_pool_max_count
+            or sum(self.idle_spawns.values()) > settings.toolset_spawn_pool_max_disk_usage
+        ):
+            self._remove(next(iter(self.idle_spawns)))
+
+    def _remove(self, spawn: ToolsetSpawn):
+        self.idle_spawns.pop(spawn, None)
+        toolset = spawn.toolset
+        if spawn in toolset.spawns:
+            try:
+                toolset.unspawn(spawn=spawn)
+            except Exception as e:
+                print(f"Failed to unspawn pooled toolset {toolset.name}: {e}")
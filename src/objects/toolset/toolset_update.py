@@ -5,13 +5,25 @@ from .multistage_process import (
     MultiStageProcessStageState
 )
 from .toolset import Toolset
+from .toolset_spawn import ToolsetSpawn
+from .toolset_spawn_pool import ToolsetSpawnPool
 from .toolset_application import ToolsetApplication
 from .root_function import root_function
 from .repository import Repository
 from .root_helper_server import ServerResponse, ServerResponseStatusCode
-from .helper_functions import  create_squashfs
+from .helper_functions import  create_squashfs, file_fingerprint
+from .squashfs_index import SquashfsIndex
 from gi.repository import Gio
-from .toolset_installation import insert_portage_config, insert_portage_patch
+from .toolset_installation import (
+    insert_portage_config, insert_portage_patch,
+    read_ccache_stats, store_ccache_stats,
+    CCACHE_PACKAGE, CCACHE_CONFIG_NAME, CCACHE_PORTAGE_CONFIG,
+    is_binhost_bound, binhost_emerge_command,
+    BINHOST_CONFIG_NAME, BINHOST_INDEX_COMMAND
+)
+from .toolset_cache import ToolsetCache
+from .portage_tmpfs import PortageTmpfs
+from .toolset_parallelism import ToolsetParallelism
 
 # ------------------------------------------------------------------------------
 # Toolset update.
@@ -21,6 +33,7 @@ class ToolsetUpdate(MultiStageProcess):
     """Handles the toolset update lifecycle. Also supports changing app selection, versions and patches."""
     def __init__(self, toolset: Toolset, allow_binpkgs: bool, update_packages: bool = True, apps_selection: list[ToolsetApplicationSelection] | None = None):
         self.toolset = toolset
+        self.toolset_spawn: ToolsetSpawn | None = None # Writable spawn used by update steps.
         self.allow_binpkgs = allow_binpkgs
         self.update_packages = update_packages
         self.apps_selection = apps_selection
@@ -37,6 +50,8 @@ class ToolsetUpdate(MultiStageProcess):
         self.stages.append(ToolsetUpdateStepRefreshEnv(toolset=self.toolset, multistage_process=self))
         if self.update_packages:
             self.stages.append(ToolsetUpdateStepUpdatePortage(toolset=self.toolset, multistage_process=self))
+        self.stages.append(ToolsetUpdateStepSetupBinhost(toolset=self.toolset, multistage_process=self))
+        self.stages.append(ToolsetUpdateStepSetupCcache(toolset=self.toolset, multistage_process=self))
         if self.apps_to_remove:
             for app_to_remove in self.apps_to_remove:
                 self.stages.append(ToolsetUpdateStepUninstallApp(toolset=self.toolset, app=app_to_remove, multistage_process=self))
@@ -123,8 +138,12 @@ class ToolsetUpdateStep(MultiStageProcessStage):
             if self.server_call.thread:
                 self.server_call.thread.join()
             self.server_call = None
-    def run_command_in_toolset(self, command: str, progress_handler: Callable[[str], float | None] | None = None) -> bool:
+    def run_command_in_toolset(self, command: str, progress_handler: Callable[[str], float | None] | None = None, exclusive: bool = False, collect_ccache_stats: bool = False) -> bool:
+        """Use collect_ccache_stats for commands compiling packages, to store ccache statistics of this step in toolset metadata."""
         try:
+            toolset_spawn = self.multistage_process.toolset_spawn
+            metadata = self.multistage_process.toolset.metadata
+            ccache_stats = read_ccache_stats(toolset_spawn=toolset_spawn) if collect_ccache_stats and metadata.get('use_ccache') else None
             return_value = False
             done_event = threading.Event()
             def completion_handler(response: ServerResponse):
@@ -136,14 +155,17 @@ class ToolsetUpdateStep(MultiStageProcessStage):
                 progress = progress_handler(output_line)
                 if progress is not None:
                     self._update_progress(progress)
-            self.server_call = self.toolset.run_command(
+            self.server_call = toolset_spawn.run_command(
                 command=command,
                 handler=output_handler if progress_handler is not None else None,
-                completion_handler=completion_handler
+                completion_handler=completion_handler,
+                exclusive=exclusive
             )
             self.server_call.thread.join()
             done_event.wait()
             self.server_call = None
+            if ccache_stats:
+                store_ccache_stats(metadata=metadata, step_name=self.name, stats_before=ccache_stats, stats_after=read_ccache_stats(toolset_spawn=toolset_spawn))
             return return_value
         except Exception as e:
             print(f"Error running toolset command: {e}")
@@ -161,18 +183,16 @@ class ToolsetUpdateStepPrepareToolset(ToolsetUpdateStep):
         try:
             if self.toolset.in_use:
                 raise RuntimeError("Toolset is currently in use")
-            def toolset_has_required_binding() -> bool:
-                if not self.toolset.spawned:
-                    return False
-                if self.toolset.additional_bindings:
-                    # There should be no additional bindings set
-                    return False
-                return True
-            if self.toolset.spawned and (not toolset_has_required_binding() or not self.toolset.store_changes):
-                # Toolset needs to be respawned to get correct bindings and write access
-                self.toolset.unspawn()
-            if not self.toolset.spawned:
-                self.toolset.spawn(store_changes=True)
+            spawn_pool = ToolsetSpawnPool.shared()
+            with spawn_pool.access_lock: # Prevents reserving spawns from pool until old spawns are removed.
+                spawn_pool.evict(toolset=self.toolset)
+                if any(spawn.held or spawn.in_use for spawn in self.toolset.spawns):
+                    raise RuntimeError("Toolset is used by another process")
+                if self.toolset.spawned:
+                    # Toolset needs to be respawned to get write access. Removes remaining spawns, which are not
+                    # held by anyone, like read-only spawn opened in toolset details.
+                    self.toolset.unspawn()
+            self.multistage_process.toolset_spawn = self.toolset.spawn(store_changes=True)
             self.complete(MultiStageProcessStageState.COMPLETED)
         except Exception as e:
             print(f"Error during toolset preparation: {e}")
@@ -180,16 +200,19 @@ class ToolsetUpdateStepPrepareToolset(ToolsetUpdateStep):
     def cleanup(self) -> bool:
         if not super().cleanup():
             return False
-        self.toolset.unspawn(rebuild_squashfs_if_needed=False) # New squashFS is build as another step in update process.
+        if self.multistage_process.toolset_spawn:
+            self.toolset.unspawn(spawn=self.multistage_process.toolset_spawn, rebuild_squashfs_if_needed=False) # New squashFS is build as another step in update process.
+            self.multistage_process.toolset_spawn = None
         return True
 
 class ToolsetUpdateStepRefreshEnv(ToolsetUpdateStep):
     def __init__(self, toolset: Toolset, multistage_process: MultiStageProcess):
-        super().__init__(name="Refresh environment", description="Refreshes binpkg signing keys", multistage_process=multistage_process)
+        super().__init__(name="Refresh environment", description="Refreshes build settings and binpkg signing keys", multistage_process=multistage_process)
         self.toolset = toolset
     def start(self):
         super().start()
         try:
+            ToolsetParallelism.write_make_conf(toolset=self.toolset)
             # Prepare environment
             commands = [
                 "env-update && source /etc/profile",
@@ -226,12 +249,59 @@ class ToolsetUpdateStepUpdatePortage(ToolsetUpdateStep):
                 match = re.match(pattern, output_line)
                 if match:
                     return int(match.group(1)) / 100.0
-            result = self.run_command_in_toolset(command="emerge-webrsync", progress_handler=progress_handler)
+            result = self.run_command_in_toolset(command="emerge-webrsync", progress_handler=progress_handler, exclusive=True)
             self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
         except Exception as e:
             print(f"Error synchronizing Portage: {e}")
             self.complete(MultiStageProcessStageState.FAILED)
 
+class ToolsetUpdateStepSetupBinhost(ToolsetUpdateStep):
+    def __init__(self, toolset: Toolset, multistage_process: MultiStageProcess):
+        super().__init__(name="Setup binary packages", description="Enables or disables local binary package host", multistage_process=multistage_process)
+        self.toolset = toolset
+    def start(self):
+        super().start()
+        try:
+            binhost_enabled = ToolsetCache.shared().binhost_enabled
+            configured = os.path.isfile(os.path.join(self.toolset.toolset_root(), "etc", "portage", "binrepos.conf", f"{BINHOST_CONFIG_NAME}.conf"))
+            if configured:
+                # Binhost is used as PKGDIR, binrepos.conf entry from earlier versions made --getbinpkg fetch from it into itself.
+                remove_portage_config(config_dir="binrepos.conf", app_name=f"{BINHOST_CONFIG_NAME}.conf", toolset_root=self.toolset.toolset_root())
+            result = True
+            if binhost_enabled and is_binhost_bound(toolset_spawn=self.multistage_process.toolset_spawn):
+                result = self.run_command_in_toolset(command=BINHOST_INDEX_COMMAND, exclusive=True)
+            self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
+        except Exception as e:
+            print(f"Error during binary packages setup: {e}")
+            self.complete(MultiStageProcessStageState.FAILED)
+
+class ToolsetUpdateStepSetupCcache(ToolsetUpdateStep):
+    def __init__(self, toolset: Toolset, multistage_process: MultiStageProcess):
+        super().__init__(name="Setup ccache", description="Enables or disables compiler cache", multistage_process=multistage_process)
+        self.toolset = toolset
+    def start(self):
+        super().start()
+        try:
+            use_ccache = self.toolset.metadata.get('use_ccache', False)
+            configured = os.path.isfile(os.path.join(self.toolset.toolset_root(), "etc", "portage", "package.env", CCACHE_CONFIG_NAME))
+            if use_ccache and not configured:
+                flags = "--getbinpkg --noreplace" if self.multistage_process.allow_binpkgs else "--noreplace"
+                command = binhost_emerge_command(toolset_spawn=self.multistage_process.toolset_spawn, command=f"emerge {flags} {CCACHE_PACKAGE}")
+                if not self.run_command_in_toolset(command=command, exclusive=True):
+                    self.complete(MultiStageProcessStageState.FAILED)
+                    return
+                for config in CCACHE_PORTAGE_CONFIG:
+                    insert_portage_config(config_dir=config.directory, config_entries=config.entries, app_name=CCACHE_CONFIG_NAME, toolset_root=self.toolset.toolset_root())
+            elif not use_ccache and configured:
+                # Package itself is kept installed, only portage config is removed.
+                for config in CCACHE_PORTAGE_CONFIG:
+                    remove_portage_config(config_dir=config.directory, app_name=CCACHE_CONFIG_NAME, toolset_root=self.toolset.toolset_root())
+                self.toolset.metadata.pop('ccache_stats', None)
+            self.complete(MultiStageProcessStageState.COMPLETED)
+        except Exception as e:
+            print(f"Error during ccache setup: {e}")
+            self.complete(MultiStageProcessStageState.FAILED)
+
 class ToolsetUpdateStepUninstallApp(ToolsetUpdateStep):
     def __init__(self, toolset: Toolset, app: ToolsetApplication, multistage_process: MultiStageProcess):
         super().__init__(name=f"Uninstall {app.name}", description=f"Removes {app.package} package", multistage_process=multistage_process)
@@ -254,7 +324,7 @@ class ToolsetUpdateStepUninstallApp(ToolsetUpdateStep):
             for patch_file in app_install.patches:
                 remove_portage_patch(patch_filename=patch_file, app_package=self.app.package, toolset_root=self.toolset.toolset_root())
             flags = "-C"
-            result = self.run_command_in_toolset(command=f"emerge {flags} {self.app.package}", progress_handler=progress_handler)
+            result = self.run_command_in_toolset(command=f"emerge {flags} {self.app.package}", progress_handler=progress_handler, exclusive=True)
             self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
         except Exception as e:
             print(f"Error during app uninstallation: {e}")
@@ -300,7 +370,20 @@ class ToolsetUpdateStepInstallApp(ToolsetUpdateStep):
                 patch_content = file_input_stream.read_bytes(file_size, None).get_data().decode()
                 insert_portage_patch(patch_content=patch_content, patch_filename=patch_file.get_basename(), app_package=self.app_selection.app.package, toolset_root=self.multistage_process.toolset.toolset_root())
             flags = "--getbinpkg --deep --update --changed-use --newuse" if self.multistage_process.allow_binpkgs else "--deep --update --changed-use --newuse"
-            result = self.run_command_in_toolset(command=f"emerge {flags} {self.app_selection.app.package} --reinstall-atoms={self.app_selection.app.package}", progress_handler=progress_handler)
+            # App is always rebuilt from source, as its patches could change.
+            command = binhost_emerge_command(
+                toolset_spawn=self.multistage_process.toolset_spawn,
+                command=f"emerge {flags} {self.app_selection.app.package} --reinstall-atoms={self.app_selection.app.package}",
+                excluded_packages=[self.app_selection.app.package]
+            )
+            result = PortageTmpfs.run_emerge(
+                toolset_spawn=self.multistage_process.toolset_spawn,
+                run_command=self.run_command_in_toolset,
+                command=command,
+                progress_handler=progress_handler,
+                exclusive=True,
+                collect_ccache_stats=True
+            )
             self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
         except Exception as e:
             print(f"Error during app installation: {e}")
@@ -321,7 +404,19 @@ class ToolsetUpdateStepUpdatePackages(ToolsetUpdateStep):
                     return n / m
             allow_binpkgs = self.toolset.metadata.get('allow_binpkgs', False)
             flags = "--getbinpkg --changed-use --update --deep --with-bdeps=y" if allow_binpkgs else "--changed-use --update --deep --with-bdeps=y"
-            result = self.run_command_in_toolset(command=f"emerge {flags} @system @world @live-rebuild", progress_handler=progress_handler)
+            command = binhost_emerge_command(
+                toolset_spawn=self.multistage_process.toolset_spawn,
+                command=f"emerge {flags} @system @world @live-rebuild",
+                excluded_packages=[app.package for app in ToolsetApplication.ALL if self.toolset.metadata.get(app.package, {}).get('patches')]
+            )
+            result = PortageTmpfs.run_emerge(
+                toolset_spawn=self.multistage_process.toolset_spawn,
+                run_command=self.run_command_in_toolset,
+                command=command,
+                progress_handler=progress_handler,
+                exclusive=True,
+                collect_ccache_stats=True
+            )
             self.complete(MultiStageProcessStageState.COMPLETED if result else MultiStageProcessStageState.FAILED)
         except Exception as e:
             print(f"Error updating packages: {e}")
@@ -360,6 +455,8 @@ class ToolsetUpdateStepStepCompress(ToolsetUpdateStep):
             self.squashfs_process.wait()
             self.squashfs_process = None
             shutil.move(toolset_tmp_squashfs_path, self.toolset.file_path())
+            SquashfsIndex.write(image_path=self.toolset.file_path())
+            self.toolset.fingerprint = file_fingerprint(self.toolset.file_path())
             self.complete(MultiStageProcessStageState.COMPLETED)
         except Exception as e:
             print(f"Error during toolset compression: {e}")
@@ -18,12 +18,12 @@ class RootCommandOutputView(Gtk.Box):
         self.text_mark_end = self.text_buffer.create_mark("", end_iter, False)
         call.event_bus.subscribe(
             ServerCallEvents.NEW_OUTPUT_LINE,
-            self.append_line
+            self.append_lines
         )
 
-    def append_line(self, line: str):
+    def append_lines(self, lines: list[str]):
         # Get the current end iterator to ensure we insert at the very end
         end_iter = self.text_buffer.get_end_iter()
-        self.text_buffer.insert(end_iter, "\n" + line)
+        self.text_buffer.insert(end_iter, "".join("\n" + line for line in lines))
         self.text_view.scroll_to_mark(self.text_mark_end, 0, True, 0, 0)
 
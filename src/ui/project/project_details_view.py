@@ -3,7 +3,9 @@ from .git_directory import GitDirectoryEvent
 from .project_manager import ProjectManager
 from .project_directory import ProjectDirectory, ProjectConfiguration
 from .toolset_application import ToolsetApplication
-from .toolset import ToolsetEvents
+from .toolset import ToolsetEvents, ToolsetEnv
+from .catalyst_stage_schema import CatalystStageSchemaCache
+from .releng_template_index import RelengTemplateIndex
 from .repository import Repository
 from .item_select_view import ItemSelectionViewEvent
 from .project_stage_create_view import ProjectStageCreateView
@@ -38,11 +40,25 @@ class ProjectDetailsView(Gtk.Box):
 
     def get_configuration(self):
         self.toolset_selection_view.select(self.project_directory.get_toolset())
+        self.prefetch_catalyst_schema()
         self.releng_selection_view.select(self.project_directory.get_releng_directory())
+        self.prefetch_releng_templates()
         self.snapshot_selection_view.select(self.project_directory.get_snapshot())
         self.arch_selection_view.select(self.project_directory.get_architecture())
         self.arch_selection_view.set_static_list(sorted(Architecture, key=lambda arch: arch.name))
 
+    def prefetch_catalyst_schema(self):
+        """Parses catalyst arguments of selected toolset in background, so opening stages doesn't need to wait for it."""
+        toolset = self.project_directory.get_toolset()
+        if toolset and toolset.env == ToolsetEnv.EXTERNAL and toolset.get_app_install(ToolsetApplication.CATALYST):
+            CatalystStageSchemaCache.shared().prefetch(toolset=toolset)
+
+    def prefetch_releng_templates(self):
+        """Indexes spec files of selected releng directory in background."""
+        releng_directory = self.project_directory.get_releng_directory()
+        if releng_directory:
+            RelengTemplateIndex.prefetch(releng_directory=releng_directory)
+
     def configuration_item_changed(self, container):
         match container:
             case self.toolset_selection_view:
@@ -50,11 +66,13 @@ class ProjectDetailsView(Gtk.Box):
                     self.toolset_selection_view.selected_item.uuid
                     if self.toolset_selection_view.selected_item else None
                 )
+                self.prefetch_catalyst_schema()
             case self.releng_selection_view:
                 self.project_directory.initialize_metadata().releng_directory_id = (
                     self.releng_selection_view.selected_item.id
                     if self.releng_selection_view.selected_item else None
                 )
+                self.prefetch_releng_templates()
             case self.snapshot_selection_view:
                 self.project_directory.initialize_metadata().snapshot_id = (
                     self.snapshot_selection_view.selected_item.filename
@@ -44,7 +44,7 @@ class ProjectStageDetailsView(Gtk.Box):
     def on_realize(self, widget):
         self.get_root().set_focus(None)
         self.load_stage_details()
-        self.load_configuration_rows()
+        threading.Thread(target=self.load_configuration_rows, daemon=True).start()
         self.monitor_information_changes()
 
     # Loading stage data
@@ -54,16 +54,25 @@ class ProjectStageDetailsView(Gtk.Box):
         self.stage_name_row.set_text(self.stage.name)
 
     def load_configuration_rows(self):
+        """Reads catalyst arguments of stage target, called from background thread. Rows are created in main thread."""
+        try:
+            arguments_details = load_catalyst_stage_arguments_details(
+                toolset=self.project_directory.get_toolset(),
+                target_name=self.stage.target
+            )
+        except Exception as e:
+            print(f"Failed to load stage arguments: {e}")
+            arguments_details = {}
+        # Schedule UI update in the main thread
+        GLib.idle_add(self.create_configuration_rows, arguments_details)
+
+    def create_configuration_rows(self, arguments_details: dict[str, StageArgumentTargetDetails]):
         # Reset configuration rows
         if hasattr(self, 'configuration_rows'):
             for row in self.configuration_rows:
                 row.pref_group.remove(row)
         self.configuration_rows = []
         # Load arguments rows
-        arguments_details = load_catalyst_stage_arguments_details(
-            toolset=self.project_directory.get_toolset(),
-            target_name=self.stage.target
-        )
         for name, arg in arguments_details.items():
             group = self.pref_group_for_argument(argument=arg)
             if group:
@@ -81,6 +90,7 @@ class ProjectStageDetailsView(Gtk.Box):
                 )
                 row.pref_group.add(row)
                 self.configuration_rows.append(row)
+        return False  # Remove idle callback after running once
 
     def can_change_argument(self, option: StageArgumentOption) -> bool:
         match option.argument:
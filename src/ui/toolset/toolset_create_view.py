@@ -27,6 +27,7 @@ class ToolsetCreateView(Gtk.Box):
     stages_list = Gtk.Template.Child()
     tools_list = Gtk.Template.Child()
     allow_binpkgs_checkbox = Gtk.Template.Child()
+    use_ccache_checkbox = Gtk.Template.Child()
     environment_name_row = Gtk.Template.Child()
     name_used_label = Gtk.Template.Child()
 
@@ -38,10 +39,12 @@ class ToolsetCreateView(Gtk.Box):
         self.selected_stage: ParseResult | None = None
         self.architecture = Architecture.HOST
         self.allow_binpkgs = True
+        self.use_ccache = False
         self.tools_selection: Dict[ToolsetApplication, bool] = {app: not app.auto_select for app in ToolsetApplication.ALL}
         self.tools_selection_versions: Dict[ToolsetApplication, ToolsetApplicationSelection] = {app: app.versions[0] for app in ToolsetApplication.ALL}
         self.tools_selection_patches: Dict[ToolsetApplication, list[GLocalFile]] = {app: [] for app in ToolsetApplication.ALL}
         self.allow_binpkgs_checkbox.set_active(self.allow_binpkgs)
+        self.use_ccache_checkbox.set_active(self.use_ccache)
         self._load_applications_rows()
         if installation_in_progress is None or installation_in_progress.status == MultiStageProcessState.SETUP:
             ToolsetEnvBuilder.get_stage3_urls(architecture=self.architecture, completion_handler=self._update_stages_result)
@@ -69,6 +72,10 @@ class ToolsetCreateView(Gtk.Box):
     def on_allow_binpkgs_toggled(self, checkbox):
         self.allow_binpkgs = checkbox.get_active()
 
+    @Gtk.Template.Callback()
+    def on_use_ccache_toggled(self, checkbox):
+        self.use_ccache = checkbox.get_active()
+
     def _start_installation(self, authorization_keeper: AuthorizationKeeper):
         if not authorization_keeper:
             return
@@ -85,7 +92,8 @@ class ToolsetCreateView(Gtk.Box):
             alias=self.environment_name_row.get_text(),
             stage_url=self.selected_stage,
             allow_binpkgs=self.allow_binpkgs,
-            apps_selection=apps_selection
+            apps_selection=apps_selection,
+            use_ccache=self.use_ccache
         )
         installation_in_progress.start()
         self.wizard_view.set_installation(installation_in_progress)
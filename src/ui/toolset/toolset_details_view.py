@@ -11,6 +11,10 @@ from .toolset_update import ToolsetUpdate
 from .multistage_process import MultiStageProcess, MultiStageProcessEvent, MultiStageProcessState
 from .multistage_process_execution_view import MultistageProcessExecutionView
 from .toolset_manager import ToolsetManager
+from .toolset_spawn import ToolsetSpawn
+from .toolset_spawn_pool import ToolsetSpawnPool
+from .toolset_package_index import ToolsetPackageIndex
+from .background_executor import BackgroundExecutor
 from .cl_toggle_group import CLToggle, CLToggleGroup
 
 @Gtk.Template(resource_path='/com/damiandudycz/CatalystLab/ui/toolset/toolset_details_view.ui')
@@ -22,6 +26,7 @@ class ToolsetDetailsView(Gtk.Box):
     applications_group = Gtk.Template.Child()
     status_file_row = Gtk.Template.Child()
     status_size_row = Gtk.Template.Child()
+    ccache_stats_row = Gtk.Template.Child()
     toolset_date_created_row = Gtk.Template.Child()
     toolset_date_updated_row = Gtk.Template.Child()
     toolset_source_row = Gtk.Template.Child()
@@ -41,6 +46,7 @@ class ToolsetDetailsView(Gtk.Box):
     action_button_update = Gtk.Template.Child()
     action_button_delete = Gtk.Template.Child()
     allow_binpkgs_checkbox = Gtk.Template.Child()
+    use_ccache_checkbox = Gtk.Template.Child()
     applications_settings_group = Gtk.Template.Child()
     applications_container = Gtk.Template.Child()
     applications_actions_container = Gtk.Template.Child()
@@ -53,6 +59,8 @@ class ToolsetDetailsView(Gtk.Box):
     def __init__(self, toolset: Toolset, content_navigation_view: Adw.NavigationView | None = None):
         super().__init__()
         self.toolset = toolset
+        self.toolset_spawn = None # Spawn created by mount actions of this view.
+        self.package_index: ToolsetPackageIndex | None = None # Installed packages, read from toolset image in background.
         self.content_navigation_view = content_navigation_view
 
         self.apps_changed = False
@@ -100,6 +108,8 @@ class ToolsetDetailsView(Gtk.Box):
         timestamp_date_created = self.toolset.metadata.get('date_created')
         timestamp_date_updated = self.toolset.metadata.get('date_updated')
         allow_binpkgs = self.toolset.metadata.get('allow_binpkgs', False)
+        use_ccache = self.toolset.metadata.get('use_ccache', False)
+        ccache_stats = self.toolset.metadata.get('ccache_stats')
         date_created = datetime.fromtimestamp(timestamp_date_created) if isinstance(timestamp_date_created, int) else None
         date_updated = datetime.fromtimestamp(timestamp_date_updated) if isinstance(timestamp_date_updated, int) else None
         source_url = urlparse(source).path if source else None
@@ -109,9 +119,25 @@ class ToolsetDetailsView(Gtk.Box):
         self.toolset_date_updated_row.set_subtitle(date_updated.strftime("%Y-%m-%d %H:%M") if date_updated else "unknown")
         self.toolset_source_row.set_subtitle(filename or "unknown")
         self.allow_binpkgs_checkbox.set_active(allow_binpkgs)
+        self.use_ccache_checkbox.set_active(use_ccache)
+        self.ccache_stats_row.set_visible(ccache_stats is not None)
+        if ccache_stats:
+            self.ccache_stats_row.set_subtitle(self._ccache_stats_string(ccache_stats))
         if event_data is None or not self.toolset.is_reserved:
             self.load_initial_applications_selection()
             self.load_applications()
+            self.load_package_index()
+
+    def load_package_index(self):
+        """Reads package index of toolset without spawning it, then shows installed versions from it."""
+        def load():
+            package_index = ToolsetPackageIndex.for_toolset(toolset=self.toolset)
+            def apply():
+                self.package_index = package_index
+                self.load_applications()
+                return False # Remove idle callback after running once
+            GLib.idle_add(apply)
+        BackgroundExecutor.shared().submit(load)
 
     def setup_status(self, _ = None):
         """Updates controls visibility and sensitivity for current status."""
@@ -133,7 +159,7 @@ class ToolsetDetailsView(Gtk.Box):
             and self.toolset.store_changes
         )
         self.tag_is_reserved.set_visible(self.toolset.is_reserved)
-        self.tag_in_use.set_visible(self.toolset.in_use)
+        self.tag_in_use.set_visible(self.toolset.in_use > 0)
         self.tag_spawned.set_visible(self.toolset.spawned)
         self.tag_updating.set_visible(
             self.update_in_progress
@@ -198,8 +224,8 @@ class ToolsetDetailsView(Gtk.Box):
                 self.status_bindings_row.remove(row)
         self.status_bindings_row.set_expanded(False)
         self._binding_rows = []
-        if self.toolset.current_bindings:
-            for binding in self.toolset.current_bindings:
+        for spawn in self.toolset.spawns:
+            for binding in spawn.current_bindings or []:
                 row = Adw.ActionRow(title=binding.mount_path)
                 access_str = "RW" if binding.store_changes else "RO"
                 source_str = f"(Toolset){binding.toolset_path} ({access_str})" if binding.toolset_path else f"(Host){binding.host_path} ({access_str})" if binding.host_path else "(Temp)"
@@ -296,7 +322,8 @@ class ToolsetDetailsView(Gtk.Box):
             if app.auto_select:
                 continue
             if self.tools_selection[app]:
-                subtitle = f"{app_install.variant.name}: {app_install.version}, Patched" if app_install.patches else f"{app_install.variant.name}: {app_install.version}"
+                version = (self.package_index.version(package=app.package) if self.package_index else None) or app_install.version
+                subtitle = f"{app_install.variant.name}: {version}, Patched" if app_install.patches else f"{app_install.variant.name}: {version}"
             else:
                 subtitle = "Not installed"
             row = Adw.ExpanderRow(title=app.name, subtitle=subtitle)
@@ -424,6 +451,25 @@ class ToolsetDetailsView(Gtk.Box):
         self.toolset.metadata['allow_binpkgs'] = checkbox.get_active()
         Repository.Toolset.save()
 
+    @Gtk.Template.Callback()
+    def on_use_ccache_toggled(self, checkbox):
+        if self.toolset.metadata.get('use_ccache', False) != checkbox.get_active():
+            self.toolset.metadata['use_ccache'] = checkbox.get_active()
+            Repository.Toolset.save()
+
+    @staticmethod
+    def _ccache_stats_string(ccache_stats: dict) -> str:
+        hits = ccache_stats.get("hits", 0)
+        misses = ccache_stats.get("misses", 0)
+        hit_rate = f"{hits / (hits + misses) * 100:.1f}%" if hits + misses else "n/a"
+        description = f"Hit rate {hit_rate} ({hits} hits, {misses} misses)"
+        if ccache_stats.get("cache_size"):
+            description += f", size {ccache_stats['cache_size']}"
+        last_step = ccache_stats.get("last_step")
+        if last_step:
+            description += f"\nLast step: {last_step['name']}, {last_step['hits']} hits, {last_step['misses']} misses"
+        return description
+
     @Gtk.Template.Callback()
     def applications_button_cancel_clicked(self, sender):
         self.load_initial_applications_selection()
@@ -515,7 +561,7 @@ class ToolsetDetailsView(Gtk.Box):
             if authorization_keeper:
                 try:
                     self.toolset.reserve()
-                    self.toolset.spawn(store_changes=store_changes)
+                    self.toolset_spawn = self.toolset.spawn(store_changes=store_changes)
                     self.toolset.analyze()
                 except Exception as e:
                     print(e)
@@ -528,10 +574,21 @@ class ToolsetDetailsView(Gtk.Box):
             if authorization_keeper:
                 try:
                     self.toolset.reserve()
-                    self.toolset.unspawn(rebuild_squashfs_if_needed=store_changes)
+                    spawn = self._mounted_spawn()
+                    if spawn:
+                        self.toolset.unspawn(spawn=spawn, rebuild_squashfs_if_needed=store_changes)
+                    self.toolset_spawn = None
                 except Exception as e:
                     print(e)
                 finally:
                     self.toolset.release()
         RootHelperClient.shared().authorize_and_run(callback=unspawn)
 
+    def _mounted_spawn(self) -> ToolsetSpawn | None:
+        """Spawn created by mount actions, also when mounted from previous instance of this view."""
+        """Spawns held by other processes and idle spawns of ToolsetSpawnPool are never returned."""
+        if self.toolset_spawn in self.toolset.spawns:
+            return self.toolset_spawn
+        idle_spawns = ToolsetSpawnPool.shared().idle_spawns
+        return next((spawn for spawn in self.toolset.spawns if not spawn.held and spawn not in idle_spawns), None)
+